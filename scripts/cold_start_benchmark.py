@@ -0,0 +1,145 @@
+"""Mide el cold start por ruta: import del handler y primera/segunda petición en un proceso nuevo.
+
+Cada muestra corre en un intérprete limpio. Los clientes de Bedrock, MongoDB y PostgreSQL
+se sustituyen por los fakes de `scripts/fakes.py`, pero el módulo real del cliente se importa
+igualmente al primer uso, así que el coste de cargar boto3/pymongo/psycopg2 queda medido.
+
+Uso:
+    python scripts/cold_start_benchmark.py --repeat 5
+    python scripts/cold_start_benchmark.py --route options --route categories
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(SCRIPTS_DIR, "..", "src")
+
+HEAVY_MODULES = ("numpy", "boto3", "botocore", "pymongo", "psycopg2")
+
+COURSE_ID = f"{1:024x}"
+ROUTES: Dict[str, Dict[str, Any]] = {
+    "options": {"httpMethod": "OPTIONS", "path": "/api/search"},
+    "categories": {"httpMethod": "GET", "path": "/api/courses/categories"},
+    "trending": {"httpMethod": "GET", "path": "/api/courses/trending", "queryStringParameters": {"limit": "12"}},
+    "course": {"httpMethod": "GET", "path": f"/api/courses/{COURSE_ID}"},
+    "favorites": {"httpMethod": "GET", "path": "/api/courses/favorites", "headers": {"x-user-id": "bench-user"}},
+    "toggle": {"httpMethod": "POST", "path": f"/api/courses/{COURSE_ID}/favorite", "headers": {"x-user-id": "bench-user"}},
+    "search": {"httpMethod": "POST", "path": "/api/search", "body": json.dumps({"query": "python para principiantes"})},
+    "search_lexical": {
+        "httpMethod": "POST",
+        "path": "/api/search",
+        "body": json.dumps({"query": "python para principiantes", "mode": "lexical"}),
+    },
+}
+
+
+def _install_fakes(handler: Any, catalog_size: int) -> None:
+    from fakes import FakeBedrockClient, FakeFavoritesRepository, FakeMongoCatalogClient, build_catalog
+
+    documents = build_catalog(size=catalog_size)
+    fakes = {
+        "utils.mongodb_client": FakeMongoCatalogClient(documents),
+        "utils.bedrock_client": FakeBedrockClient(),
+        "utils.postgres_client": FakeFavoritesRepository(),
+    }
+    fakes["utils.postgres_client"].seed("bench-user", [document["_id"] for document in documents[:20]])
+
+    def accessor(module_name: str) -> Any:
+        def get_client() -> Any:
+            importlib.import_module(module_name)
+            return fakes[module_name]
+
+        return get_client
+
+    handler.get_mongo_client = accessor("utils.mongodb_client")
+    handler.get_bedrock_client = accessor("utils.bedrock_client")
+    handler.get_favorites_repository = accessor("utils.postgres_client")
+
+
+def run_child(route: str, catalog_size: int) -> None:
+    sys.path.insert(0, SRC_DIR)
+    sys.path.insert(0, SCRIPTS_DIR)
+    event = ROUTES[route]
+
+    started = time.perf_counter()
+    handler = importlib.import_module("search_api_lambda")
+    import_ms = (time.perf_counter() - started) * 1000.0
+    loaded_at_import = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    # Los fakes se construyen fuera de la medición; sólo importan utilidades ligeras.
+    _install_fakes(handler, catalog_size)
+
+    started = time.perf_counter()
+    response = handler.lambda_handler(dict(event), None)
+    first_ms = (time.perf_counter() - started) * 1000.0
+
+    started = time.perf_counter()
+    handler.lambda_handler(dict(event), None)
+    warm_ms = (time.perf_counter() - started) * 1000.0
+
+    print(
+        json.dumps(
+            {
+                "route": route,
+                "status": response["statusCode"],
+                "import_ms": import_ms,
+                "first_request_ms": first_ms,
+                "warm_request_ms": warm_ms,
+                "loaded_at_import": loaded_at_import,
+                "loaded_after_request": [name for name in HEAVY_MODULES if name in sys.modules],
+            }
+        )
+    )
+
+
+def run_parent(routes: List[str], repeat: int, catalog_size: int) -> None:
+    header = f"{'route':<15} {'status':>6} {'import ms':>10} {'first ms':>10} {'warm ms':>9}  modules loaded"
+    print(header)
+    print("-" * len(header))
+    for route in routes:
+        samples = []
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", route, "--catalog-size", str(catalog_size)],
+                check=True,
+                capture_output=True,
+                text=True,
+                env={**os.environ, "LOG_LEVEL": "ERROR"},
+            )
+            samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+        print(
+            f"{route:<15} {samples[0]['status']:>6} "
+            f"{statistics.median(s['import_ms'] for s in samples):>10.1f} "
+            f"{statistics.median(s['first_request_ms'] for s in samples):>10.1f} "
+            f"{statistics.median(s['warm_request_ms'] for s in samples):>9.2f}  "
+            f"{','.join(samples[0]['loaded_after_request']) or '-'}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--route", action="append", choices=sorted(ROUTES), help="Rutas a medir (todas por defecto)")
+    parser.add_argument("--repeat", type=int, default=3, help="Procesos nuevos por ruta")
+    parser.add_argument("--catalog-size", type=int, default=300)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.catalog_size)
+    else:
+        run_parent(args.route or list(ROUTES), args.repeat, args.catalog_size)
+
+
+if __name__ == "__main__":
+    main()
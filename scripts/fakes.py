@@ -0,0 +1,322 @@
+"""Implementaciones en memoria de Bedrock, MongoDB y PostgreSQL para benchmarks locales.
+
+Los fakes respetan la interfaz pública de `BedrockClient`, `MongoCatalogClient` y
+`FavoritesRepository` y pueden simular latencia de red con `latency_ms`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.course_fields import DEFAULT_PROJECTION, CourseProjection  # noqa: E402
+from utils.search_filters import matches_filters, normalize_filters  # noqa: E402
+
+CATEGORIES = ["Data Science", "DevOps", "Programación", "Diseño", "Negocios", "Idiomas"]
+LEVELS = ["Principiante", "Intermedio", "Avanzado"]
+LANGUAGES = ["es", "en", "pt"]
+TOPICS = ["Python", "Docker", "SQL", "Kubernetes", "React", "Excel", "Machine Learning", "Figma"]
+
+
+def _sleep(latency_ms: float) -> None:
+    if latency_ms > 0:
+        time.sleep(latency_ms / 1000.0)
+
+
+def synthetic_vector(seed: str, dim: int) -> List[float]:
+    """Vector unitario determinista a partir de un texto."""
+    rng = random.Random(hashlib.sha256(seed.encode("utf-8")).digest())
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector]
+
+
+def build_catalog(size: int = 2000, dim: int = 1024, seed: int = 7) -> List[Dict[str, Any]]:
+    """Catálogo sintético con los campos de la colección `courses`, embeddings incluidos."""
+    rng = random.Random(seed)
+    processed_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    courses = []
+    for position in range(size):
+        topic = TOPICS[position % len(TOPICS)]
+        title = f"{topic} {rng.choice(['desde cero', 'avanzado', 'práctico', 'para equipos'])} {position}"
+        courses.append(
+            {
+                "_id": f"{position:024x}",
+                "title": title,
+                "description": f"Curso de {topic.lower()} con proyectos reales. " * rng.randint(4, 20),
+                "url": f"https://example.com/courses/{position}",
+                "platform": rng.choice(["Coursera", "Udemy", "edX"]),
+                "rating": round(rng.uniform(3.0, 5.0), 1),
+                "duration": f"{rng.randint(2, 40)}h",
+                "price": round(rng.choice([0.0, 9.99, 19.99, 49.99, 99.0, 199.0]), 2),
+                "language": rng.choice(LANGUAGES),
+                "category": CATEGORIES[position % len(CATEGORIES)],
+                "level": rng.choice(LEVELS),
+                "students_count": rng.randint(0, 200000),
+                "embedding": synthetic_vector(title, dim),
+                "embedding_model": "synthetic",
+                "embedding_dim": dim,
+                "processed_at": (processed_at + timedelta(minutes=position)).isoformat(),
+            }
+        )
+    return courses
+
+
+class FakeBedrockClient:
+    def __init__(self, dim: int = 1024, latency_ms: float = 0.0) -> None:
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def generate_embedding(self, text: str) -> List[float]:
+        self.calls += 1
+        _sleep(self.latency_ms)
+        return synthetic_vector(text, self.dim)
+
+    def generate_embeddings(self, texts: List[str]) -> Tuple[Dict[str, List[float]], Dict[str, Exception]]:
+        # Como el cliente real: una sola espera para las llamadas que irían en paralelo.
+        self.calls += 1
+        _sleep(self.latency_ms)
+        return {text: synthetic_vector(text, self.dim) for text in texts}, {}
+
+
+class FakeMongoCatalogClient:
+    def __init__(self, documents: List[Dict[str, Any]], latency_ms: float = 0.0) -> None:
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._documents = documents
+        self._by_id = {document["_id"]: document for document in documents}
+        # El ranking exacto en Python puro cuesta decenas de ms con 1024 dimensiones: se
+        # memoiza por consulta para que las muestras calientes midan el handler, no el fake.
+        self._rankings: Dict[Tuple[Any, ...], List[Tuple[float, Dict[str, Any]]]] = {}
+
+    def _round_trip(self) -> None:
+        self.calls += 1
+        _sleep(self.latency_ms)
+
+    def search_courses(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        filters: Dict[str, Any],
+        projection: CourseProjection = DEFAULT_PROJECTION,
+    ) -> List[Dict[str, Any]]:
+        self._round_trip()
+        filters = normalize_filters(filters)
+        key = (tuple(query_embedding[:16]), tuple(sorted((name, str(value)) for name, value in filters.items())))
+        scored = self._rankings.get(key)
+        if scored is None:
+            scored = []
+            for document in self._documents:
+                if filters and not matches_filters(document, filters):
+                    continue
+                dot = sum(a * b for a, b in zip(query_embedding, document["embedding"]))
+                scored.append((dot, document))
+            scored.sort(key=lambda item: item[0], reverse=True)
+            self._rankings[key] = scored
+        return [
+            projection.apply({**self._serialize(document), "score": (1.0 + dot) / 2.0})
+            for dot, document in scored[:limit]
+        ]
+
+    def get_course_by_id(
+        self,
+        course_id: str,
+        projection: CourseProjection = DEFAULT_PROJECTION,
+    ) -> Optional[Dict[str, Any]]:
+        self._round_trip()
+        document = self._by_id.get(course_id)
+        return projection.apply(self._serialize(document, include_metadata=True)) if document else None
+
+    def get_courses_by_ids(
+        self,
+        course_ids: List[str],
+        projection: CourseProjection = DEFAULT_PROJECTION,
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        self._round_trip()
+        return {
+            course_id: projection.apply(self._serialize(self._by_id[course_id], include_metadata=True))
+            if course_id in self._by_id
+            else None
+            for course_id in course_ids
+        }
+
+    def get_course_embeddings(self, course_ids: List[str]) -> Dict[str, List[float]]:
+        self._round_trip()
+        return {
+            course_id: self._by_id[course_id]["embedding"] for course_id in course_ids if course_id in self._by_id
+        }
+
+    def get_course_embedding(self, course_id: str) -> Optional[Tuple[str, Optional[List[float]]]]:
+        self._round_trip()
+        document = self._by_id.get(course_id)
+        return (document["_id"], document.get("embedding")) if document else None
+
+    def get_categories(self) -> List[Dict[str, Any]]:
+        self._round_trip()
+        counts: Dict[str, int] = {}
+        for document in self._documents:
+            category = document.get("category") or "General"
+            counts[category] = counts.get(category, 0) + 1
+        ordered = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return [{"name": name, "count": count} for name, count in ordered]
+
+    def get_trending_courses(
+        self,
+        limit: int,
+        projection: CourseProjection = DEFAULT_PROJECTION,
+    ) -> List[Dict[str, Any]]:
+        self._round_trip()
+        ranked = sorted(
+            self._documents,
+            key=lambda document: (document["students_count"], document["rating"]),
+            reverse=True,
+        )
+        return [projection.apply(self._serialize(document)) for document in ranked[:limit]]
+
+    def get_catalog_version(self) -> Optional[str]:
+        self._round_trip()
+        return max((document["processed_at"] for document in self._documents), default=None)
+
+    def get_catalog_snapshot(self, include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        self._round_trip()
+        snapshot = []
+        for document in self._documents:
+            course = self._serialize(document)
+            if include_embeddings:
+                course["embedding"] = document["embedding"]
+            snapshot.append(course)
+        return snapshot
+
+    def scan_catalog(
+        self,
+        since: Optional[Tuple[Any, Any]] = None,
+        include_embeddings: bool = False,
+        limit: Optional[int] = None,
+        max_time_ms: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        self._round_trip()
+        ordered = sorted(self._documents, key=lambda document: (document["processed_at"], document["_id"]))
+        if since is not None:
+            ordered = [
+                document for document in ordered if (document["processed_at"], document["_id"]) > tuple(since)
+            ]
+        return [
+            {
+                "course": self._serialize(document, include_metadata=True),
+                "legacy_id": document.get("legacy_id"),
+                "embedding": document["embedding"] if include_embeddings else None,
+                "position": (document["processed_at"], document["_id"]),
+            }
+            for document in ordered[:limit]
+        ]
+
+    @staticmethod
+    def _serialize(document: Dict[str, Any], include_metadata: bool = False) -> Dict[str, Any]:
+        course = {
+            "course_id": document["_id"],
+            "title": document.get("title", ""),
+            "description": document.get("description", ""),
+            "url": document.get("url", ""),
+            "platform": document.get("platform", ""),
+            "rating": document.get("rating"),
+            "duration": document.get("duration"),
+            "price": document.get("price"),
+            "language": document.get("language"),
+            "category": document.get("category"),
+            "level": document.get("level"),
+            "students_count": document.get("students_count"),
+        }
+        if include_metadata:
+            course["embedding_model"] = document.get("embedding_model")
+            course["embedding_dim"] = document.get("embedding_dim")
+            course["processed_at"] = document.get("processed_at")
+        return course
+
+
+class FakeFavoritesRepository:
+    def __init__(self, latency_ms: float = 0.0) -> None:
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._rows: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def _round_trip(self) -> None:
+        self.calls += 1
+        _sleep(self.latency_ms)
+
+    def seed(self, user_id: str, course_ids: List[str]) -> None:
+        base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        rows = self._rows.setdefault(user_id, {})
+        for position, course_id in enumerate(course_ids):
+            rows[course_id] = {
+                "course_id": course_id,
+                "created_at": base + timedelta(seconds=position),
+                "favorite_id": str(uuid.UUID(int=position + 1)),
+            }
+
+    def is_favorite(self, user_id: str, course_id: str) -> bool:
+        self._round_trip()
+        return course_id in self._rows.get(user_id, {})
+
+    def is_favorite_many(self, user_id: str, course_ids: List[str]) -> Set[str]:
+        if not course_ids:
+            return set()
+        self._round_trip()
+        rows = self._rows.get(user_id, {})
+        return {course_id for course_id in course_ids if course_id in rows}
+
+    def set_favorite(self, user_id: str, course_id: str, *, should_favorite: bool) -> Tuple[bool, bool]:
+        self._round_trip()
+        rows = self._rows.setdefault(user_id, {})
+        if should_favorite:
+            if course_id in rows:
+                return True, False
+            rows[course_id] = {
+                "course_id": course_id,
+                "created_at": datetime.now(timezone.utc),
+                "favorite_id": str(uuid.uuid4()),
+            }
+            return True, True
+        return False, rows.pop(course_id, None) is not None
+
+    def toggle_favorite(self, user_id: str, course_id: str) -> Tuple[bool, bool]:
+        rows = self._rows.setdefault(user_id, {})
+        if course_id in rows:
+            return self.set_favorite(user_id, course_id, should_favorite=False)
+        return self.set_favorite(user_id, course_id, should_favorite=True)
+
+    def list_favorites(self, user_id: str) -> List[Dict[str, Any]]:
+        self._round_trip()
+        return [
+            {"course_id": row["course_id"], "created_at": row["created_at"]}
+            for row in self._ordered(user_id)
+        ]
+
+    def list_favorites_page(
+        self,
+        user_id: str,
+        limit: int,
+        after: Optional[Tuple[str, str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        self._round_trip()
+        rows = self._ordered(user_id)
+        if after is not None:
+            created_at = datetime.fromisoformat(after[0])
+            rows = [row for row in rows if (row["created_at"], row["favorite_id"]) < (created_at, after[1])]
+        return [dict(row) for row in rows[:limit]], len(self._rows.get(user_id, {}))
+
+    def _ordered(self, user_id: str) -> List[Dict[str, Any]]:
+        return sorted(
+            self._rows.get(user_id, {}).values(),
+            key=lambda row: (row["created_at"], row["favorite_id"]),
+            reverse=True,
+        )
@@ -0,0 +1,316 @@
+"""Benchmark offline del handler: latencia, throughput y memoria por ruta con dependencias falsas.
+
+Invoca `lambda_handler` en proceso con eventos sintéticos de API Gateway (REST v1 y HTTP v2)
+para cada ruta. Bedrock, MongoDB y PostgreSQL se sustituyen por los fakes de
+`scripts/fakes.py` sobre un catálogo sintético con vectores de 1024 dimensiones, con
+latencia de red configurable por dependencia.
+
+Por ruta se mide:
+- `cold`: primera petición tras vaciar las cachés del handler (instantáneas, índices, rankings).
+- p50/p95/p99 y throughput de las peticiones calientes.
+- Memoria: pico y memoria retenida por petición según `tracemalloc` (pasada aparte).
+
+Uso:
+    python scripts/handler_benchmark.py --iterations 200
+    python scripts/handler_benchmark.py --route search_lexical --format v2
+    python scripts/handler_benchmark.py --catalog-mirror watermark --mongo-latency-ms 5
+    python scripts/handler_benchmark.py --save-baseline benchmarks/baseline.json
+    python scripts/handler_benchmark.py --compare benchmarks/baseline.json --threshold 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import gc
+import importlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPTS_DIR, "..", "src"))
+sys.path.insert(0, SCRIPTS_DIR)
+
+# Los warnings por petición distorsionan las medidas; las líneas EMF se descartan más abajo.
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from fakes import (  # noqa: E402
+    FakeBedrockClient,
+    FakeFavoritesRepository,
+    FakeMongoCatalogClient,
+    build_catalog,
+)
+
+USER_ID = "bench-user"
+COURSE_ID = f"{1:024x}"
+
+# method, path, query string, body, headers extra
+ROUTES: Dict[str, Dict[str, Any]] = {
+    "options": {"method": "OPTIONS", "path": "/api/search"},
+    "search_vector": {"method": "POST", "path": "/api/search", "body": {"query": "python para principiantes"}},
+    "search_lexical": {
+        "method": "POST",
+        "path": "/api/search",
+        "body": {"query": "python para principiantes", "mode": "lexical"},
+    },
+    "search_hybrid": {
+        "method": "POST",
+        "path": "/api/search",
+        "body": {"query": "docker en produccion", "mode": "hybrid", "filters": {"level": "Intermedio"}},
+    },
+    "search_batch": {
+        "method": "POST",
+        "path": "/api/search/batch",
+        "body": {"queries": ["python", "docker", {"query": "sql", "mode": "lexical"}], "limit": 5},
+    },
+    # Segunda página de `search_vector`: el cursor se codifica al construir el evento.
+    "search_cursor": {
+        "method": "POST",
+        "path": "/api/search",
+        "cursor": {"q": "python para principiantes", "f": {}, "m": "vector", "o": 10},
+    },
+    "categories": {"method": "GET", "path": "/api/courses/categories"},
+    "trending": {"method": "GET", "path": "/api/courses/trending", "query": {"limit": "12"}},
+    "course": {"method": "GET", "path": f"/api/courses/{COURSE_ID}"},
+    "similar": {"method": "GET", "path": f"/api/courses/{COURSE_ID}/similar", "query": {"limit": "8"}},
+    "favorites": {"method": "GET", "path": "/api/courses/favorites", "user": True},
+    "toggle": {"method": "POST", "path": f"/api/courses/{COURSE_ID}/favorite", "user": True},
+    "not_found": {"method": "GET", "path": "/api/unknown"},
+}
+
+
+def build_event(route: str, event_format: str, accept_encoding: Optional[str] = None) -> Dict[str, Any]:
+    """Evento de API Gateway REST (`v1`) o HTTP API payload 2.0 (`v2`) para la ruta."""
+    spec = ROUTES[route]
+    headers = {"origin": "http://localhost:3000", "content-type": "application/json"}
+    if accept_encoding:
+        headers["accept-encoding"] = accept_encoding
+    if spec.get("user"):
+        headers["x-user-id"] = USER_ID
+    body = json.dumps(spec["body"]) if "body" in spec else None
+    if "cursor" in spec:
+        encode_cursor = importlib.import_module("search_api_lambda")._encode_cursor
+        body = json.dumps({"cursor": encode_cursor(spec["cursor"])})
+
+    if event_format == "v2":
+        query = spec.get("query") or {}
+        return {
+            "version": "2.0",
+            "rawPath": spec["path"],
+            "rawQueryString": "&".join(f"{key}={value}" for key, value in query.items()),
+            "headers": headers,
+            "queryStringParameters": query or None,
+            "requestContext": {"http": {"method": spec["method"], "path": spec["path"]}},
+            "body": body,
+            "isBase64Encoded": False,
+        }
+    return {
+        "httpMethod": spec["method"],
+        "path": spec["path"],
+        "resource": spec["path"],
+        "headers": headers,
+        "queryStringParameters": spec.get("query"),
+        "requestContext": {},
+        "body": body,
+        "isBase64Encoded": False,
+    }
+
+
+def install_fakes(handler: Any, args: argparse.Namespace) -> None:
+    documents = build_catalog(size=args.catalog_size, dim=args.dim)
+    mongo = FakeMongoCatalogClient(documents, latency_ms=args.mongo_latency_ms)
+    bedrock = FakeBedrockClient(dim=args.dim, latency_ms=args.bedrock_latency_ms)
+    favorites = FakeFavoritesRepository(latency_ms=args.postgres_latency_ms)
+    favorites.seed(USER_ID, [document["_id"] for document in documents[:20]])
+
+    handler.get_mongo_client = lambda: mongo
+    handler.get_bedrock_client = lambda: bedrock
+    handler.get_favorites_repository = lambda: favorites
+    handler.CATALOG_MIRROR_MODE = args.catalog_mirror
+
+
+def reset_handler_caches(handler: Any) -> None:
+    handler._catalog_snapshots.invalidate()
+    handler._search_result_sets.clear()
+    handler._similar_courses.clear()
+    handler._vector_engine = None
+    handler._catalog_mirror = None
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure_route(handler: Any, route: str, args: argparse.Namespace) -> Dict[str, Any]:
+    event = build_event(route, args.format, args.accept_encoding)
+    reset_handler_caches(handler)
+
+    started = time.perf_counter()
+    response = handler.lambda_handler(dict(event), None)
+    cold_ms = (time.perf_counter() - started) * 1000.0
+
+    for _ in range(args.warmup):
+        handler.lambda_handler(dict(event), None)
+
+    samples: List[float] = []
+    gc.collect()
+    loop_started = time.perf_counter()
+    for _ in range(args.iterations):
+        started = time.perf_counter()
+        handler.lambda_handler(dict(event), None)
+        samples.append((time.perf_counter() - started) * 1000.0)
+    loop_seconds = time.perf_counter() - loop_started
+
+    # tracemalloc multiplica el coste de cada asignación: pasada separada de la de tiempos.
+    peaks: List[int] = []
+    retained: List[int] = []
+    tracemalloc.start()
+    for _ in range(args.allocation_iterations):
+        before, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        handler.lambda_handler(dict(event), None)
+        after, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(after - before)
+    tracemalloc.stop()
+
+    ordered = sorted(samples)
+    return {
+        "status": response["statusCode"],
+        "response_bytes": len(response.get("body") or ""),
+        "cold_ms": cold_ms,
+        "p50_ms": _percentile(ordered, 0.50),
+        "p95_ms": _percentile(ordered, 0.95),
+        "p99_ms": _percentile(ordered, 0.99),
+        "mean_ms": statistics.fmean(ordered),
+        "throughput_rps": args.iterations / loop_seconds if loop_seconds else 0.0,
+        "peak_alloc_kib": statistics.median(peaks) / 1024.0 if peaks else 0.0,
+        "retained_kib": statistics.median(retained) / 1024.0 if retained else 0.0,
+    }
+
+
+def print_report(results: Dict[str, Dict[str, Any]]) -> None:
+    header = (
+        f"{'route':<15} {'status':>6} {'cold ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'req/s':>9} {'peak KiB':>9} {'kept KiB':>9} {'bytes':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    for route, stats in results.items():
+        print(
+            f"{route:<15} {stats['status']:>6} {stats['cold_ms']:>9.2f} {stats['p50_ms']:>8.3f} "
+            f"{stats['p95_ms']:>8.3f} {stats['p99_ms']:>8.3f} {stats['throughput_rps']:>9.0f} "
+            f"{stats['peak_alloc_kib']:>9.1f} {stats['retained_kib']:>9.1f} {stats['response_bytes']:>7}"
+        )
+
+
+def compare_with_baseline(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Any],
+    threshold: float,
+    min_delta_ms: float,
+) -> List[str]:
+    """Rutas cuyo p50/p95 o pico de memoria empeoró más de `threshold` respecto a la línea base."""
+    regressions: List[str] = []
+    for route, stats in results.items():
+        reference = baseline.get("routes", {}).get(route)
+        if reference is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            delta = stats[metric] - reference[metric]
+            if delta > min_delta_ms and stats[metric] > reference[metric] * (1.0 + threshold):
+                regressions.append(
+                    f"{route}: {metric} {reference[metric]:.3f} -> {stats[metric]:.3f} ({delta / reference[metric]:+.0%})"
+                )
+        if stats["peak_alloc_kib"] > reference["peak_alloc_kib"] * (1.0 + threshold) + 1.0:
+            regressions.append(
+                f"{route}: peak_alloc_kib {reference['peak_alloc_kib']:.1f} -> {stats['peak_alloc_kib']:.1f}"
+            )
+        if stats["status"] != reference["status"]:
+            regressions.append(f"{route}: status {reference['status']} -> {stats['status']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--route", action="append", choices=sorted(ROUTES), help="Rutas a medir (todas por defecto)")
+    parser.add_argument("--format", choices=("v1", "v2"), default="v1", help="Formato del evento de API Gateway")
+    parser.add_argument("--accept-encoding", help="Cabecera Accept-Encoding (p.ej. 'gzip, br') para medir la compresión")
+    parser.add_argument("--iterations", type=int, default=200, help="Peticiones calientes medidas por ruta")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--allocation-iterations", type=int, default=20)
+    parser.add_argument("--catalog-size", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--bedrock-latency-ms", type=float, default=0.0)
+    parser.add_argument("--mongo-latency-ms", type=float, default=0.0)
+    parser.add_argument("--postgres-latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--catalog-mirror",
+        choices=("off", "watermark"),
+        default="off",
+        help="Sirve el catálogo desde la réplica en memoria (CATALOG_MIRROR)",
+    )
+    parser.add_argument("--save-baseline", help="Guarda los resultados como línea base JSON")
+    parser.add_argument("--compare", help="Línea base JSON con la que comparar")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Empeoramiento relativo tolerado")
+    parser.add_argument(
+        "--min-delta-ms",
+        type=float,
+        default=0.05,
+        help="Diferencia absoluta mínima para considerar regresión (evita ruido en rutas de microsegundos)",
+    )
+    parser.add_argument("--json", action="store_true", help="Imprime los resultados en JSON")
+    args = parser.parse_args()
+
+    handler = importlib.import_module("search_api_lambda")
+    install_fakes(handler, args)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    # Las líneas EMF se siguen generando (son parte del coste del handler) pero no se imprimen.
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        for route in args.route or list(ROUTES):
+            results[route] = measure_route(handler, route, args)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        payload = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "format": args.format,
+            "catalog_size": args.catalog_size,
+            "latency_ms": {
+                "bedrock": args.bedrock_latency_ms,
+                "mongo": args.mongo_latency_ms,
+                "postgres": args.postgres_latency_ms,
+            },
+            "routes": results,
+        }
+        with open(args.save_baseline, "w", encoding="utf-8") as handle:
+            json.dump(payload, handle, indent=2)
+        print(f"\nLínea base guardada en {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as handle:
+            baseline: Optional[Dict[str, Any]] = json.load(handle)
+        regressions = compare_with_baseline(results, baseline or {}, args.threshold, args.min_delta_ms)
+        if regressions:
+            print("\nRegresiones frente a la línea base:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nSin regresiones frente a la línea base.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Exporta el snapshot del índice vectorial local y mide su recall frente a Atlas.
+
+Uso:
+    # Genera <prefix>.npy / <prefix>.json desde MongoDB (requiere ATLAS_URI)
+    python scripts/vector_recall.py export --output /tmp/courses-index
+
+    # Recall@k del índice local frente a $vectorSearch (requiere ATLAS_URI y Bedrock)
+    python scripts/vector_recall.py recall --snapshot /tmp/courses-index \
+        --query "python para principiantes" --query "docker" -k 10
+
+    # Sin red: compara el índice local con una búsqueda exacta en float64 y los filtros en Python
+    python scripts/vector_recall.py synthetic --courses 5000 --queries 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import numpy as np  # noqa: E402
+
+from utils.search_filters import matches_filters, normalize_filters  # noqa: E402
+from utils.vector_index import LocalVectorIndex  # noqa: E402
+
+
+def _recall(reference: List[Dict[str, Any]], candidate: List[Dict[str, Any]]) -> float:
+    expected = {course["course_id"] for course in reference}
+    if not expected:
+        return 1.0
+    found = {course["course_id"] for course in candidate}
+    return len(expected & found) / len(expected)
+
+
+def _timed(func: Callable[[], List[Dict[str, Any]]]) -> tuple:
+    started = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - started) * 1000.0
+
+
+def _report(recalls: List[float], reference_ms: List[float], local_ms: List[float], k: int) -> None:
+    print(f"queries={len(recalls)} k={k}")
+    print(f"recall@k mean={statistics.mean(recalls):.4f} min={min(recalls):.4f}")
+    for name, samples in (("reference", reference_ms), ("local", local_ms)):
+        ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(f"{name:>9} latency p50={statistics.median(ordered):.3f}ms p95={p95:.3f}ms")
+
+
+def command_export(args: argparse.Namespace) -> None:
+    from utils.mongodb_client import get_mongo_client
+
+    courses = get_mongo_client().get_catalog_snapshot(include_embeddings=True)
+    index = LocalVectorIndex.from_courses(courses)
+    index.save(args.output)
+    print(f"{len(index)} cursos exportados a {args.output}.npy / {args.output}.json")
+
+
+def command_recall(args: argparse.Namespace) -> None:
+    from utils.bedrock_client import get_bedrock_client
+    from utils.mongodb_client import get_mongo_client
+
+    index = LocalVectorIndex.load(args.snapshot)
+    bedrock = get_bedrock_client()
+    mongo = get_mongo_client()
+    filters = dict(item.split("=", 1) for item in args.filter)
+
+    queries = list(args.query)
+    if args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as handle:
+            queries.extend(line.strip() for line in handle if line.strip())
+
+    recalls, atlas_ms, local_ms = [], [], []
+    for query in queries:
+        embedding = bedrock.generate_embedding(query)
+        atlas, elapsed_atlas = _timed(lambda: mongo.search_courses(embedding, limit=args.k, filters=filters))
+        local, elapsed_local = _timed(lambda: index.search_courses(embedding, args.k, filters))
+        recalls.append(_recall(atlas, local))
+        atlas_ms.append(elapsed_atlas)
+        local_ms.append(elapsed_local)
+        print(f"{recalls[-1]:.2f}  {query}")
+
+    _report(recalls, atlas_ms, local_ms, args.k)
+
+
+def command_synthetic(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(args.seed)
+    levels = ["Principiante", "Intermedio", "Avanzado", None]
+    categories = ["Data Science", "DevOps", "Programación", "Diseño", "Negocios"]
+
+    courses = []
+    for position in range(args.courses):
+        vector = rng.standard_normal(args.dim).astype(np.float32)
+        courses.append(
+            {
+                "course_id": str(position),
+                "title": f"Curso {position}",
+                "level": levels[position % len(levels)],
+                "category": categories[position % len(categories)],
+                "language": "es" if position % 3 else "en",
+                "price": float(position % 200),
+                "embedding": (vector / np.linalg.norm(vector)).tolist(),
+            }
+        )
+
+    index = LocalVectorIndex.from_courses(courses)
+    exact_matrix = np.asarray([course["embedding"] for course in courses], dtype=np.float64)
+    filters = normalize_filters({"level": "intermedio", "max_price": 120} if args.filtered else {})
+
+    def exact_search(query: np.ndarray) -> List[Dict[str, Any]]:
+        scores = exact_matrix @ query
+        ranked = [courses[i] for i in np.argsort(-scores) if matches_filters(courses[i], filters)]
+        return [{"course_id": course["course_id"]} for course in ranked[: args.k]]
+
+    recalls, exact_ms, local_ms = [], [], []
+    for _ in range(args.queries):
+        query = rng.standard_normal(args.dim)
+        query /= np.linalg.norm(query)
+        reference, elapsed_exact = _timed(lambda: exact_search(query))
+        local, elapsed_local = _timed(lambda: index.search_courses(query.tolist(), args.k, filters))
+        recalls.append(_recall(reference, local))
+        exact_ms.append(elapsed_exact)
+        local_ms.append(elapsed_local)
+
+    _report(recalls, exact_ms, local_ms, args.k)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="Exporta el snapshot desde MongoDB")
+    export.add_argument("--output", required=True, help="Prefijo de salida (sin extensión)")
+    export.set_defaults(func=command_export)
+
+    recall = subparsers.add_parser("recall", help="Recall del índice local frente a Atlas")
+    recall.add_argument("--snapshot", required=True, help="Prefijo local o s3://bucket/prefijo")
+    recall.add_argument("--query", action="append", default=[])
+    recall.add_argument("--queries-file")
+    recall.add_argument("--filter", action="append", default=[], help="Filtro campo=valor")
+    recall.add_argument("-k", type=int, default=10)
+    recall.set_defaults(func=command_recall)
+
+    synthetic = subparsers.add_parser("synthetic", help="Recall frente a búsqueda exacta, sin red")
+    synthetic.add_argument("--courses", type=int, default=5000)
+    synthetic.add_argument("--queries", type=int, default=100)
+    synthetic.add_argument("--dim", type=int, default=1024)
+    synthetic.add_argument("--seed", type=int, default=7)
+    synthetic.add_argument("--filtered", action="store_true")
+    synthetic.add_argument("-k", type=int, default=10)
+    synthetic.set_defaults(func=command_synthetic)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,100 @@
+import hashlib
 import json
 import logging
 import os
-import re
-from typing import Any, Dict, Optional, List
-
-from utils.bedrock_client import get_bedrock_client
-from utils.mongodb_client import get_mongo_client
-from utils.postgres_client import get_favorites_repository
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, Optional, List, Set, Tuple
+from urllib.parse import urlparse
+
+from utils.course_fields import (
+    DEFAULT_PROJECTION,
+    DETAIL_FIELDS,
+    SUMMARY_FIELDS,
+    CourseProjection,
+    parse_projection,
+)
+from utils.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from utils.resilience import DependencyUnavailable, current_deadline, start_deadline
+from utils.personalization import PreferenceVectors, blend
+from utils.result_cache import ResultSetCache, SnapshotCache
+from utils.routing import Router, RouteMatch
+from utils.search_filters import FILTER_SPECS, compute_facets, normalize_filters
+from utils.serialization import EncodedCourse, compress_body, encode_json, with_fields
+from utils.telemetry import (
+    SERVER_TIMING_ENABLED,
+    emit_metrics,
+    increment,
+    server_timing_header,
+    span,
+    start_trace,
+)
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 logging.basicConfig(level=getattr(logging, LOG_LEVEL.upper(), logging.INFO))
 logger = logging.getLogger(__name__)
 
+MAX_TRENDING_LIMIT = 40
+MAX_SIMILAR_LIMIT = 20
+MAX_QUERY_LENGTH = int(os.getenv("SEARCH_MAX_QUERY_LENGTH", "500"))
+SEARCH_MODES = {"hybrid", "vector", "lexical"}
+DEFAULT_SEARCH_MODE = os.getenv("SEARCH_DEFAULT_MODE", "vector").strip().lower()
+HYBRID_DEPTH_FACTOR = 2
+MAX_BATCH_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "10"))
+SEARCH_RESULT_SET_SIZE = int(os.getenv("SEARCH_RESULT_SET_SIZE", "100"))
+PERSONALIZATION_WEIGHT = float(os.getenv("SEARCH_PERSONALIZATION_WEIGHT", "0.25"))
+PERSONALIZATION_MAX_FAVORITES = int(os.getenv("SEARCH_PERSONALIZATION_MAX_FAVORITES", "200"))
+LOCAL_VECTOR_MODE = os.getenv("LOCAL_VECTOR_INDEX", "off").lower()
+PREWARM_CLIENTS = os.getenv("PREWARM_CLIENTS", "")
+CATALOG_MIRROR_MODE = os.getenv("CATALOG_MIRROR", "off").lower()
+DEFAULT_FAVORITES_LIMIT = 20
+MAX_FAVORITES_LIMIT = 100
+CORS_MAX_AGE_SECONDS = os.getenv("CORS_MAX_AGE_SECONDS", "600")
+COURSE_HYDRATION_TIMEOUT_SECONDS = float(os.getenv("COURSE_HYDRATION_TIMEOUT_SECONDS", "3"))
+FAVORITES_PREFETCH_LIMIT = int(os.getenv("FAVORITES_PREFETCH_LIMIT", "200"))
+
+if DEFAULT_SEARCH_MODE not in SEARCH_MODES:
+    # Un error de configuración no debe convertir cada búsqueda sin `mode` en un 400.
+    logger.warning(
+        json.dumps(
+            {"event": "invalid_default_search_mode", "value": DEFAULT_SEARCH_MODE, "fallback": "vector"}
+        )
+    )
+    DEFAULT_SEARCH_MODE = "vector"
+
+_router = Router()
+_vector_engine: Optional[Any] = None
+_catalog_mirror: Optional[Any] = None
+# Las tareas concurrentes de una invocación fría crean estos objetos una sola vez.
+_singletons_lock = threading.Lock()
+
+_catalog_snapshots = SnapshotCache(
+    ttl_seconds=float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300")),
+    stale_seconds=float(os.getenv("CATALOG_CACHE_STALE_SECONDS", "3600")),
+)
+
+# Ranking completo de la primera página de cada búsqueda: las siguientes sólo hidratan ids.
+_search_result_sets = ResultSetCache(
+    max_entries=int(os.getenv("SEARCH_RESULT_SET_CACHE_ENTRIES", "256")),
+    ttl_seconds=float(os.getenv("SEARCH_RESULT_SET_TTL_SECONDS", "600")),
+)
+# Cursos similares ya serializados, por curso, filtros y versión del catálogo.
+_similar_courses = ResultSetCache(
+    max_entries=int(os.getenv("SIMILAR_CACHE_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("SIMILAR_CACHE_TTL_SECONDS", "3600")),
+)
+
+# Vector de preferencia por usuario (media de los embeddings de sus favoritos).
+_preference_vectors = PreferenceVectors(
+    max_users=int(os.getenv("SEARCH_PERSONALIZATION_CACHE_USERS", "1000")),
+    ttl_seconds=float(os.getenv("SEARCH_PERSONALIZATION_TTL_SECONDS", "900")),
+)
+
 
 class SearchApiError(Exception):
     """Errores controlados del servicio."""
@@ -22,6 +105,104 @@ class SearchApiError(Exception):
         self.status_code = status_code
 
 
+# Los clientes se importan al primer uso: un preflight o `/categories` no deben pagar la
+# carga de boto3, numpy o psycopg2 en el cold start.
+def get_bedrock_client() -> Any:
+    from utils.bedrock_client import get_bedrock_client as _get_bedrock_client
+
+    return _get_bedrock_client()
+
+
+def get_mongo_client() -> Any:
+    from utils.mongodb_client import get_mongo_client as _get_mongo_client
+
+    return _get_mongo_client()
+
+
+def get_favorites_repository() -> Any:
+    from utils.postgres_client import get_favorites_repository as _get_favorites_repository
+
+    return _get_favorites_repository()
+
+
+def _get_catalog_mirror() -> Optional[Any]:
+    """Réplica del catálogo en memoria ya actualizada, o `None` si está desactivada o no cargó.
+
+    Sin réplica cada ruta consulta Atlas como siempre; si la carga inicial falla también.
+    """
+    global _catalog_mirror
+    if CATALOG_MIRROR_MODE == "off":
+        return None
+    mirror = _catalog_mirror
+    if mirror is None:
+        from utils.catalog_mirror import CatalogMirror
+
+        with _singletons_lock:
+            if _catalog_mirror is None:
+                _catalog_mirror = CatalogMirror(
+                    get_mongo_client(),
+                    mode=CATALOG_MIRROR_MODE,
+                    # El índice vectorial local se construye desde la réplica salvo que use un snapshot.
+                    include_embeddings=LOCAL_VECTOR_MODE != "off" and not os.getenv("LOCAL_VECTOR_SNAPSHOT"),
+                    refresh_interval_seconds=float(os.getenv("CATALOG_MIRROR_REFRESH_INTERVAL_SECONDS", "1")),
+                    refresh_budget_ms=float(os.getenv("CATALOG_MIRROR_REFRESH_BUDGET_MS", "50")),
+                    full_reload_seconds=float(os.getenv("CATALOG_MIRROR_FULL_RELOAD_SECONDS", "3600")),
+                )
+            mirror = _catalog_mirror
+    try:
+        # La carga inicial es single-flight: los demás hilos esperan a la misma lectura.
+        mirror.refresh()
+    except Exception:
+        logger.warning(json.dumps({"event": "catalog_mirror_unavailable"}), exc_info=True)
+        return None
+    return mirror
+
+
+# pymongo y psycopg2 son bloqueantes: la concurrencia dentro de una invocación usa hilos.
+_io_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("HANDLER_MAX_WORKERS", "8")),
+    thread_name_prefix="search-api-io",
+)
+
+
+def _run_concurrently(
+    tasks: Dict[str, Callable[[], Any]],
+    timeout: Optional[float] = None,
+    task_timeouts: Optional[Dict[str, float]] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+    """Ejecuta tareas de I/O independientes en paralelo y devuelve `(resultados, errores)`.
+
+    Cada tarea espera como máximo su timeout propio (o `timeout`) y nunca más allá del
+    deadline de la invocación. De una tarea vencida sólo se cancela lo que aún no empezó:
+    si ya corre, su resultado se descarta pero el hilo sigue ocupado hasta que la llamada
+    termine. Por eso cada cliente acota sus llamadas por debajo de estos presupuestos
+    (`MONGO_TIMEOUT_MS`, `POSTGRES_STATEMENT_TIMEOUT_MS`, `POSTGRES_CONNECT_TIMEOUT_SECONDS`).
+    """
+    deadline = current_deadline()
+    if deadline.expired:
+        raise SearchApiError("Tiempo de espera agotado procesando la petición", 504)
+
+    started = time.monotonic()
+    futures = {name: _io_executor.submit(task) for name, task in tasks.items()}
+    results: Dict[str, Any] = {}
+    errors: Dict[str, Exception] = {}
+
+    for name, future in futures.items():
+        budget = (task_timeouts or {}).get(name, timeout)
+        remaining = deadline.remaining()
+        if budget is not None:
+            remaining = min(remaining, budget - (time.monotonic() - started))
+        try:
+            results[name] = future.result(timeout=max(remaining, 0.0))
+        except FutureTimeoutError:
+            future.cancel()
+            errors[name] = TimeoutError(f"La tarea '{name}' superó su tiempo límite")
+        except Exception as exc:
+            errors[name] = exc
+
+    return results, errors
+
+
 def _get_allowed_origins() -> List[str]:
     """Obtiene los orígenes permitidos desde variables de entorno."""
     cors_origin = os.getenv("CORS_ORIGIN", "")
@@ -32,6 +213,7 @@ def _get_allowed_origins() -> List[str]:
     return [origin for origin in origins if origin]
 
 
+@lru_cache(maxsize=1024)
 def _normalize_origin(origin: str) -> str:
     """Normaliza un origen para comparación."""
     if not origin or origin == "*":
@@ -45,7 +227,6 @@ def _normalize_origin(origin: str) -> str:
     
     # Normalizar a minúsculas y eliminar trailing slash
     try:
-        from urllib.parse import urlparse
         parsed = urlparse(sanitized)
         normalized = f"{parsed.scheme.lower()}://{parsed.netloc.lower()}"
         if parsed.port and parsed.hostname:
@@ -55,60 +236,48 @@ def _normalize_origin(origin: str) -> str:
         return sanitized.rstrip("/").lower()
 
 
-def _is_origin_allowed(origin: Optional[str], allowed_origins: List[str]) -> bool:
-    """Verifica si un origen está permitido."""
-    if not origin:
-        return True  # Requests sin origin header son permitidos (ej: curl)
-    
-    if "*" in allowed_origins:
-        return True
-    
-    normalized_origin = _normalize_origin(origin)
-    normalized_allowed = [_normalize_origin(o) for o in allowed_origins]
-    
-    return normalized_origin in normalized_allowed
+# La lista de orígenes se lee y normaliza una sola vez en la fase init.
+_ALLOWED_ORIGINS = _get_allowed_origins()
+_NORMALIZED_ALLOWED_ORIGINS = frozenset(_normalize_origin(origin) for origin in _ALLOWED_ORIGINS)
+_cors_headers_by_origin: Dict[str, Dict[str, str]] = {}
 
 
-def _build_cors_headers(request_origin: Optional[str]) -> Dict[str, str]:
-    """Construye los headers CORS dinámicamente basado en el origen de la petición."""
-    allowed_origins = _get_allowed_origins()
-    
-    # Si no hay origen en la petición y no permitimos todo
-    if not request_origin and "*" not in allowed_origins and allowed_origins:
-        request_origin = allowed_origins[0]
-    
-    # Verificar si el origen está permitido
-    if request_origin and not _is_origin_allowed(request_origin, allowed_origins):
-        # Si el origen no está permitido, usar el primer origen permitido
-        request_origin = allowed_origins[0] if allowed_origins and "*" not in allowed_origins else "*"
-    
-    # Determinar el valor del header Allow-Origin
-    if "*" in allowed_origins:
-        allow_origin = "*"
-    elif request_origin:
-        allow_origin = _normalize_origin(request_origin)
-    elif allowed_origins:
-        allow_origin = allowed_origins[0]
-    else:
-        allow_origin = "*"
-    
-    # Construir headers
-    headers = {
-        "Access-Control-Allow-Origin": allow_origin,
-        "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type,Authorization,X-Requested-With,Accept,Origin,user-id,x-user-id",
-        "Access-Control-Allow-Credentials": "false" if allow_origin == "*" else "true",
-    }
-    
-    # Agregar Vary header si no es wildcard
-    if allow_origin != "*":
-        headers["Vary"] = "Origin"
-    
+def _cors_headers_for(allow_origin: str) -> Dict[str, str]:
+    """Headers CORS memoizados por valor de `Access-Control-Allow-Origin` (compartidos: no mutar)."""
+    headers = _cors_headers_by_origin.get(allow_origin)
+    if headers is None:
+        headers = {
+            "Access-Control-Allow-Origin": allow_origin,
+            "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type,Authorization,X-Requested-With,Accept,Origin,user-id,x-user-id",
+            "Access-Control-Allow-Credentials": "false" if allow_origin == "*" else "true",
+        }
+        # Agregar Vary header si no es wildcard
+        if allow_origin != "*":
+            headers["Vary"] = "Origin"
+        _cors_headers_by_origin[allow_origin] = headers
     return headers
 
 
-def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
+def _build_cors_headers(request_origin: Optional[str]) -> Dict[str, str]:
+    """Construye los headers CORS según el origen de la petición.
+
+    Los valores posibles de `Allow-Origin` son `*` o un origen de la lista, así que el mapa
+    memoizado no crece con orígenes no permitidos: éstos reciben el primer origen permitido.
+    """
+    if not _ALLOWED_ORIGINS or "*" in _ALLOWED_ORIGINS:
+        return _cors_headers_for("*")
+    if request_origin:
+        normalized = _normalize_origin(request_origin)
+        if normalized in _NORMALIZED_ALLOWED_ORIGINS:
+            return _cors_headers_for(normalized)
+    return _cors_headers_for(_normalize_origin(_ALLOWED_ORIGINS[0]))
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     logger.debug("Incoming event: %s", json.dumps(event))
+    start_deadline(context)
+    trace = start_trace()
 
     # Obtener el origen de la petición
     headers = event.get("headers") or {}
@@ -119,106 +288,732 @@ def lambda_handler(event: Dict[str, Any], _context: Any) -> Dict[str, Any]:
 
     method = _get_http_method(event)
     path = _get_path(event)
-
-    # Manejar preflight OPTIONS
+    route = _router.resolve(method, path)
+
+    response = _dispatch(event, method, path, route, cors_headers)
+    _compress_response(response, headers.get("accept-encoding") or headers.get("Accept-Encoding"))
+
+    if SERVER_TIMING_ENABLED:
+        response["headers"] = {**response["headers"], "Server-Timing": server_timing_header(trace)}
+        if "Access-Control-Allow-Origin" in cors_headers:
+            response["headers"]["Timing-Allow-Origin"] = cors_headers["Access-Control-Allow-Origin"]
+    emit_metrics(
+        trace,
+        f"{method} {route.template if route is not None else 'other'}",
+        response["statusCode"],
+        getattr(context, "aws_request_id", None),
+    )
+    return response
+
+
+def _compress_response(response: Dict[str, Any], accept_encoding: Optional[str]) -> None:
+    """Comprime el body si el cliente lo acepta; API Gateway lo entrega como binario."""
+    if not response.get("body") or base64 is None:
+        return
+    with span("compress") as current:
+        compressed = compress_body(response["body"], accept_encoding)
+        if compressed is None:
+            return
+        encoding, payload = compressed
+        current.set(encoding=encoding, bytes=len(payload))
+    headers = dict(response["headers"])
+    headers["Content-Encoding"] = encoding
+    headers["Vary"] = f"{headers['Vary']}, Accept-Encoding" if headers.get("Vary") else "Accept-Encoding"
+    response["headers"] = headers
+    response["body"] = base64.b64encode(payload).decode("ascii")
+    response["isBase64Encoded"] = True
+
+
+def _dispatch(
+    event: Dict[str, Any],
+    method: str,
+    path: str,
+    route: Optional[RouteMatch],
+    cors_headers: Dict[str, str],
+) -> Dict[str, Any]:
+    # Manejar preflight OPTIONS; `Max-Age` evita repetirlo (y la invocación) en cada petición.
     if method == "OPTIONS":
         return {
             "statusCode": 204,
-            "headers": cors_headers,
+            "headers": {**cors_headers, "Access-Control-Max-Age": CORS_MAX_AGE_SECONDS},
             "body": ""
         }
 
     try:
-        if method == "POST" and path == "/api/search":
-            payload = _parse_json_body(event)
-            return _build_response(200, _handle_search(payload), cors_headers)
-
-        if method == "GET" and path == "/api/courses/categories":
-            return _build_response(200, _handle_get_categories(), cors_headers)
-
-        if method == "GET" and path == "/api/courses/trending":
-            limit = _get_query_param(event, "limit", default=12)
-            return _build_response(200, _handle_get_trending(limit), cors_headers)
-
-        if method == "GET" and path == "/api/courses/favorites":
-            user_id = _extract_user_id(event)
-            if not user_id:
-                raise SearchApiError("No se encontró el usuario autenticado", 401)
-            return _build_response(200, _handle_get_favorites(user_id), cors_headers)
-
-        course_match = re.match(r"^/api/courses/(?P<course_id>[^/]+)$", path)
-        if method == "GET" and course_match:
-            course_id = course_match.group("course_id")
-            return _build_response(200, _handle_get_course(course_id), cors_headers)
-
-        favorite_match = re.match(r"^/api/courses/(?P<course_id>[^/]+)/favorite$", path)
-        if method == "POST" and favorite_match:
-            user_id = _extract_user_id(event)
-            if not user_id:
-                raise SearchApiError("No se encontró el usuario autenticado", 401)
-            course_id = favorite_match.group("course_id")
-            payload = _parse_json_body(event, default={})
-            return _build_response(200, _handle_toggle_favorite(user_id, course_id, payload), cors_headers)
-
-        raise SearchApiError(f"Ruta no encontrada: {method} {path}", 404)
+        if route is None:
+            raise SearchApiError(f"Ruta no encontrada: {method} {path}", 404)
+        if route.handler is None:
+            logger.warning("Método no permitido: %s %s", method, route.template)
+            allow = ", ".join(route.allowed_methods + ("OPTIONS",))
+            return _build_response(
+                405,
+                {"error": f"Método {method} no permitido en {route.template}"},
+                {**cors_headers, "Allow": allow},
+            )
+        return _build_response(200, route.handler(event, **route.params), cors_headers)
 
     except SearchApiError as exc:
         logger.warning("Error controlado: %s", exc.message)
         return _build_response(exc.status_code, {"error": exc.message}, cors_headers)
+    except DependencyUnavailable as exc:
+        logger.warning("Dependencia no disponible: %s", exc)
+        return _build_response(503, {"error": "Servicio temporalmente no disponible"}, cors_headers)
     except Exception as exc:
         logger.exception("Error inesperado procesando la petición")
         return _build_response(500, {"error": "Error interno del servidor"}, cors_headers)
 
 
-def _handle_search(payload: Dict[str, Any]) -> Dict[str, Any]:
-    query = (payload.get("query") or "").strip()
-    if len(query) < 3:
-        raise SearchApiError("El parámetro 'query' debe tener al menos 3 caracteres", 400)
+# Cada ruta recibe el evento y sus parámetros de ruta y devuelve el body de la respuesta 200.
+@_router.route("POST", "/api/search")
+def _route_search(event: Dict[str, Any]) -> Dict[str, Any]:
+    return _handle_search(_parse_json_body(event), _extract_user_id(event))
 
-    limit = int(payload.get("limit") or 12)
-    limit = max(1, min(limit, 40))
 
-    filters = payload.get("filters") or {}
+@_router.route("POST", "/api/search/batch")
+def _route_search_batch(event: Dict[str, Any]) -> Dict[str, Any]:
+    return _handle_search_batch(_parse_json_body(event))
 
-    bedrock = get_bedrock_client()
-    mongo = get_mongo_client()
 
-    embedding = bedrock.generate_embedding(query)
-    courses = mongo.search_courses(embedding, limit=limit, filters=filters)
+@_router.route("GET", "/api/courses/categories")
+def _route_categories(event: Dict[str, Any]) -> Dict[str, Any]:
+    return _handle_get_categories()
 
-    return {
+
+@_router.route("GET", "/api/courses/trending")
+def _route_trending(event: Dict[str, Any]) -> Dict[str, Any]:
+    limit = _get_query_param(event, "limit", default=12)
+    projection = _parse_projection(event.get("queryStringParameters") or {}, SUMMARY_FIELDS)
+    include_favorites = _get_query_string(event, "include_favorite_status") == "true"
+    return _handle_get_trending(limit, projection, _extract_user_id(event) if include_favorites else None)
+
+
+@_router.route("GET", "/api/courses/favorites")
+def _route_favorites(event: Dict[str, Any]) -> Dict[str, Any]:
+    user_id = _extract_user_id(event)
+    if not user_id:
+        raise SearchApiError("No se encontró el usuario autenticado", 401)
+    limit = _get_query_param(event, "limit", default=DEFAULT_FAVORITES_LIMIT)
+    cursor = _get_query_string(event, "cursor")
+    projection = _parse_projection(event.get("queryStringParameters") or {}, DETAIL_FIELDS)
+    return _handle_get_favorites(user_id, limit, cursor, projection)
+
+
+@_router.route("GET", "/api/courses/{course_id}")
+def _route_course(event: Dict[str, Any], course_id: str) -> Dict[str, Any]:
+    projection = _parse_projection(event.get("queryStringParameters") or {}, DETAIL_FIELDS)
+    return _handle_get_course(course_id, projection)
+
+
+@_router.route("GET", "/api/courses/{course_id}/similar")
+def _route_similar(event: Dict[str, Any], course_id: str) -> Dict[str, Any]:
+    params = event.get("queryStringParameters") or {}
+    limit = _get_query_param(event, "limit", default=8)
+    filters = {name: params[name] for name in FILTER_SPECS if params.get(name) not in (None, "")}
+    projection = _parse_projection(params, SUMMARY_FIELDS)
+    return _handle_get_similar(course_id, limit, filters, projection)
+
+
+@_router.route("POST", "/api/courses/{course_id}/favorite")
+def _route_toggle_favorite(event: Dict[str, Any], course_id: str) -> Dict[str, Any]:
+    user_id = _extract_user_id(event)
+    if not user_id:
+        raise SearchApiError("No se encontró el usuario autenticado", 401)
+    payload = _parse_json_body(event, default={})
+    return _handle_toggle_favorite(user_id, course_id, payload)
+
+
+def _handle_search(payload: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Primera página o, con `cursor`, páginas siguientes de la misma búsqueda.
+
+    La primera página pide `SEARCH_RESULT_SET_SIZE` candidatos y guarda su ranking; las
+    siguientes se sirven desde ese ranking con una sola hidratación por ids, sin volver a
+    llamar a Bedrock ni a `$vectorSearch`. Con `personalize` y usuario identificado, el
+    vector de la consulta se mezcla con el vector de preferencia del usuario. Con
+    `include_favorite_status` cada resultado indica `is_favorite`.
+    """
+    offset = 0
+    raw_cursor = payload.get("cursor")
+    if raw_cursor:
+        position = _decode_cursor(str(raw_cursor))
+        try:
+            offset = int(position["o"])
+            payload = {
+                **payload,
+                "query": position["q"],
+                "filters": position["f"],
+                "mode": position["m"],
+                "personalize": bool(position.get("p")),
+            }
+        except (KeyError, TypeError, ValueError) as exc:
+            raise SearchApiError("El parámetro 'cursor' no es válido", 400) from exc
+        if offset < 0:
+            raise SearchApiError("El parámetro 'cursor' no es válido", 400)
+
+    query, limit, filters, mode = _parse_search_request(payload)
+    projection = _parse_projection(payload, SUMMARY_FIELDS)
+    # Las facetas describen el conjunto de candidatos entero: sólo se calculan en la primera página.
+    facet_names = _parse_facets(payload.get("facets")) if not offset else []
+    depth = max(limit, SEARCH_RESULT_SET_SIZE)
+    requested_personalization = payload.get("personalize") in (True, "true")
+    personalize = requested_personalization and user_id is not None and mode != "lexical"
+    key = _result_set_key(query, filters, mode, user_id if personalize else None)
+    include_favorites = payload.get("include_favorite_status") in (True, "true") and user_id is not None
+
+    # Los campos de las facetas se leen aunque `fields` no los pida y se recortan al final.
+    search_projection = projection
+    if facet_names and projection.fields is not None:
+        missing = [FILTER_SPECS[name]["field"] for name in facet_names]
+        search_projection = CourseProjection(
+            projection.fields + tuple(field for field in missing if field not in projection.fields),
+            projection.snippet_length,
+        )
+
+    facets = None
+    favorite_ids: Optional[Set[str]] = None
+    ranking = _search_result_sets.get(key) if offset else None
+    if ranking is None:
+        # Primera página, o el ranking caducó o se guardó en otro contenedor: se recalcula
+        # una vez (el embedding de la consulta suele estar en caché). Con
+        # `include_favorite_status`, Postgres se consulta en paralelo con la búsqueda.
+        def _search() -> List[Dict[str, Any]]:
+            preference = _get_preference_vector(user_id) if personalize else None
+            return _run_search(
+                query, depth, filters, mode, projection=search_projection, preference=preference
+            )
+
+        if include_favorites:
+            ranked, favorite_ids = _run_with_favorite_ids(
+                _search,
+                user_id,
+                lambda ranked: [course["course_id"] for course in ranked[offset:offset + limit]],
+            )
+        else:
+            ranked = _search()
+        ranking = [(course["course_id"], course.get("score")) for course in ranked]
+        _search_result_sets.put(key, ranking)
+        if facet_names:
+            with span("search.facets", candidates=len(ranked)):
+                facets = compute_facets(ranked, facet_names)
+        courses = ranked[offset:offset + limit]
+        if search_projection is not projection:
+            courses = [CourseProjection(projection.fields).apply(course) for course in courses]
+    elif include_favorites:
+        # Los ids del tramo ya se conocen: Postgres y la hidratación corren en paralelo.
+        page = ranking[offset:offset + limit]
+        results, errors = _run_concurrently(
+            {
+                "courses": partial(_hydrate_ranking, page, projection),
+                "favorites": partial(_get_favorite_ids, user_id, [course_id for course_id, _score in page]),
+            },
+            task_timeouts={"favorites": COURSE_HYDRATION_TIMEOUT_SECONDS},
+        )
+        if "courses" in errors:
+            raise errors["courses"]
+        courses = results["courses"]
+        favorite_ids = results.get("favorites")
+    else:
+        courses = _hydrate_ranking(ranking[offset:offset + limit], projection)
+    if include_favorites:
+        courses = _annotate_favorites(courses, favorite_ids)
+
+    next_offset = offset + limit
+    next_cursor = None
+    if SEARCH_RESULT_SET_SIZE > 0 and next_offset < len(ranking):
+        position = {"q": query, "f": filters, "m": mode, "o": next_offset}
+        if personalize:
+            position["p"] = 1
+        next_cursor = _encode_cursor(position)
+    response = {
         "results": courses,
         "total": len(courses),
         "query": query,
+        "mode": mode,
+        "next_cursor": next_cursor,
     }
+    if facets is not None:
+        response["facets"] = facets
+    if requested_personalization:
+        response["personalized"] = personalize
+    return response
+
+
+def _parse_facets(raw: Any) -> List[str]:
+    """`facets`: `true` para todas, o lista/texto separado por comas con nombres de filtro."""
+    if raw in (None, False, "", []):
+        return []
+    if raw is True or (isinstance(raw, str) and raw.lower() == "true"):
+        return list(FILTER_SPECS)
+    if isinstance(raw, str):
+        names = [name.strip() for name in raw.split(",") if name.strip()]
+    elif isinstance(raw, list) and all(isinstance(name, str) for name in raw):
+        names = [name.strip() for name in raw if name.strip()]
+    else:
+        raise SearchApiError("El parámetro 'facets' debe ser true o una lista de nombres", 400)
+    unknown = sorted(set(names) - set(FILTER_SPECS))
+    if unknown:
+        raise SearchApiError(f"Facetas desconocidas: {', '.join(unknown)}", 400)
+    return list(dict.fromkeys(names))
+
+
+def _result_set_key(query: str, filters: Dict[str, Any], mode: str, user_id: Optional[str] = None) -> str:
+    raw = json.dumps([query, filters, mode, user_id], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _hydrate_ranking(
+    ranking: List[Tuple[str, Any]],
+    projection: CourseProjection = DEFAULT_PROJECTION,
+) -> List[Dict[str, Any]]:
+    """Cursos de un tramo del ranking con su score; se omiten los que ya no existen."""
+    # Sin `fields` se devuelven los campos de búsqueda, no el detalle con metadatos.
+    projection = CourseProjection(projection.fields or SUMMARY_FIELDS, projection.snippet_length)
+    with span("search.hydrate_page", ids=len(ranking)):
+        courses = _get_courses([course_id for course_id, _score in ranking], projection)
+    return [
+        with_fields(courses[course_id], score=score)
+        for course_id, score in ranking
+        if courses.get(course_id)
+    ]
+
+
+def _handle_search_batch(payload: Dict[str, Any]) -> Dict[str, Any]:
+    raw_queries = payload.get("queries")
+    if not isinstance(raw_queries, list) or not raw_queries:
+        raise SearchApiError("El parámetro 'queries' debe ser una lista no vacía", 400)
+    if len(raw_queries) > MAX_BATCH_QUERIES:
+        raise SearchApiError(f"Se admiten como máximo {MAX_BATCH_QUERIES} consultas por lote", 400)
+
+    # Cada elemento puede ser un texto o un objeto; los campos ausentes heredan del lote.
+    defaults = {
+        key: payload[key]
+        for key in ("limit", "filters", "mode", "fields", "snippet_length")
+        if key in payload
+    }
+    items: List[Dict[str, Any]] = []
+    for raw in raw_queries:
+        request = {**defaults, **(raw if isinstance(raw, dict) else {"query": raw})}
+        try:
+            query, limit, filters, mode = _parse_search_request(request)
+            projection = _parse_projection(request, SUMMARY_FIELDS)
+        except SearchApiError as exc:
+            items.append({"query": request.get("query"), "error": exc.message, "status": exc.status_code})
+            continue
+        items.append(
+            {"query": query, "limit": limit, "filters": filters, "mode": mode, "projection": projection}
+        )
+
+    to_embed = [item["query"] for item in items if item.get("mode") in {"vector", "hybrid"}]
+    embeddings: Dict[str, List[float]] = {}
+    embedding_errors: Dict[str, Exception] = {}
+    if to_embed:
+        embeddings, embedding_errors = get_bedrock_client().generate_embeddings(to_embed)
+
+    tasks: Dict[str, Callable[[], Any]] = {}
+    for position, item in enumerate(items):
+        if "error" in item:
+            continue
+        query, mode = item["query"], item["mode"]
+        if query in embedding_errors:
+            if mode == "vector":
+                continue
+            # Híbrida sin embedding: se degrada a léxica en lugar de fallar.
+            mode = "lexical"
+        tasks[str(position)] = partial(
+            _run_search,
+            query,
+            item["limit"],
+            item["filters"],
+            mode,
+            embeddings.get(query),
+            item["projection"],
+        )
+    results, errors = _run_concurrently(tasks)
+
+    responses: List[Dict[str, Any]] = []
+    for position, item in enumerate(items):
+        if "error" in item:
+            responses.append(item)
+            continue
+        query, key = item["query"], str(position)
+        if key not in results:
+            message, status = _describe_error(errors.get(key) or embedding_errors[query])
+            responses.append({"query": query, "mode": item["mode"], "error": message, "status": status})
+            continue
+        courses = results[key]
+        responses.append({"query": query, "mode": item["mode"], "results": courses, "total": len(courses)})
+
+    return {"results": responses, "total": len(responses)}
+
+
+def _parse_search_request(payload: Dict[str, Any]) -> Tuple[str, int, Dict[str, Any], str]:
+    query = str(payload.get("query") or "").strip()
+    if len(query) < 3:
+        raise SearchApiError("El parámetro 'query' debe tener al menos 3 caracteres", 400)
+    if len(query) > MAX_QUERY_LENGTH:
+        raise SearchApiError(f"El parámetro 'query' admite como máximo {MAX_QUERY_LENGTH} caracteres", 400)
+
+    try:
+        limit = int(payload.get("limit") or 12)
+    except (TypeError, ValueError) as exc:
+        raise SearchApiError("El parámetro 'limit' debe ser numérico", 400) from exc
+    limit = max(1, min(limit, 40))
+
+    filters = payload.get("filters") or {}
+    if not isinstance(filters, dict):
+        raise SearchApiError("El parámetro 'filters' debe ser un objeto", 400)
+
+    mode = str(payload.get("mode") or DEFAULT_SEARCH_MODE).lower()
+    if mode not in SEARCH_MODES:
+        raise SearchApiError("El parámetro 'mode' debe ser hybrid, vector o lexical", 400)
+
+    return query, limit, filters, mode
+
+
+def _parse_projection(source: Dict[str, Any], allowed: Tuple[str, ...]) -> CourseProjection:
+    """`fields` y `snippet_length` del body o de la query string."""
+    try:
+        return parse_projection(source.get("fields"), source.get("snippet_length"), allowed)
+    except ValueError as exc:
+        raise SearchApiError(str(exc), 400) from exc
+
+
+def _run_search(
+    query: str,
+    limit: int,
+    filters: Dict[str, Any],
+    mode: str,
+    embedding: Optional[List[float]] = None,
+    projection: CourseProjection = DEFAULT_PROJECTION,
+    preference: Optional[List[float]] = None,
+) -> List[Dict[str, Any]]:
+    """Ejecuta una búsqueda; con `embedding` precalculado no se llama a Bedrock.
+
+    Cada fuente aplica `projection` a sus resultados (Atlas ya en la consulta), así que la
+    fusión híbrida trabaja sobre cursos ya recortados.
+    """
+    mirror = _get_catalog_mirror()
+    if mirror is not None and mirror.excludes(filters):
+        # Ningún curso tiene ese valor: no hace falta embedding ni consulta.
+        increment("catalog_mirror.filter_short_circuit")
+        return []
+    if mode == "lexical":
+        # Camino sin Bedrock: responde desde el índice en memoria.
+        return _lexical_search(query, limit, filters, projection)
+    if mode == "vector":
+        try:
+            return _vector_search(query, limit, filters, embedding, projection, preference)
+        except DependencyUnavailable as exc:
+            # Con Bedrock o Atlas caídos se degrada al índice léxico en lugar de responder 503.
+            logger.warning(json.dumps({"event": "search_degraded", "mode": "lexical", "reason": str(exc)}))
+            return _lexical_search(query, limit, filters, projection)
+
+    depth = limit * HYBRID_DEPTH_FACTOR
+    if embedding is not None:
+        # Sin la espera de Bedrock no compensa paralelizar: el léxico es en memoria.
+        ranked = [_vector_search(query, depth, filters, embedding, projection, preference)]
+        ranked.append(_lexical_search(query, depth, filters, projection))
+        return reciprocal_rank_fusion(ranked, limit=limit)
+
+    results, errors = _run_concurrently(
+        {
+            "vector": partial(_vector_search, query, depth, filters, None, projection, preference),
+            "lexical": partial(_lexical_search, query, depth, filters, projection),
+        }
+    )
+    if "vector" in errors and "lexical" in errors:
+        raise errors["vector"]
+    for source, exc in errors.items():
+        logger.warning("Búsqueda híbrida sin resultados %s: %s", source, exc)
+    return reciprocal_rank_fusion(
+        [results.get("vector", []), results.get("lexical", [])],
+        limit=limit,
+    )
+
+
+def _describe_error(exc: Exception) -> Tuple[str, int]:
+    if isinstance(exc, SearchApiError):
+        return exc.message, exc.status_code
+    if isinstance(exc, TimeoutError):
+        return "Tiempo de espera agotado", 504
+    if isinstance(exc, DependencyUnavailable):
+        return "Servicio temporalmente no disponible", 503
+    logger.error("Error en consulta del lote: %s", exc, exc_info=exc)
+    return "Error interno del servidor", 500
+
+
+def _vector_search(
+    query: str,
+    limit: int,
+    filters: Dict[str, Any],
+    embedding: Optional[List[float]] = None,
+    projection: CourseProjection = DEFAULT_PROJECTION,
+    preference: Optional[List[float]] = None,
+) -> List[Dict[str, Any]]:
+    if embedding is None:
+        embedding = get_bedrock_client().generate_embedding(query)
+    if preference is not None:
+        embedding = blend(embedding, preference, PERSONALIZATION_WEIGHT)
+    return _get_vector_engine().search_courses(
+        embedding, limit=limit, filters=filters, projection=projection
+    )
+
+
+def _get_preference_vector(user_id: str) -> Optional[List[float]]:
+    """Vector de preferencia cacheado; si no se puede calcular se busca sin personalizar."""
+
+    def _load() -> Dict[str, List[float]]:
+        # Sólo los más recientes: el LIMIT va en la consulta, no se leen todos los favoritos.
+        entries, _total = get_favorites_repository().list_favorites_page(
+            user_id, PERSONALIZATION_MAX_FAVORITES
+        )
+        course_ids = [entry["course_id"] for entry in entries]
+        return _get_course_embeddings(course_ids) if course_ids else {}
 
+    try:
+        with span("personalization.preference"):
+            return _preference_vectors.get(user_id, _load)
+    except Exception as exc:
+        logger.warning(json.dumps({"event": "personalization_unavailable", "error": str(exc)}))
+        return None
+
+
+def _get_course_embeddings(course_ids: List[str]) -> Dict[str, List[float]]:
+    mirror = _get_catalog_mirror()
+    if mirror is not None and mirror.has_embeddings:
+        return mirror.get_embeddings(course_ids)
+    return get_mongo_client().get_course_embeddings(course_ids)
+
+
+def _get_vector_engine() -> Any:
+    """Atlas directamente, o el enrutador adaptativo si el índice local está habilitado."""
+    global _vector_engine
+    if LOCAL_VECTOR_MODE == "off":
+        return get_mongo_client()
+    if _vector_engine is None:
+        from utils.vector_index import AdaptiveVectorSearch
+
+        with _singletons_lock:
+            if _vector_engine is None:
+                _vector_engine = AdaptiveVectorSearch(
+                    get_mongo_client(),
+                    _get_local_vector_index,
+                    mode=LOCAL_VECTOR_MODE,
+                    latency_threshold_ms=float(os.getenv("LOCAL_VECTOR_LATENCY_THRESHOLD_MS", "800")),
+                )
+    return _vector_engine
+
+
+def _get_local_vector_index() -> Any:
+    from utils.vector_index import LocalVectorIndex, snapshot_version
+
+    snapshot = os.getenv("LOCAL_VECTOR_SNAPSHOT")
+    if snapshot:
+        return _catalog_snapshots.get(
+            "local_vector_index",
+            lambda: LocalVectorIndex.load(snapshot),
+            lambda: snapshot_version(snapshot),
+        )
+
+    mirror = _get_catalog_mirror()
+    if mirror is not None:
+        return _catalog_snapshots.get(
+            "local_vector_index",
+            lambda: LocalVectorIndex.from_courses(mirror.courses_with_embeddings()),
+            lambda: mirror.revision,
+        )
+
+    mongo = get_mongo_client()
+    return _catalog_snapshots.get(
+        "local_vector_index",
+        lambda: LocalVectorIndex.from_courses(mongo.get_catalog_snapshot(include_embeddings=True)),
+        mongo.get_catalog_version,
+    )
+
+
+def _prewarm_local_vector_index() -> None:
+    # En `fallback` el enrutador carga el índice en segundo plano; en init se deja listo.
+    if LOCAL_VECTOR_MODE == "fallback":
+        _get_vector_engine().load_local()
+    else:
+        _get_local_vector_index()
+
+
+def _lexical_search(
+    query: str,
+    limit: int,
+    filters: Dict[str, Any],
+    projection: CourseProjection = DEFAULT_PROJECTION,
+) -> List[Dict[str, Any]]:
+    index = _get_lexical_index()
+    with span("lexical.search") as current:
+        results = index.search(query, limit, filters)
+        current.set(results=len(results))
+    return [projection.apply(course) for course in results]
+
+
+def _get_lexical_index() -> LexicalIndex:
+    mirror = _get_catalog_mirror()
+    if mirror is not None:
+        return _catalog_snapshots.get(
+            "lexical_index",
+            lambda: LexicalIndex(mirror.courses()),
+            lambda: mirror.revision,
+        )
 
-def _handle_get_course(course_id: str) -> Dict[str, Any]:
     mongo = get_mongo_client()
-    course = mongo.get_course_by_id(course_id)
+    return _catalog_snapshots.get(
+        "lexical_index",
+        lambda: LexicalIndex(mongo.get_catalog_snapshot()),
+        mongo.get_catalog_version,
+    )
+
+
+def _handle_get_course(
+    course_id: str,
+    projection: CourseProjection = DEFAULT_PROJECTION,
+) -> Dict[str, Any]:
+    course = _get_course(course_id, projection)
     if not course:
         raise SearchApiError("Curso no encontrado", 404)
     return {"course": course}
 
 
-def _handle_get_favorites(user_id: str) -> Dict[str, Any]:
+def _get_course(
+    course_id: str,
+    projection: CourseProjection = DEFAULT_PROJECTION,
+) -> Optional[Dict[str, Any]]:
+    """Curso desde la réplica en memoria si está activa (es autoritativa) o desde Atlas."""
+    mirror = _get_catalog_mirror()
+    if mirror is None:
+        return get_mongo_client().get_course_by_id(course_id, projection)
+    course = mirror.get(course_id)
+    return projection.apply(course) if course is not None else None
+
+
+def _get_courses(
+    course_ids: List[str],
+    projection: CourseProjection = DEFAULT_PROJECTION,
+) -> Dict[str, Optional[Dict[str, Any]]]:
+    mirror = _get_catalog_mirror()
+    if mirror is None:
+        return get_mongo_client().get_courses_by_ids(course_ids, projection)
+    return {
+        course_id: projection.apply(course) if course is not None else None
+        for course_id, course in mirror.get_many(course_ids).items()
+    }
+
+
+def _handle_get_similar(
+    course_id: str,
+    limit: int,
+    filters: Dict[str, Any],
+    projection: CourseProjection = DEFAULT_PROJECTION,
+) -> Dict[str, Any]:
+    """Cursos parecidos usando el embedding guardado del curso como vector de consulta.
+
+    No llama a Bedrock. Se cachea la lista máxima por curso, filtros y versión del catálogo;
+    cada petición toma su prefijo y aplica `projection`.
+    """
+    limit = max(1, min(limit, MAX_SIMILAR_LIMIT))
+    filters = normalize_filters(filters)
+    raw_key = json.dumps([course_id, filters, _catalog_version()], sort_keys=True, default=str)
+    key = hashlib.sha1(raw_key.encode("utf-8")).hexdigest()
+
+    ranked = _similar_courses.get(key)
+    if ranked is None:
+        source = _get_source_embedding(course_id)
+        if source is None:
+            raise SearchApiError("Curso no encontrado", 404)
+        source_id, embedding = source
+        if not embedding:
+            ranked = []
+        else:
+            # Se pide uno más: el propio curso suele ser el primer resultado.
+            results = _get_vector_engine().search_courses(
+                embedding, limit=MAX_SIMILAR_LIMIT + 1, filters=filters
+            )
+            ranked = [
+                course if isinstance(course, EncodedCourse) else EncodedCourse.encode(course)
+                for course in results
+                if course["course_id"] != source_id
+            ][:MAX_SIMILAR_LIMIT]
+        _similar_courses.put(key, ranked)
+
+    courses = [projection.apply(course) for course in ranked[:limit]]
+    return {"course_id": course_id, "courses": courses, "total": len(courses)}
+
+
+def _get_source_embedding(course_id: str) -> Optional[Tuple[str, Optional[List[float]]]]:
+    """`(course_id canónico, embedding)` desde la réplica si tiene embeddings, o desde Atlas."""
+    mirror = _get_catalog_mirror()
+    if mirror is not None and mirror.has_embeddings:
+        course = mirror.get(course_id)
+        if course is None:
+            return None
+        return course["course_id"], mirror.get_embeddings([course_id]).get(course_id)
+    return get_mongo_client().get_course_embedding(course_id)
+
+
+def _catalog_version() -> Any:
+    """Versión del catálogo sin consultar Atlas en cada petición (instantánea con TTL)."""
+    mirror = _get_catalog_mirror()
+    if mirror is not None:
+        return mirror.revision
+    return _catalog_snapshots.get("catalog_version", get_mongo_client().get_catalog_version)
+
+
+def _handle_get_favorites(
+    user_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: CourseProjection = DEFAULT_PROJECTION,
+) -> Dict[str, Any]:
+    limit = max(1, min(limit, MAX_FAVORITES_LIMIT))
+    after = None
+    if cursor:
+        position = _decode_cursor(cursor)
+        after = (position.get("c"), position.get("f"))
+        try:
+            datetime.fromisoformat(after[0])
+            uuid.UUID(after[1])
+        except (TypeError, ValueError) as exc:
+            raise SearchApiError("El parámetro 'cursor' no es válido", 400) from exc
+
     favorites_repo = get_favorites_repository()
-    entries = favorites_repo.list_favorites(user_id)
+    # Se pide una fila extra para saber si existe una página siguiente.
+    entries, total = favorites_repo.list_favorites_page(user_id, limit + 1, after)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
     if not entries:
-        return {"favorites": [], "total": 0}
+        return {"favorites": [], "total": total, "next_cursor": None}
+
+    next_cursor = None
+    if has_more:
+        last = entries[-1]
+        raw_created = last["created_at"]
+        next_cursor = _encode_cursor(
+            {
+                "c": raw_created.isoformat() if hasattr(raw_created, "isoformat") else raw_created,
+                "f": last["favorite_id"],
+            }
+        )
+
+    course_ids = [entry["course_id"] for entry in entries]
+    results, errors = _run_concurrently(
+        {"courses": lambda: _get_courses(course_ids, projection)},
+        timeout=COURSE_HYDRATION_TIMEOUT_SECONDS,
+    )
+    courses: Dict[str, Optional[Dict[str, Any]]] = results.get("courses") or {}
+    if "courses" in errors:
+        # Sin hidratación se devuelven igualmente los favoritos con su fecha.
+        logger.warning("No se pudieron obtener los cursos de favoritos: %s", errors["courses"])
 
-    mongo = get_mongo_client()
     favorites: List[Dict[str, Any]] = []
-
     for entry in entries:
         course_id = entry["course_id"]
         raw_added = entry.get("created_at")
         added_at = raw_added.isoformat() if hasattr(raw_added, "isoformat") else raw_added
-        course = None
-        try:
-            course = mongo.get_course_by_id(course_id)
-        except Exception as exc:  # pragma: no cover - log and continue
-            logger.warning("No se pudo obtener curso %s de favoritos: %s", course_id, exc)
+        course = courses.get(course_id)
 
         if course:
             favorites.append(
@@ -236,21 +1031,119 @@ def _handle_get_favorites(user_id: str) -> Dict[str, Any]:
                 }
             )
 
-    return {"favorites": favorites, "total": len(favorites)}
+    return {"favorites": favorites, "total": total, "next_cursor": next_cursor}
 
 
 def _handle_get_categories() -> Dict[str, Any]:
+    mirror = _get_catalog_mirror()
+    if mirror is not None:
+        return {"categories": mirror.categories()}
+
     mongo = get_mongo_client()
-    categories = mongo.get_categories()
+    categories = _catalog_snapshots.get("categories", mongo.get_categories, mongo.get_catalog_version)
     return {"categories": categories}
 
 
-def _handle_get_trending(limit: int) -> Dict[str, Any]:
+def _handle_get_trending(
+    limit: int,
+    projection: CourseProjection = DEFAULT_PROJECTION,
+    user_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Cursos en tendencia; con `user_id` cada curso indica `is_favorite`."""
+    limit = max(1, min(limit, MAX_TRENDING_LIMIT))
+    mirror = _get_catalog_mirror()
+    if mirror is not None:
+        courses = [projection.apply(course) for course in mirror.trending(limit)]
+        if user_id is not None:
+            # Los ids salen de memoria: Postgres es la única E/S y no hay nada que solapar.
+            courses = _annotate_favorites(
+                courses, _get_favorite_ids(user_id, [course["course_id"] for course in courses])
+            )
+        return {"courses": courses, "total": len(courses)}
+
     mongo = get_mongo_client()
-    courses = mongo.get_trending_courses(limit=limit)
+    # Se cachea una sola instantánea con el límite máximo y cada petición toma su prefijo.
+    load_ranked = partial(
+        _catalog_snapshots.get,
+        "trending",
+        lambda: [
+            EncodedCourse.encode(course)
+            for course in mongo.get_trending_courses(limit=MAX_TRENDING_LIMIT)
+        ],
+        mongo.get_catalog_version,
+    )
+    favorite_ids: Optional[Set[str]] = None
+    if user_id is not None:
+        ranked, favorite_ids = _run_with_favorite_ids(
+            load_ranked, user_id, lambda ranked: [course["course_id"] for course in ranked[:limit]]
+        )
+    else:
+        ranked = load_ranked()
+    # La instantánea guarda los cursos completos; los campos pedidos se recortan por petición.
+    courses = [projection.apply(course) for course in ranked[:limit]]
+    if user_id is not None:
+        courses = _annotate_favorites(courses, favorite_ids)
     return {"courses": courses, "total": len(courses)}
 
 
+def _run_with_favorite_ids(
+    task: Callable[[], Any],
+    user_id: str,
+    page_ids: Callable[[Any], List[str]],
+) -> Tuple[Any, Optional[Set[str]]]:
+    """Ejecuta `task` mientras Postgres lee los favoritos del usuario; devuelve ambos.
+
+    Los ids de la página salen de `task`, así que en paralelo se leen hasta
+    `FAVORITES_PREFETCH_LIMIT` favoritos. Si el usuario tiene más, se consulta después por
+    los ids de la página (`page_ids(resultado)`).
+    """
+    results, errors = _run_concurrently(
+        {"task": task, "favorites": partial(_prefetch_favorite_ids, user_id)},
+        task_timeouts={"favorites": COURSE_HYDRATION_TIMEOUT_SECONDS},
+    )
+    if "task" in errors:
+        raise errors["task"]
+    result = results["task"]
+    if "favorites" in errors:
+        # Los resultados se devuelven igualmente, sin `is_favorite`.
+        logger.warning(
+            json.dumps({"event": "favorite_status_unavailable", "error": str(errors["favorites"])})
+        )
+        return result, None
+    favorite_ids = results["favorites"]
+    if favorite_ids is None:
+        favorite_ids = _get_favorite_ids(user_id, page_ids(result))
+    return result, favorite_ids
+
+
+def _prefetch_favorite_ids(user_id: str) -> Optional[Set[str]]:
+    """Todos los favoritos del usuario, o `None` si tiene más de `FAVORITES_PREFETCH_LIMIT`."""
+    entries, total = get_favorites_repository().list_favorites_page(user_id, FAVORITES_PREFETCH_LIMIT)
+    if total > len(entries):
+        return None
+    return {entry["course_id"] for entry in entries}
+
+
+def _get_favorite_ids(user_id: str, course_ids: List[str]) -> Optional[Set[str]]:
+    """Favoritos del usuario entre `course_ids`; `None` si Postgres no responde."""
+    try:
+        return get_favorites_repository().is_favorite_many(user_id, course_ids)
+    except Exception as exc:
+        # Los resultados se devuelven igualmente, sin `is_favorite`.
+        logger.warning(json.dumps({"event": "favorite_status_unavailable", "error": str(exc)}))
+        return None
+
+
+def _annotate_favorites(
+    courses: List[Dict[str, Any]],
+    favorite_ids: Optional[Set[str]],
+) -> List[Dict[str, Any]]:
+    # `with_fields` copia: los cursos pueden venir de cachés compartidas entre peticiones.
+    if favorite_ids is None:
+        return courses
+    return [with_fields(course, is_favorite=course["course_id"] in favorite_ids) for course in courses]
+
+
 def _handle_toggle_favorite(user_id: str, course_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
     action = (payload.get("action") or "").lower()
     favorites_repo = get_favorites_repository()
@@ -259,31 +1152,53 @@ def _handle_toggle_favorite(user_id: str, course_id: str, payload: Dict[str, Any
         raise SearchApiError("El parámetro 'action' debe ser add, remove o omitirse", 400)
 
     if action == "add":
-        is_favorite = favorites_repo.set_favorite(user_id, course_id, should_favorite=True)
+        write = partial(favorites_repo.set_favorite, user_id, course_id, should_favorite=True)
     elif action == "remove":
-        is_favorite = favorites_repo.set_favorite(user_id, course_id, should_favorite=False)
+        write = partial(favorites_repo.set_favorite, user_id, course_id, should_favorite=False)
     else:
-        is_current_favorite = favorites_repo.is_favorite(user_id, course_id)
-        is_favorite = favorites_repo.set_favorite(user_id, course_id, should_favorite=not is_current_favorite)
+        write = partial(favorites_repo.toggle_favorite, user_id, course_id)
 
-    course = None
-    try:
-        course = get_mongo_client().get_course_by_id(course_id)
-    except Exception as exc:  # pragma: no cover - log and continue
-        logger.warning("No se pudo obtener curso %s al actualizar favorito: %s", course_id, exc)
+    # La escritura en Postgres y la lectura del curso en Mongo son independientes.
+    tasks: Dict[str, Callable[[], Any]] = {
+        "favorite": write,
+        "course": partial(_get_course, course_id),
+    }
+    if user_id in _preference_vectors:
+        # El vector de preferencia cacheado se actualiza con el embedding del curso.
+        tasks["embedding"] = partial(_get_course_embeddings, [course_id])
+    results, errors = _run_concurrently(
+        tasks,
+        task_timeouts={"course": COURSE_HYDRATION_TIMEOUT_SECONDS, "embedding": COURSE_HYDRATION_TIMEOUT_SECONDS},
+    )
+    if isinstance(errors.get("favorite"), TimeoutError):
+        raise SearchApiError("Tiempo de espera agotado actualizando el favorito", 504)
+    if "favorite" in errors:
+        raise errors["favorite"]
+    is_favorite, changed = results["favorite"]
+    if changed and "embedding" in tasks:
+        embedding = (results.get("embedding") or {}).get(course_id)
+        _preference_vectors.apply_change(user_id, course_id, is_favorite, embedding)
+
+    course = results.get("course")
+    if "course" in errors:
+        logger.warning("No se pudo obtener curso %s al actualizar favorito: %s", course_id, errors["course"])
 
     return {
         "course_id": course_id,
         "is_favorite": is_favorite,
+        "changed": changed,
         "course": course,
     }
 
 
 def _build_response(status_code: int, body: Dict[str, Any], cors_headers: Dict[str, str]) -> Dict[str, Any]:
+    with span("serialize") as current:
+        payload = encode_json(body)
+        current.set(bytes=len(payload))
     return {
         "statusCode": status_code,
-        "headers": cors_headers,
-        "body": json.dumps(body, ensure_ascii=False),
+        "headers": {**cors_headers, "Content-Type": "application/json; charset=utf-8"},
+        "body": payload,
     }
 
 
@@ -328,6 +1243,30 @@ def _get_query_param(event: Dict[str, Any], name: str, default: Optional[int] =
         raise SearchApiError(f"El parámetro '{name}' debe ser numérico", 400) from exc
 
 
+def _get_query_string(event: Dict[str, Any], name: str) -> Optional[str]:
+    params = event.get("queryStringParameters") or {}
+    value = params.get(name)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return value.strip()
+
+
+def _encode_cursor(position: Dict[str, Any]) -> str:
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as exc:
+        raise SearchApiError("El parámetro 'cursor' no es válido", 400) from exc
+    if not isinstance(position, dict):
+        raise SearchApiError("El parámetro 'cursor' no es válido", 400)
+    return position
+
+
 def _extract_user_id(event: Dict[str, Any]) -> Optional[str]:
     try:
         return event["requestContext"]["authorizer"]["claims"]["sub"]
@@ -338,7 +1277,35 @@ def _extract_user_id(event: Dict[str, Any]) -> Optional[str]:
     return headers.get("user-id") or headers.get("x-user-id")
 
 
+def _prewarm() -> None:
+    """Inicializa durante la fase init de Lambda los clientes listados en `PREWARM_CLIENTS`."""
+    warmers: Dict[str, Callable[[], Any]] = {
+        "mongo": get_mongo_client,
+        "bedrock": get_bedrock_client,
+        "postgres": get_favorites_repository,
+        "lexical": _get_lexical_index,
+        "vector": _prewarm_local_vector_index,
+        "mirror": _get_catalog_mirror,
+    }
+    for name in (item.strip() for item in PREWARM_CLIENTS.split(",")):
+        if not name:
+            continue
+        warmer = warmers.get(name)
+        if warmer is None:
+            logger.warning("PREWARM_CLIENTS contiene un cliente desconocido: %s", name)
+            continue
+        try:
+            warmer()
+        except Exception:
+            # Un fallo en init no debe impedir que la Lambda arranque; se reintentará al primer uso.
+            logger.exception("No se pudo pre-calentar %s", name)
+
+
 try:
     import base64
 except ImportError:
     base64 = None
+
+
+if PREWARM_CLIENTS:
+    _prewarm()
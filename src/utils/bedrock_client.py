@@ -4,19 +4,51 @@ from __future__ import annotations
 
 import json
 import logging
+import math
 import os
-import random
-import time
-from functools import lru_cache
-from typing import List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import boto3
 from botocore.config import Config
-from botocore.exceptions import BotoCoreError, ClientError
-import numpy as np
+from botocore.exceptions import BotoCoreError, ClientError, ParamValidationError
+from .embedding_cache import (
+    EmbeddingCache,
+    build_cache_key,
+    build_embedding_cache,
+    pack_embedding,
+    unpack_embedding,
+)
+from .resilience import get_policy
+from .telemetry import increment, span
 
 logger = logging.getLogger(__name__)
 
+# Errores de Bedrock que indican un problema del servicio y justifican reintentar.
+_TRANSIENT_ERROR_CODES = frozenset(
+    {
+        "ThrottlingException",
+        "TooManyRequestsException",
+        "ServiceUnavailableException",
+        "InternalServerException",
+        "ModelTimeoutException",
+        "ModelNotReadyException",
+        "RequestTimeout",
+        "RequestTimeoutException",
+    }
+)
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """Throttling, 5xx y timeouts; un `ValidationException` o `AccessDeniedException` no."""
+    if isinstance(exc, ClientError):
+        code = exc.response.get("Error", {}).get("Code", "")
+        status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return code in _TRANSIENT_ERROR_CODES or status >= 500 or status == 429
+    # Timeouts y errores de conexión de botocore; la validación local de parámetros no.
+    return not isinstance(exc, ParamValidationError)
+
 
 class BedrockClient:
     def __init__(self) -> None:
@@ -25,38 +57,90 @@ class BedrockClient:
 
         self._embedding_model = model
         self._expected_dim = int(os.getenv("EMBEDDING_DIM", "1024"))
+        self._max_concurrency = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "4"))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._policy = get_policy(
+            "bedrock",
+            (ClientError, BotoCoreError),
+            max_attempts=3,
+            base_delay=0.2,
+            max_delay=2.0,
+            is_failure=_is_transient,
+        )
         config = Config(
             region_name=region,
-            retries={"max_attempts": 3, "mode": "standard"},
-            read_timeout=25,
-            connect_timeout=5,
+            retries={"max_attempts": 1, "mode": "standard"},
+            read_timeout=int(os.getenv("BEDROCK_READ_TIMEOUT_SECONDS", "10")),
+            connect_timeout=3,
+            max_pool_connections=max(10, self._max_concurrency),
         )
         self._client = boto3.client("bedrock-runtime", config=config)
+        self._cache: EmbeddingCache = build_embedding_cache()
 
     def generate_embedding(self, text: str) -> List[float]:
-        return self._cached_embedding(text)
+        key = build_cache_key(self._embedding_model, text)
+        with span("embedding_cache.get"):
+            cached = self._cache.get(key)
+        if cached is not None:
+            increment("embedding_cache.hit")
+            return cached
 
-    @lru_cache(maxsize=512)
-    def _cached_embedding(self, text: str) -> List[float]:
-        return self._invoke_with_retry(self._invoke_embedding, text)
+        increment("embedding_cache.miss")
+        with span("bedrock.embed"):
+            embedding = self._invoke_with_retry(self._invoke_embedding, " ".join(text.split()))
+        self._cache.put(key, embedding)
+        return embedding
 
-    def _invoke_with_retry(self, func, *args):
-        last_error: Exception | None = None
-        for attempt in range(4):
-            try:
-                return func(*args)
-            except (ClientError, BotoCoreError) as exc:
-                last_error = exc
-                sleep_for = (2 ** attempt) * random.uniform(0.75, 1.25)
-                logger.warning(
-                    "Bedrock request failed (attempt %s): %s. Retrying in %.2fs",
-                    attempt + 1,
-                    exc,
-                    sleep_for,
+    def generate_embeddings(self, texts: List[str]) -> Tuple[Dict[str, List[float]], Dict[str, Exception]]:
+        """Embeddings de varios textos; devuelve `(embeddings, errores)` indexados por texto.
+
+        Los textos equivalentes tras normalizar comparten clave y se piden una sola vez.
+        La caché se consulta en lote y los faltantes se piden a Bedrock en paralelo, con
+        como máximo `BEDROCK_MAX_CONCURRENCY` llamadas simultáneas.
+        """
+        keys = {text: build_cache_key(self._embedding_model, text) for text in texts}
+        unique_keys = list(dict.fromkeys(keys.values()))
+        with span("embedding_cache.get", keys=len(unique_keys)):
+            cached = self._cache.get_many(unique_keys)
+
+        pending: Dict[str, str] = {}
+        for text, key in keys.items():
+            if key not in cached and key not in pending:
+                pending[key] = text
+        increment("embedding_cache.hit", len(unique_keys) - len(pending))
+        increment("embedding_cache.miss", len(pending))
+
+        errors_by_key: Dict[str, Exception] = {}
+        if pending:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_concurrency,
+                    thread_name_prefix="bedrock-embed",
                 )
-                time.sleep(sleep_for)
-        assert last_error is not None
-        raise last_error
+            # Un único span para el lote: las llamadas en paralelo se solapan.
+            with span("bedrock.embed", texts=len(pending)) as current:
+                futures = {
+                    key: self._executor.submit(
+                        self._invoke_with_retry, self._invoke_embedding, " ".join(text.split())
+                    )
+                    for key, text in pending.items()
+                }
+                for key, future in futures.items():
+                    try:
+                        cached[key] = future.result()
+                        self._cache.put(key, cached[key])
+                    except Exception as exc:
+                        errors_by_key[key] = exc
+                current.set(errors=len(errors_by_key))
+
+        embeddings = {text: cached[key] for text, key in keys.items() if key in cached}
+        errors = {text: errors_by_key[key] for text, key in keys.items() if key in errors_by_key}
+        return embeddings, errors
+
+    def _invoke_with_retry(self, func, *args):
+        # Los reintentos (con backoff acotado por el deadline) y el circuit breaker viven en la
+        # política compartida; botocore hace un único intento por llamada.
+        return self._policy.call(func, *args)
 
     def _invoke_embedding(self, text: str) -> List[float]:
         payload = json.dumps({"inputText": text})
@@ -74,18 +158,22 @@ class BedrockClient:
             raise ValueError(
                 f"Dimensión inesperada: {len(embedding)} (esperada {self._expected_dim})"
             )
-        vector = np.asarray(embedding, dtype=np.float32)
-        norm = float(np.linalg.norm(vector))
+        # Normalización en Python puro: evita cargar numpy en el camino de búsqueda.
+        norm = math.sqrt(math.fsum(value * value for value in embedding))
         if norm == 0.0:
             raise ValueError("La norma del embedding es cero")
-        return (vector / norm).tolist()
+        # El round trip por float32 conserva la precisión que devolvía numpy.
+        return unpack_embedding(pack_embedding([value / norm for value in embedding]))
 
 
 _client_instance: BedrockClient | None = None
+_client_lock = threading.Lock()
 
 
 def get_bedrock_client() -> BedrockClient:
     global _client_instance
     if _client_instance is None:
-        _client_instance = BedrockClient()
+        with _client_lock:
+            if _client_instance is None:
+                _client_instance = BedrockClient()
     return _client_instance
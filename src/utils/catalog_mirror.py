@@ -0,0 +1,388 @@
+"""Réplica en memoria del catálogo de cursos dentro del contenedor caliente.
+
+El catálogo sólo cambia cuando corre la ingesta, pero casi todas las rutas lo leen. Con la
+réplica activada el contenedor carga una vez los cursos (sin embeddings, salvo que el índice
+vectorial local los necesite) y en cada invocación aplica sólo los cambios:
+
+- `watermark`: documentos posteriores a la última posición `(processed_at, _id)` aplicada.
+  No detecta borrados, por eso se recarga entero cada `full_reload_seconds`.
+- `change_stream`: eventos del change stream desde el último resume token (incluye borrados).
+
+La lectura incremental tiene un presupuesto de tiempo: si no termina o falla a medias, lo leído
+se aplica junto con su posición y la siguiente invocación continúa desde ahí. Las recargas
+completas periódicas corren en segundo plano y nunca dentro de una petición. Categorías, trending, detalle de curso y la
+validación de filtros se resuelven entonces sin consultar Atlas.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .course_fields import METADATA_FIELDS, SUMMARY_FIELDS
+from .resilience import current_deadline
+from .search_filters import FILTER_SPECS, normalize_filters
+from .serialization import EncodedCourse
+from .telemetry import increment, span
+
+logger = logging.getLogger(__name__)
+
+MIRROR_MODES = {"watermark", "change_stream"}
+
+
+class _MirroredCourse(NamedTuple):
+    summary: EncodedCourse
+    metadata: Dict[str, Any]
+    legacy_id: Optional[str]
+    embedding: Optional[List[float]]
+
+
+class _ChangeBatch(NamedTuple):
+    """Cambios leídos y la posición (o resume token) hasta la que llegan."""
+
+    upserts: List[Dict[str, Any]]
+    deletes: List[str]
+    cursor: Any
+    complete: bool
+    error: Optional[Exception] = None
+
+
+class CatalogMirror:
+    """Cursos del catálogo en memoria, actualizados de forma incremental desde `source`.
+
+    `source` es el `MongoCatalogClient` (o un fake con `scan_catalog` y, para el modo
+    `change_stream`, `read_catalog_changes`). Los cursos devueltos son compartidos: no deben
+    modificarse (usar `with_fields` o `CourseProjection.apply`).
+    """
+
+    PAGE_SIZE = 500
+
+    def __init__(
+        self,
+        source: Any,
+        mode: str = "watermark",
+        include_embeddings: bool = False,
+        refresh_interval_seconds: float = 1.0,
+        refresh_budget_ms: float = 50.0,
+        full_reload_seconds: float = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if mode not in MIRROR_MODES:
+            raise ValueError(f"Modo de réplica desconocido: {mode}")
+        self._source = source
+        self._mode = mode
+        self._include_embeddings = include_embeddings
+        self._refresh_interval = refresh_interval_seconds
+        self._refresh_budget_ms = refresh_budget_ms
+        self._full_reload_seconds = full_reload_seconds
+        self._clock = clock
+
+        # Los diccionarios se reemplazan enteros al aplicar cambios (copy-on-write): los
+        # lectores en otros hilos nunca ven una iteración a medio modificar.
+        self._courses: Dict[str, _MirroredCourse] = {}
+        self._aliases: Dict[str, str] = {}
+        self._position: Optional[Tuple[Any, Any]] = None
+        self._resume_token: Any = None
+        self._revision = 0
+        self._loaded_at: Optional[float] = None
+        self._refreshed_at: Optional[float] = None
+        self._needs_reload = False
+        self._views: Dict[str, Tuple[int, Any]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    @property
+    def revision(self) -> int:
+        """Aumenta con cada cambio aplicado; sirve de versión para los índices derivados."""
+        return self._revision
+
+    def __len__(self) -> int:
+        return len(self._courses)
+
+    def refresh(self) -> None:
+        """Carga completa la primera vez; después, cambios acotados por presupuesto.
+
+        Como mucho una lectura cada `refresh_interval_seconds`. Sólo la carga inicial propaga
+        errores y bloquea; si falla una actualización se sigue sirviendo lo ya cargado. Las
+        recargas completas (periódicas o tras un `reset`) se lanzan en segundo plano.
+        """
+        if self.loaded and not self._refresh_due():
+            return
+        # Si ya hay datos y otro hilo está actualizando (o recargando), se sirve lo cargado.
+        if not self._lock.acquire(blocking=not self.loaded):
+            return
+        handed_off = False
+        try:
+            if not self._refresh_due():
+                return
+            now = self._clock()
+            if not self.loaded:
+                self._full_load()
+                return
+            self._refreshed_at = now
+            if self._needs_reload or now - self._loaded_at >= self._full_reload_seconds:
+                # El hilo de recarga se queda con el lock y lo libera al terminar.
+                threading.Thread(target=self._reload, name="catalog-mirror-reload", daemon=True).start()
+                handed_off = True
+                return
+            try:
+                self._apply_changes()
+            except Exception:
+                logger.warning(
+                    json.dumps({"event": "catalog_mirror_refresh_failed", "mode": self._mode}),
+                    exc_info=True,
+                )
+        finally:
+            if not handed_off:
+                self._lock.release()
+
+    def _reload(self) -> None:
+        try:
+            self._full_load()
+        except Exception:
+            logger.warning(json.dumps({"event": "catalog_mirror_reload_failed"}), exc_info=True)
+        finally:
+            self._lock.release()
+
+    def get(self, course_id: str) -> Optional[EncodedCourse]:
+        """Curso con metadatos (como `get_course_by_id`) por `ObjectId` o `legacy_id`."""
+        record = self._courses.get(self._aliases.get(course_id, course_id))
+        if record is None:
+            return None
+        return record.summary.with_fields(**record.metadata)
+
+    def get_many(self, course_ids: Iterable[str]) -> Dict[str, Optional[EncodedCourse]]:
+        return {course_id: self.get(course_id) for course_id in course_ids}
+
+    def get_embeddings(self, course_ids: Iterable[str]) -> Dict[str, List[float]]:
+        """Embeddings de los cursos pedidos; vacío si la réplica se cargó sin embeddings."""
+        embeddings: Dict[str, List[float]] = {}
+        for course_id in course_ids:
+            record = self._courses.get(self._aliases.get(course_id, course_id))
+            if record is not None and record.embedding is not None:
+                embeddings[course_id] = record.embedding
+        return embeddings
+
+    @property
+    def has_embeddings(self) -> bool:
+        return self._include_embeddings
+
+    def courses(self) -> List[EncodedCourse]:
+        """Cursos sin metadatos, como `get_catalog_snapshot()`, para el índice léxico."""
+        return self._view("courses", lambda: [record.summary for record in self._courses.values()])
+
+    def courses_with_embeddings(self) -> List[Dict[str, Any]]:
+        """Como `get_catalog_snapshot(include_embeddings=True)`, para el índice vectorial local."""
+        return [
+            {**record.summary, "embedding": record.embedding}
+            for record in self._courses.values()
+            if record.embedding is not None
+        ]
+
+    def categories(self) -> List[Dict[str, Any]]:
+        """Mismo resultado que el `$group` de `get_categories`."""
+        return self._view("categories", self._build_categories)
+
+    def trending(self, limit: int) -> List[EncodedCourse]:
+        """Mismo orden que `get_trending_courses`: alumnos y después valoración, nulos al final."""
+        return self._view("trending", self._build_trending)[:limit]
+
+    def excludes(self, filters: Dict[str, Any]) -> bool:
+        """`True` si algún filtro de igualdad no coincide con ningún curso del catálogo.
+
+        Permite responder una búsqueda vacía sin llamar a Bedrock ni a Atlas. Si algún curso
+        no tiene valor en el campo, el filtro Python lo dejaría pasar y no se descarta nada.
+        """
+        known = self._view("filter_values", self._build_filter_values)
+        for name, value in normalize_filters(filters).items():
+            spec = FILTER_SPECS[name]
+            if spec["op"] != "eq":
+                continue
+            values = known.get(spec["field"])
+            if values is not None and str(value).lower() not in values:
+                return True
+        return False
+
+    def _refresh_due(self) -> bool:
+        return self._refreshed_at is None or self._clock() - self._refreshed_at >= self._refresh_interval
+
+    def _full_load(self) -> None:
+        with span("catalog_mirror.full_load", mode=self._mode, embeddings=self._include_embeddings) as current:
+            resume_token = None
+            if self._mode == "change_stream":
+                # El token se toma antes de leer: los cambios durante la carga se reaplican.
+                _changes, resume_token = self._source.read_catalog_changes(None, max_changes=0)
+
+            courses: Dict[str, _MirroredCourse] = {}
+            aliases: Dict[str, str] = {}
+            position = None
+            for entry in self._source.scan_catalog(include_embeddings=self._include_embeddings):
+                self._store(entry, courses, aliases)
+                if entry["position"][0] is not None:
+                    position = entry["position"]
+            current.set(courses=len(courses))
+
+        self._courses = courses
+        self._aliases = aliases
+        self._position = position
+        self._resume_token = resume_token
+        self._revision += 1
+        self._needs_reload = False
+        self._loaded_at = self._refreshed_at = self._clock()
+        logger.info(
+            json.dumps({"event": "catalog_mirror_loaded", "mode": self._mode, "courses": len(courses)})
+        )
+
+    def _apply_changes(self) -> None:
+        budget_ms = min(self._refresh_budget_ms, current_deadline().remaining() * 1000.0)
+        expires_at = self._clock() + budget_ms / 1000.0
+        with span("catalog_mirror.refresh", mode=self._mode) as current:
+            if self._mode == "change_stream":
+                batch = self._read_change_stream(expires_at)
+            else:
+                batch = self._read_watermark(expires_at)
+            current.set(upserts=len(batch.upserts), deletes=len(batch.deletes), complete=batch.complete)
+
+        if not batch.complete and batch.error is None:
+            increment("catalog_mirror.refresh_truncated")
+        if batch.upserts or batch.deletes:
+            courses = dict(self._courses)
+            aliases = dict(self._aliases)
+            for course_id in batch.deletes:
+                record = courses.pop(course_id, None)
+                if record is not None and record.legacy_id:
+                    aliases.pop(record.legacy_id, None)
+            for entry in batch.upserts:
+                self._store(entry, courses, aliases)
+            self._courses = courses
+            self._aliases = aliases
+            self._revision += 1
+            increment("catalog_mirror.changes", len(batch.upserts) + len(batch.deletes))
+        # La posición avanza sólo junto con los cambios aplicados: una página que falla se
+        # vuelve a leer en la siguiente actualización.
+        if self._mode == "change_stream":
+            self._resume_token = batch.cursor
+        else:
+            self._position = batch.cursor
+        if batch.error is not None:
+            raise batch.error
+
+    def _read_watermark(self, expires_at: float) -> _ChangeBatch:
+        upserts: List[Dict[str, Any]] = []
+        position = self._position
+        while True:
+            remaining_ms = (expires_at - self._clock()) * 1000.0
+            if remaining_ms <= 0:
+                return _ChangeBatch(upserts, [], position, False)
+            try:
+                entries = self._source.scan_catalog(
+                    since=position,
+                    include_embeddings=self._include_embeddings,
+                    limit=self.PAGE_SIZE,
+                    max_time_ms=remaining_ms,
+                )
+            except Exception as exc:
+                return _ChangeBatch(upserts, [], position, False, exc)
+            for entry in entries:
+                upserts.append(entry)
+                if entry["position"][0] is not None:
+                    position = entry["position"]
+            if len(entries) < self.PAGE_SIZE:
+                return _ChangeBatch(upserts, [], position, True)
+
+    def _read_change_stream(self, expires_at: float) -> _ChangeBatch:
+        upserts: Dict[str, Dict[str, Any]] = {}
+        deletes: Set[str] = set()
+        token = self._resume_token
+        while True:
+            remaining_ms = (expires_at - self._clock()) * 1000.0
+            if remaining_ms <= 0:
+                return _ChangeBatch(list(upserts.values()), list(deletes), token, False)
+            try:
+                changes, next_token = self._source.read_catalog_changes(
+                    token,
+                    include_embeddings=self._include_embeddings,
+                    max_changes=self.PAGE_SIZE,
+                    max_await_ms=max(int(remaining_ms), 1),
+                )
+            except Exception as exc:
+                return _ChangeBatch(list(upserts.values()), list(deletes), token, False, exc)
+            token = next_token
+            for change in changes:
+                if change["op"] == "reset":
+                    # Colección eliminada o renombrada: la siguiente actualización recarga entera.
+                    self._needs_reload = True
+                    return _ChangeBatch(list(upserts.values()), list(deletes), token, False)
+                if change["op"] == "delete":
+                    upserts.pop(change["course_id"], None)
+                    deletes.add(change["course_id"])
+                    continue
+                course_id = change["entry"]["course"]["course_id"]
+                deletes.discard(course_id)
+                upserts[course_id] = change["entry"]
+            if len(changes) < self.PAGE_SIZE:
+                return _ChangeBatch(list(upserts.values()), list(deletes), token, True)
+
+    @staticmethod
+    def _store(entry: Dict[str, Any], courses: Dict[str, _MirroredCourse], aliases: Dict[str, str]) -> None:
+        course = entry["course"]
+        course_id = course["course_id"]
+        previous = courses.get(course_id)
+        if previous is not None and previous.legacy_id:
+            aliases.pop(previous.legacy_id, None)
+        courses[course_id] = _MirroredCourse(
+            summary=EncodedCourse.encode({name: course.get(name) for name in SUMMARY_FIELDS}),
+            metadata={name: course.get(name) for name in METADATA_FIELDS},
+            legacy_id=entry.get("legacy_id"),
+            embedding=entry.get("embedding"),
+        )
+        if entry.get("legacy_id"):
+            aliases[entry["legacy_id"]] = course_id
+
+    def _view(self, name: str, build: Callable[[], Any]) -> Any:
+        # Vistas derivadas (categorías, ranking...) memoizadas hasta el siguiente cambio.
+        revision = self._revision
+        cached = self._views.get(name)
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+        value = build()
+        self._views[name] = (revision, value)
+        return value
+
+    def _build_categories(self) -> List[Dict[str, Any]]:
+        counts: Dict[Any, int] = {}
+        for record in self._courses.values():
+            category = record.summary.get("category")
+            category = "General" if category is None else category
+            counts[category] = counts.get(category, 0) + 1
+        ordered = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return [{"name": name, "count": count} for name, count in ordered]
+
+    def _build_trending(self) -> List[EncodedCourse]:
+        def _key(course: EncodedCourse) -> Tuple[bool, Any, bool, Any]:
+            students = course.get("students_count")
+            rating = course.get("rating")
+            return (students is not None, students or 0, rating is not None, rating or 0)
+
+        return sorted((record.summary for record in self._courses.values()), key=_key, reverse=True)
+
+    def _build_filter_values(self) -> Dict[str, Optional[Set[str]]]:
+        known: Dict[str, Optional[Set[str]]] = {}
+        for spec in FILTER_SPECS.values():
+            if spec["op"] != "eq":
+                continue
+            values: Optional[Set[str]] = set()
+            for record in self._courses.values():
+                value = record.summary.get(spec["field"])
+                if not value:
+                    values = None
+                    break
+                values.add(str(value).lower())
+            known[spec["field"]] = values
+        return known
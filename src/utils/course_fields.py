@@ -0,0 +1,136 @@
+"""Selección de campos (`fields`) y extractos de descripción para las respuestas de cursos.
+
+La misma `CourseProjection` se compila a la proyección de MongoDB (para no transferir lo que
+no se devuelve) y se aplica a los cursos servidos desde memoria (índices y cachés).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+# Campos públicos de un curso, en el orden en que se serializan.
+SUMMARY_FIELDS: Tuple[str, ...] = (
+    "course_id",
+    "title",
+    "description",
+    "url",
+    "platform",
+    "rating",
+    "duration",
+    "price",
+    "language",
+    "category",
+    "level",
+    "students_count",
+)
+METADATA_FIELDS: Tuple[str, ...] = ("embedding_model", "embedding_dim", "processed_at")
+DETAIL_FIELDS: Tuple[str, ...] = SUMMARY_FIELDS + METADATA_FIELDS
+
+# Campos calculados por petición que se conservan aunque no se pidan.
+ALWAYS_KEPT = ("course_id", "score")
+
+MIN_SNIPPET_LENGTH = 20
+MAX_SNIPPET_LENGTH = 2000
+SNIPPET_ELLIPSIS = "…"
+
+
+class CourseProjection(NamedTuple):
+    """`fields=None` conserva los campos por defecto del endpoint; `snippet_length` recorta `description`."""
+
+    fields: Optional[Tuple[str, ...]] = None
+    snippet_length: Optional[int] = None
+
+    @property
+    def is_default(self) -> bool:
+        return self.fields is None and not self.snippet_length
+
+    def mongo_projection(
+        self,
+        default_fields: Iterable[str],
+        required: Iterable[str] = (),
+    ) -> Dict[str, Any]:
+        """Proyección de inclusión: nunca trae campos no listados (p.ej. `embedding`).
+
+        `required` añade campos que se necesitan en Python aunque no se devuelvan
+        (filtros residuales, `legacy_id`). Con extracto, Atlas recorta la descripción a
+        `snippet_length + 1` caracteres para saber si hubo corte sin traer el texto entero.
+        """
+        projection: Dict[str, Any] = {"_id": 1}
+        for field in self.fields if self.fields is not None else default_fields:
+            if field != "course_id":
+                projection[field] = 1
+        for field in required:
+            projection.setdefault(field, 1)
+        if self.snippet_length and "description" in projection:
+            projection["description"] = {
+                "$substrCP": [{"$ifNull": ["$description", ""]}, 0, self.snippet_length + 1]
+            }
+        return projection
+
+    def apply(self, course: Dict[str, Any]) -> Dict[str, Any]:
+        """Recorta un curso ya serializado a los campos pedidos y aplica el extracto."""
+        if self.is_default:
+            return course
+        if self.fields is None:
+            shaped = dict(course)
+        else:
+            shaped = {
+                name: course[name]
+                for name in course
+                if name in self.fields or name in ALWAYS_KEPT
+            }
+        if self.snippet_length and isinstance(shaped.get("description"), str):
+            shaped["description"] = make_snippet(shaped["description"], self.snippet_length)
+        return shaped
+
+
+DEFAULT_PROJECTION = CourseProjection()
+
+
+def make_snippet(text: str, length: int) -> str:
+    """Corta en el último espacio antes de `length` y añade puntos suspensivos."""
+    if len(text) <= length:
+        return text
+    cut = text[:length]
+    space = cut.rfind(" ")
+    if space > length // 2:
+        cut = cut[:space]
+    return cut.rstrip(" ,.;:") + SNIPPET_ELLIPSIS
+
+
+def parse_projection(
+    raw_fields: Any,
+    raw_snippet_length: Any,
+    allowed: Tuple[str, ...] = SUMMARY_FIELDS,
+) -> CourseProjection:
+    """Valida `fields` (lista o texto separado por comas) y `snippet_length`.
+
+    Lanza `ValueError` con un mensaje apto para el cliente si algún valor es inválido.
+    """
+    fields: Optional[Tuple[str, ...]] = None
+    if raw_fields not in (None, "", []):
+        if isinstance(raw_fields, str):
+            names = [name.strip() for name in raw_fields.split(",")]
+        elif isinstance(raw_fields, list) and all(isinstance(name, str) for name in raw_fields):
+            names = [name.strip() for name in raw_fields]
+        else:
+            raise ValueError("El parámetro 'fields' debe ser una lista o texto separado por comas")
+        requested = {name for name in names if name}
+        unknown = sorted(requested - set(allowed))
+        if unknown:
+            raise ValueError(f"Campos desconocidos en 'fields': {', '.join(unknown)}")
+        # Orden canónico y `course_id` siempre presente: el cliente lo necesita para enlazar.
+        fields = tuple(name for name in allowed if name in requested or name == "course_id")
+
+    snippet_length: Optional[int] = None
+    if raw_snippet_length not in (None, ""):
+        try:
+            snippet_length = int(raw_snippet_length)
+        except (TypeError, ValueError) as exc:
+            raise ValueError("El parámetro 'snippet_length' debe ser numérico") from exc
+        if not MIN_SNIPPET_LENGTH <= snippet_length <= MAX_SNIPPET_LENGTH:
+            raise ValueError(
+                f"El parámetro 'snippet_length' debe estar entre {MIN_SNIPPET_LENGTH} y {MAX_SNIPPET_LENGTH}"
+            )
+
+    return CourseProjection(fields, snippet_length)
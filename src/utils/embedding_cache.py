@@ -0,0 +1,293 @@
+"""Caché de embeddings en dos niveles: memoria del contenedor y almacén persistente compartido."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query_text(text: str) -> str:
+    """Pliega mayúsculas, espacios y acentos: "Python  para Principiántes" == "python para principiantes"."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    without_accents = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _WHITESPACE_RE.sub(" ", without_accents).strip().casefold()
+
+
+def build_cache_key(model: str, text: str) -> str:
+    digest = hashlib.sha256(f"{model}\n{normalize_query_text(text)}".encode("utf-8")).hexdigest()
+    return f"emb:{digest}"
+
+
+def pack_embedding(embedding: List[float]) -> bytes:
+    return array("f", embedding).tobytes()
+
+
+def unpack_embedding(payload: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(payload)
+    return vector.tolist()
+
+
+class LocalEmbeddingCache:
+    """LRU en proceso que guarda los vectores como bytes float32 (4 KB por embedding de 1024)."""
+
+    def __init__(self, max_entries: int = 512) -> None:
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def put(self, key: str, payload: bytes) -> None:
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PersistentEmbeddingStore(ABC):
+    """Interfaz del nivel compartido entre instancias (DynamoDB, SQLite local, ...)."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Embedding empaquetado de `key`, o `None` si no está o caducó."""
+
+    @abstractmethod
+    def put(self, key: str, payload: bytes) -> None:
+        """Guarda el embedding empaquetado con el TTL del almacén."""
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        """Lectura en lote; los backends con batch nativo la sobrescriben."""
+        found: Dict[str, bytes] = {}
+        for key in keys:
+            payload = self.get(key)
+            if payload is not None:
+                found[key] = payload
+        return found
+
+
+class SQLiteEmbeddingStore(PersistentEmbeddingStore):
+    """Almacén en fichero local con TTL y desalojo por tamaño; sustituye a DynamoDB en local."""
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int) -> None:
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                cache_key TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT embedding FROM embeddings WHERE cache_key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE embeddings SET accessed_at = ? WHERE cache_key = ?", (now, key))
+            self._conn.commit()
+        return bytes(row[0])
+
+    def put(self, key: str, payload: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (cache_key, embedding, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now + self._ttl_seconds, now),
+            )
+            self._conn.execute("DELETE FROM embeddings WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                """
+                DELETE FROM embeddings WHERE cache_key IN (
+                    SELECT cache_key FROM embeddings ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self._max_entries,),
+            )
+            self._conn.commit()
+
+
+class DynamoDBEmbeddingStore(PersistentEmbeddingStore):
+    """Tabla DynamoDB compartida por toda la flota; la expiración la aplica el TTL de la tabla."""
+
+    def __init__(self, table_name: str, ttl_seconds: int) -> None:
+        import boto3
+        from botocore.config import Config
+
+        config = Config(
+            region_name=os.getenv("AWS_REGION", "us-east-2"),
+            retries={"max_attempts": 2, "mode": "standard"},
+            read_timeout=2,
+            connect_timeout=1,
+        )
+        self._table_name = table_name
+        self._ttl_seconds = ttl_seconds
+        self._client = boto3.client("dynamodb", config=config)
+
+    def get(self, key: str) -> Optional[bytes]:
+        response = self._client.get_item(
+            TableName=self._table_name,
+            Key={"cache_key": {"S": key}},
+            ProjectionExpression="embedding, expires_at",
+        )
+        item = response.get("Item")
+        if not item:
+            return None
+        # El TTL de DynamoDB borra con retraso: se descarta lo caducado aunque siga en la tabla.
+        if float(item["expires_at"]["N"]) <= time.time():
+            return None
+        return bytes(item["embedding"]["B"])
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        now = time.time()
+        # BatchGetItem admite hasta 100 claves por llamada.
+        for start in range(0, len(keys), 100):
+            request = {
+                self._table_name: {
+                    "Keys": [{"cache_key": {"S": key}} for key in keys[start:start + 100]],
+                    "ProjectionExpression": "cache_key, embedding, expires_at",
+                }
+            }
+            while request:
+                response = self._client.batch_get_item(RequestItems=request)
+                for item in response.get("Responses", {}).get(self._table_name, []):
+                    if float(item["expires_at"]["N"]) > now:
+                        found[item["cache_key"]["S"]] = bytes(item["embedding"]["B"])
+                request = response.get("UnprocessedKeys") or {}
+        return found
+
+    def put(self, key: str, payload: bytes) -> None:
+        self._client.put_item(
+            TableName=self._table_name,
+            Item={
+                "cache_key": {"S": key},
+                "embedding": {"B": payload},
+                "expires_at": {"N": str(int(time.time()) + self._ttl_seconds)},
+            },
+        )
+
+
+class EmbeddingCache:
+    """Combina el nivel local y el persistente; los fallos del persistente nunca rompen la búsqueda."""
+
+    def __init__(
+        self,
+        local: LocalEmbeddingCache,
+        persistent: Optional[PersistentEmbeddingStore] = None,
+    ) -> None:
+        self._local = local
+        self._persistent = persistent
+
+    def get(self, key: str) -> Optional[List[float]]:
+        payload = self._local.get(key)
+        if payload is not None:
+            return unpack_embedding(payload)
+
+        if self._persistent is None:
+            return None
+
+        try:
+            payload = self._persistent.get(key)
+        except Exception as exc:
+            logger.warning(json.dumps({"event": "embedding_cache_read_failed", "error": str(exc)}))
+            return None
+
+        if payload is None:
+            return None
+        self._local.put(key, payload)
+        return unpack_embedding(payload)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Resuelve varias claves: primero en memoria y el resto en una lectura en lote."""
+        found: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        for key in keys:
+            payload = self._local.get(key)
+            if payload is None:
+                missing.append(key)
+            else:
+                found[key] = unpack_embedding(payload)
+
+        if not missing or self._persistent is None:
+            return found
+
+        try:
+            payloads = self._persistent.get_many(missing)
+        except Exception as exc:
+            logger.warning(json.dumps({"event": "embedding_cache_read_failed", "error": str(exc)}))
+            return found
+
+        for key, payload in payloads.items():
+            self._local.put(key, payload)
+            found[key] = unpack_embedding(payload)
+        return found
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        payload = pack_embedding(embedding)
+        self._local.put(key, payload)
+        if self._persistent is None:
+            return
+        try:
+            self._persistent.put(key, payload)
+        except Exception as exc:
+            logger.warning(json.dumps({"event": "embedding_cache_write_failed", "error": str(exc)}))
+
+
+def build_embedding_cache() -> EmbeddingCache:
+    local = LocalEmbeddingCache(max_entries=int(os.getenv("EMBEDDING_CACHE_LOCAL_SIZE", "512")))
+    backend = os.getenv("EMBEDDING_CACHE_BACKEND", "none").lower()
+    ttl_seconds = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+    persistent: Optional[PersistentEmbeddingStore] = None
+    if backend == "dynamodb":
+        table = os.getenv("EMBEDDING_CACHE_TABLE")
+        if not table:
+            raise ValueError("EMBEDDING_CACHE_TABLE es obligatorio con EMBEDDING_CACHE_BACKEND=dynamodb")
+        persistent = DynamoDBEmbeddingStore(table, ttl_seconds)
+    elif backend == "sqlite":
+        persistent = SQLiteEmbeddingStore(
+            os.getenv("EMBEDDING_CACHE_PATH", "/tmp/embedding-cache.sqlite3"),
+            ttl_seconds,
+            int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000")),
+        )
+    elif backend != "none":
+        raise ValueError(f"EMBEDDING_CACHE_BACKEND desconocido: {backend}")
+
+    return EmbeddingCache(local, persistent)
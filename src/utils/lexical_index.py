@@ -0,0 +1,119 @@
+"""Índice léxico BM25 en memoria y fusión por rango recíproco con los resultados vectoriales."""
+
+from __future__ import annotations
+
+import math
+import re
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .embedding_cache import normalize_query_text
+from .search_filters import matches_filters, normalize_filters
+from .serialization import EncodedCourse, with_fields
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#]+")
+
+_STOPWORDS = frozenset(
+    """
+    a al como con de del el en es la las lo los para por que se sin su sus un una y
+    an and are as at be by for from how in is of on or the to with
+    """.split()
+)
+
+# Peso de cada campo al contar la frecuencia del término (BM25F simplificado).
+FIELD_WEIGHTS = {"title": 3.0, "category": 2.0, "description": 1.0}
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token
+        for token in _TOKEN_RE.findall(normalize_query_text(text))
+        if token not in _STOPWORDS and (len(token) > 1 or token in {"c", "r"})
+    ]
+
+
+class LexicalIndex:
+    """Listas invertidas compactas (`array`) sobre título, categoría y descripción."""
+
+    def __init__(self, courses: Sequence[Dict[str, Any]], k1: float = 1.2, b: float = 0.75) -> None:
+        # Los cursos se guardan con su JSON precalculado: los resultados sólo anexan el score.
+        self._courses = [
+            course if isinstance(course, EncodedCourse) else EncodedCourse.encode(course)
+            for course in courses
+        ]
+        self._k1 = k1
+        self._b = b
+
+        building: Dict[str, Dict[int, float]] = {}
+        self._doc_lengths = array("f")
+        for doc_id, course in enumerate(self._courses):
+            length = 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(str(course.get(field) or "")):
+                    building.setdefault(token, {})
+                    building[token][doc_id] = building[token].get(doc_id, 0.0) + weight
+                    length += weight
+            self._doc_lengths.append(length)
+
+        self._postings: Dict[str, tuple] = {
+            token: (array("I", docs.keys()), array("f", docs.values()))
+            for token, docs in building.items()
+        }
+        total = len(self._courses)
+        self._avg_length = (sum(self._doc_lengths) / total) if total else 0.0
+        self._idf = {
+            token: math.log(1.0 + (total - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            for token, (doc_ids, _) in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._courses)
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        filters = normalize_filters(filters)
+        scores: Dict[int, float] = {}
+        k1, b, avg_length = self._k1, self._b, self._avg_length or 1.0
+
+        for token in set(tokenize(query)):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            idf = self._idf[token]
+            doc_ids, frequencies = posting
+            for doc_id, tf in zip(doc_ids, frequencies):
+                norm = k1 * (1.0 - b + b * self._doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results: List[Dict[str, Any]] = []
+        for doc_id, score in ranked:
+            course = self._courses[doc_id]
+            if filters and not matches_filters(course, filters):
+                continue
+            results.append(course.with_fields(score=round(score, 6)))
+            if len(results) >= limit:
+                break
+        return results
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Iterable[List[Dict[str, Any]]],
+    limit: int,
+    k: int = 60,
+) -> List[Dict[str, Any]]:
+    """Fusiona listas por `course_id` con RRF: score = Σ 1 / (k + rango)."""
+    fused: Dict[str, float] = {}
+    courses: Dict[str, Dict[str, Any]] = {}
+    for ranked in ranked_lists:
+        for rank, course in enumerate(ranked, start=1):
+            course_id = course["course_id"]
+            fused[course_id] = fused.get(course_id, 0.0) + 1.0 / (k + rank)
+            courses.setdefault(course_id, course)
+
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [with_fields(courses[course_id], score=round(score, 6)) for course_id, score in ordered]
@@ -4,16 +4,43 @@ from __future__ import annotations
 
 import json
 import logging
+import math
 import os
-from typing import Any, Dict, List, Optional
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import pymongo
 from bson import ObjectId
 from pymongo import MongoClient
 from pymongo.collection import Collection
-from pymongo.errors import PyMongoError
+from pymongo.errors import (
+    ConnectionFailure,
+    ExecutionTimeout,
+    NetworkTimeout,
+    OperationFailure,
+    PyMongoError,
+)
+
+from .course_fields import DEFAULT_PROJECTION, DETAIL_FIELDS, SUMMARY_FIELDS, CourseProjection
+from .resilience import get_policy
+from .result_cache import CourseCache
+from .search_filters import (
+    FILTER_SPECS,
+    compile_vector_filter,
+    estimate_selectivity,
+    get_indexed_filter_fields,
+    matches_filters,
+    normalize_filters,
+    plan_num_candidates,
+)
+from .telemetry import span
 
 logger = logging.getLogger(__name__)
 
+# Atlas rechaza un filtro sobre una ruta no declarada en el índice con este mensaje.
+_UNINDEXED_FILTER_ERROR = re.compile(r"needs to be indexed as (?:filter|token)", re.IGNORECASE)
+
 
 class MongoCatalogClient:
     def __init__(self) -> None:
@@ -24,6 +51,8 @@ class MongoCatalogClient:
         self._database_name = os.getenv("DATABASE_NAME", "learnia_db")
         self._collection_name = os.getenv("COLLECTION_NAME", "courses")
         self._search_index = os.getenv("ATLAS_SEARCH_INDEX", "default")
+        self._indexed_filter_fields = get_indexed_filter_fields()
+        self._filter_pushdown_enabled = os.getenv("ATLAS_FILTER_PUSHDOWN", "true").lower() == "true"
 
         self._client = MongoClient(
             uri,
@@ -31,66 +60,260 @@ class MongoCatalogClient:
             serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000")),
         )
         self._collection: Collection = self._client[self._database_name][self._collection_name]
+        self._timeout_seconds = float(os.getenv("MONGO_TIMEOUT_MS", "2500")) / 1000.0
+        # Sólo los fallos de red/servidor y los timeouts (`MONGO_TIMEOUT_MS` agotado en el
+        # servidor llega como `ExecutionTimeout`) abren el circuito; pymongo ya reintenta una lectura.
+        self._policy = get_policy(
+            "mongo", (ConnectionFailure, NetworkTimeout, ExecutionTimeout), max_attempts=2
+        )
+
+        cache_bytes = int(os.getenv("COURSE_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+        self._course_cache: Optional[CourseCache] = None
+        if cache_bytes > 0:
+            self._course_cache = CourseCache(
+                max_bytes=cache_bytes,
+                ttl_seconds=float(os.getenv("COURSE_CACHE_TTL_SECONDS", "600")),
+                version_check_seconds=float(os.getenv("COURSE_CACHE_VERSION_CHECK_SECONDS", "60")),
+                version_loader=self.get_catalog_version,
+            )
 
     def search_courses(
         self,
         query_embedding: List[float],
         limit: int,
         filters: Dict[str, Any],
+        projection: CourseProjection = DEFAULT_PROJECTION,
     ) -> List[Dict[str, Any]]:
+        filters = normalize_filters(filters)
+        pushdown = self._filter_pushdown_enabled
+        try:
+            candidates, residual = self._run_vector_search(query_embedding, limit, filters, pushdown, projection)
+        except OperationFailure as exc:
+            if not pushdown or not filters or not _UNINDEXED_FILTER_ERROR.search(str(exc)):
+                # Timeouts, permisos o un índice inexistente no dicen nada del filtro.
+                logger.error(json.dumps({"event": "mongodb_vector_search_failed", "error": str(exc)}))
+                raise
+            # El índice no declara los campos como `filter`: se pasa a filtrado exacto en Python.
+            logger.warning(
+                json.dumps({"event": "mongodb_filter_pushdown_disabled", "error": str(exc)})
+            )
+            self._filter_pushdown_enabled = False
+            try:
+                candidates, residual = self._run_vector_search(
+                    query_embedding, limit, filters, False, projection
+                )
+            except PyMongoError as retry_exc:
+                logger.error(json.dumps({"event": "mongodb_vector_search_failed", "error": str(retry_exc)}))
+                raise
+        except PyMongoError as exc:
+            logger.error(json.dumps({"event": "mongodb_vector_search_failed", "error": str(exc)}))
+            raise
+
+        filtered = [course for course in candidates if matches_filters(course, residual)]
+        return [projection.apply(self._serialize_course(course)) for course in filtered[:limit]]
+
+    def _run_vector_search(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        filters: Dict[str, Any],
+        pushdown: bool,
+        projection: CourseProjection = DEFAULT_PROJECTION,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        indexed_fields = self._indexed_filter_fields if pushdown else []
+        native_filter, residual = compile_vector_filter(filters, indexed_fields)
+
+        # El plan sobre-pide candidatos según la selectividad: el filtro nativo reduce
+        # el grafo explorado y el residuo Python necesita margen para llenar la página.
+        num_candidates = plan_num_candidates(limit, estimate_selectivity(filters))
+        fetch_limit = limit
+        if residual:
+            residual_selectivity = estimate_selectivity(residual)
+            fetch_limit = min(num_candidates, int(math.ceil(limit / residual_selectivity)))
+
+        vector_stage: Dict[str, Any] = {
+            "index": self._search_index,
+            "path": "embedding",
+            "queryVector": query_embedding,
+            "numCandidates": num_candidates,
+            "limit": fetch_limit,
+        }
+        if native_filter:
+            vector_stage["filter"] = native_filter
+
         pipeline: List[Dict[str, Any]] = [
-            {
-                "$vectorSearch": {
-                    "index": self._search_index,
-                    "path": "embedding",
-                    "queryVector": query_embedding,
-                    "numCandidates": limit * 20,
-                    "limit": limit,
-                }
-            },
+            {"$vectorSearch": vector_stage},
             {
                 "$project": {
-                    "_id": 1,
-                    "title": 1,
-                    "description": 1,
-                    "url": 1,
-                    "platform": 1,
-                    "rating": 1,
-                    "duration": 1,
-                    "price": 1,
-                    "language": 1,
-                    "category": 1,
-                    "level": 1,
-                    "students_count": 1,
+                    # Los campos de los filtros residuales se traen aunque no se devuelvan.
+                    **projection.mongo_projection(
+                        SUMMARY_FIELDS,
+                        required=[FILTER_SPECS[name]["field"] for name in residual],
+                    ),
                     "score": {"$meta": "vectorSearchScore"},
                 }
             },
         ]
+        with span("mongo.vector_search", num_candidates=num_candidates, pushdown=bool(native_filter)) as current:
+            candidates = self._call(lambda: list(self._collection.aggregate(pipeline)))
+            current.set(results=len(candidates))
+        return candidates, residual
+
+    def _call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """`func` bajo la política de Mongo y acotada por `MONGO_TIMEOUT_MS`.
 
+        El límite abarca selección de servidor, conexión y consulta, y queda por debajo del
+        presupuesto de las tareas del handler: una tarea abandonada por timeout libera su
+        hilo del pool de I/O poco después, en lugar de esperar al timeout de conexión.
+        """
+
+        def attempt() -> Any:
+            with pymongo.timeout(self._timeout_seconds):
+                return func(*args, **kwargs)
+
+        return self._policy.call(attempt)
+
+    def get_course_by_id(
+        self,
+        course_id: str,
+        projection: CourseProjection = DEFAULT_PROJECTION,
+    ) -> Optional[Dict[str, Any]]:
+        if self._course_cache is not None:
+            cached = self._course_cache.get(course_id)
+            if cached is not None:
+                return projection.apply(cached)
+
+        if ObjectId.is_valid(course_id):
+            query: Dict[str, Any] = {"_id": ObjectId(course_id)}
+        else:
+            query = {"legacy_id": course_id}
+
+        # Proyección de inclusión: el embedding (varios KB) nunca sale de Atlas. Con la caché
+        # activa se trae el detalle completo para que sirva a cualquier `fields` posterior.
+        fetch = DEFAULT_PROJECTION if self._course_cache is not None else projection
         try:
-            candidates = list(self._collection.aggregate(pipeline))
+            with span("mongo.find_one") as current:
+                document = self._call(
+                    self._collection.find_one, query, fetch.mongo_projection(DETAIL_FIELDS)
+                )
+                current.set(results=int(document is not None))
         except PyMongoError as exc:
-            logger.error(json.dumps({"event": "mongodb_vector_search_failed", "error": str(exc)}))
+            logger.error(json.dumps({"event": "mongodb_course_fetch_failed", "error": str(exc)}))
+            raise
+
+        if not document:
+            return None
+        course = self._serialize_course(document, include_metadata=True)
+        if self._course_cache is not None:
+            course = self._course_cache.put(course_id, course)
+        return projection.apply(course)
+
+    def get_courses_by_ids(
+        self,
+        course_ids: List[str],
+        projection: CourseProjection = DEFAULT_PROJECTION,
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Hidrata varios cursos con una sola consulta `$in`.
+
+        Acepta una mezcla de `ObjectId` y `legacy_id`; el resultado conserva el orden de
+        `course_ids` y asigna `None` a los que no existen. Sólo se consultan los que no
+        están en la caché de cursos.
+        """
+        results: Dict[str, Optional[Dict[str, Any]]] = {course_id: None for course_id in course_ids}
+        pending = list(results)
+        if self._course_cache is not None:
+            for course_id, course in self._course_cache.get_many(pending).items():
+                results[course_id] = projection.apply(course)
+            pending = [course_id for course_id in pending if results[course_id] is None]
+
+        query, object_ids = self._ids_query(pending)
+        if query is None:
+            return results
+        fetch = DEFAULT_PROJECTION if self._course_cache is not None else projection
+        fields = fetch.mongo_projection(DETAIL_FIELDS, required=["legacy_id"])
+
+        try:
+            with span("mongo.find_many", ids=len(pending)) as current:
+                documents = self._call(lambda: list(self._collection.find(query, fields)))
+                current.set(results=len(documents))
+        except PyMongoError as exc:
+            logger.error(json.dumps({"event": "mongodb_courses_bulk_fetch_failed", "error": str(exc)}))
+            raise
+
+        for document in documents:
+            course = self._serialize_course(document, include_metadata=True)
+            requested = [object_ids.get(document.get("_id")), document.get("legacy_id")]
+            for course_id in requested:
+                if course_id is None or course_id not in results or results[course_id] is not None:
+                    continue
+                if self._course_cache is not None:
+                    course = self._course_cache.put(course_id, course)
+                results[course_id] = projection.apply(course)
+        return results
+
+    def get_course_embeddings(self, course_ids: List[str]) -> Dict[str, List[float]]:
+        """Embeddings de varios cursos (`ObjectId` o `legacy_id`) en una sola consulta `$in`."""
+        query, object_ids = self._ids_query(course_ids)
+        if query is None:
+            return {}
+        requested = set(course_ids)
+        try:
+            with span("mongo.find_embeddings", ids=len(course_ids)) as current:
+                documents = self._call(
+                    lambda: list(self._collection.find(query, {"_id": 1, "legacy_id": 1, "embedding": 1}))
+                )
+                current.set(results=len(documents))
+        except PyMongoError as exc:
+            logger.error(json.dumps({"event": "mongodb_embeddings_fetch_failed", "error": str(exc)}))
             raise
 
-        filtered = [course for course in candidates if self._matches_filters(course, filters)]
-        return [self._serialize_course(course) for course in filtered[:limit]]
+        embeddings: Dict[str, List[float]] = {}
+        for document in documents:
+            if not document.get("embedding"):
+                continue
+            for course_id in (object_ids.get(document.get("_id")), document.get("legacy_id")):
+                if course_id is not None and course_id in requested:
+                    embeddings[course_id] = document["embedding"]
+        return embeddings
 
-    def get_course_by_id(self, course_id: str) -> Optional[Dict[str, Any]]:
+    def get_course_embedding(self, course_id: str) -> Optional[Tuple[str, Optional[List[float]]]]:
+        """`(course_id canónico, embedding)` de un curso; `None` si no existe."""
         if ObjectId.is_valid(course_id):
             query: Dict[str, Any] = {"_id": ObjectId(course_id)}
         else:
             query = {"legacy_id": course_id}
-
         try:
-            document = self._collection.find_one(query)
+            with span("mongo.find_embedding") as current:
+                document = self._call(self._collection.find_one, query, {"_id": 1, "embedding": 1})
+                current.set(results=int(document is not None))
         except PyMongoError as exc:
-            logger.error(json.dumps({"event": "mongodb_course_fetch_failed", "error": str(exc)}))
+            logger.error(json.dumps({"event": "mongodb_embedding_fetch_failed", "error": str(exc)}))
             raise
 
         if not document:
             return None
-        return self._serialize_course(document, include_metadata=True)
+        return str(document["_id"]), document.get("embedding")
+
+    @staticmethod
+    def _ids_query(course_ids: List[str]) -> Tuple[Optional[Dict[str, Any]], Dict[ObjectId, str]]:
+        """Consulta `$in` para una mezcla de `ObjectId` y `legacy_id`, y el mapa `ObjectId → id pedido`."""
+        object_ids: Dict[ObjectId, str] = {}
+        legacy_ids: List[str] = []
+        for course_id in course_ids:
+            if ObjectId.is_valid(course_id):
+                object_ids[ObjectId(course_id)] = course_id
+            else:
+                legacy_ids.append(course_id)
+
+        clauses: List[Dict[str, Any]] = []
+        if object_ids:
+            clauses.append({"_id": {"$in": list(object_ids)}})
+        if legacy_ids:
+            clauses.append({"legacy_id": {"$in": legacy_ids}})
+
+        if not clauses:
+            return None, object_ids
+        return (clauses[0] if len(clauses) == 1 else {"$or": clauses}), object_ids
 
     def get_categories(self) -> List[Dict[str, Any]]:
         pipeline = [
@@ -103,66 +326,180 @@ class MongoCatalogClient:
             {"$sort": {"count": -1}},
         ]
         try:
-            data = list(self._collection.aggregate(pipeline))
+            with span("mongo.categories") as current:
+                data = self._call(lambda: list(self._collection.aggregate(pipeline)))
+                current.set(results=len(data))
         except PyMongoError as exc:
             logger.error(json.dumps({"event": "mongodb_categories_failed", "error": str(exc)}))
             raise
 
         return [{"name": item["_id"], "count": item["count"]} for item in data]
 
-    def get_trending_courses(self, limit: int) -> List[Dict[str, Any]]:
+    def get_catalog_snapshot(self, include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        """Todos los cursos serializados para índices en memoria.
+
+        Por defecto excluye el embedding; con `include_embeddings` cada curso lo incluye
+        bajo la clave `embedding` (sólo los documentos que lo tienen).
+        """
+        query: Dict[str, Any] = {"embedding": {"$exists": True}} if include_embeddings else {}
+        projection = None if include_embeddings else {"embedding": 0}
         try:
-            cursor = self._collection.find(
-                {},
-                {
-                    "_id": 1,
-                    "title": 1,
-                    "description": 1,
-                    "url": 1,
-                    "platform": 1,
-                    "rating": 1,
-                    "duration": 1,
-                    "price": 1,
-                    "language": 1,
-                    "category": 1,
-                    "level": 1,
-                    "students_count": 1,
-                },
-            ).sort(
-                [("students_count", -1), ("rating", -1)]
-            ).limit(limit)
+            with span("mongo.catalog_snapshot", embeddings=include_embeddings) as current:
+                documents = self._policy.call(lambda: list(self._collection.find(query, projection)))
+                current.set(results=len(documents))
         except PyMongoError as exc:
-            logger.error(json.dumps({"event": "mongodb_trending_failed", "error": str(exc)}))
+            logger.error(json.dumps({"event": "mongodb_catalog_snapshot_failed", "error": str(exc)}))
             raise
 
-        return [self._serialize_course(doc) for doc in cursor]
+        snapshot: List[Dict[str, Any]] = []
+        for document in documents:
+            course = self._serialize_course(document)
+            if include_embeddings:
+                course["embedding"] = document["embedding"]
+            snapshot.append(course)
+        return snapshot
 
-    def _matches_filters(self, course: Dict[str, Any], filters: Dict[str, Any]) -> bool:
-        if not filters:
-            return True
+    def get_catalog_version(self) -> Optional[str]:
+        """`processed_at` más reciente del catálogo; cambia sólo cuando corre la ingesta."""
+        try:
+            with span("mongo.catalog_version"):
+                document = self._call(
+                    self._collection.find_one,
+                    {"processed_at": {"$exists": True}},
+                    {"_id": 0, "processed_at": 1},
+                    sort=[("processed_at", -1)],
+                )
+        except PyMongoError as exc:
+            logger.error(json.dumps({"event": "mongodb_catalog_version_failed", "error": str(exc)}))
+            raise
 
-        level = filters.get("level")
-        if level and course.get("level") and course["level"].lower() != level.lower():
-            return False
+        if not document:
+            return None
+        return str(document["processed_at"])
 
-        category = filters.get("category")
-        if category and course.get("category") and course["category"].lower() != category.lower():
-            return False
+    def scan_catalog(
+        self,
+        since: Optional[Tuple[Any, Any]] = None,
+        include_embeddings: bool = False,
+        limit: Optional[int] = None,
+        max_time_ms: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Cursos en orden `(processed_at, _id)` para la réplica en memoria del catálogo.
 
-        language = filters.get("language")
-        if language and course.get("language") and course["language"].lower() != language.lower():
-            return False
+        `since` es la posición del último documento aplicado: sólo se devuelven los
+        posteriores, de modo que una ingesta que comparte `processed_at` no se relee entera.
+        Cada entrada trae el curso con metadatos, su `legacy_id`, el embedding (si se pide)
+        y su `position` para continuar la siguiente lectura.
+        """
+        query: Dict[str, Any] = {}
+        if since is not None:
+            processed_at, last_id = since
+            query = {
+                "$or": [
+                    {"processed_at": {"$gt": processed_at}},
+                    {"processed_at": processed_at, "_id": {"$gt": last_id}},
+                ]
+            }
+        required = ["legacy_id", "embedding"] if include_embeddings else ["legacy_id"]
+        fields = DEFAULT_PROJECTION.mongo_projection(DETAIL_FIELDS, required=required)
 
-        max_price = filters.get("max_price")
-        if max_price is not None:
-            try:
-                course_price = float(course.get("price") or 0.0)
-                if course_price > float(max_price):
-                    return False
-            except (TypeError, ValueError):
-                pass
+        def _read() -> List[Dict[str, Any]]:
+            cursor = self._collection.find(query, fields).sort([("processed_at", 1), ("_id", 1)])
+            if limit:
+                cursor = cursor.limit(limit)
+            if max_time_ms:
+                cursor = cursor.max_time_ms(max(int(max_time_ms), 1))
+            return list(cursor)
+
+        try:
+            with span("mongo.catalog_scan", incremental=since is not None) as current:
+                # Las lecturas incrementales tienen presupuesto propio: no se reintentan.
+                documents = self._policy.call(_read, retry=since is None)
+                current.set(results=len(documents))
+        except PyMongoError as exc:
+            logger.error(json.dumps({"event": "mongodb_catalog_scan_failed", "error": str(exc)}))
+            raise
+
+        return [self._catalog_entry(document, include_embeddings) for document in documents]
+
+    def read_catalog_changes(
+        self,
+        resume_token: Optional[Any] = None,
+        include_embeddings: bool = False,
+        max_changes: int = 500,
+        max_await_ms: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], Any]:
+        """Lee del change stream de la colección a partir de `resume_token`.
+
+        Devuelve `(cambios, resume_token)`. Cada cambio es `{"op": "upsert", "entry": ...}`,
+        `{"op": "delete", "course_id": ...}` o `{"op": "reset"}` (colección eliminada o
+        renombrada: hay que recargar). Con `max_changes=0` sólo se obtiene el token actual.
+        """
+        pipeline = [] if include_embeddings else [{"$project": {"fullDocument.embedding": 0}}]
+
+        def _read() -> Tuple[List[Dict[str, Any]], Any]:
+            changes: List[Dict[str, Any]] = []
+            with self._collection.watch(
+                pipeline,
+                full_document="updateLookup",
+                resume_after=resume_token,
+                max_await_time_ms=max_await_ms,
+            ) as stream:
+                while len(changes) < max_changes:
+                    change = stream.try_next()
+                    if change is None:
+                        break
+                    changes.append(self._catalog_change(change, include_embeddings))
+                return changes, stream.resume_token
+
+        try:
+            with span("mongo.catalog_changes") as current:
+                changes, token = self._policy.call(_read, retry=False)
+                current.set(results=len(changes))
+        except PyMongoError as exc:
+            logger.error(json.dumps({"event": "mongodb_catalog_changes_failed", "error": str(exc)}))
+            raise
+        return changes, token
+
+    def _catalog_change(self, change: Dict[str, Any], include_embeddings: bool) -> Dict[str, Any]:
+        operation = change.get("operationType")
+        if operation in {"insert", "update", "replace"} and change.get("fullDocument"):
+            return {"op": "upsert", "entry": self._catalog_entry(change["fullDocument"], include_embeddings)}
+        if operation in {"insert", "update", "replace", "delete"}:
+            # Con `updateLookup`, un documento borrado tras el cambio llega sin `fullDocument`.
+            return {"op": "delete", "course_id": str((change.get("documentKey") or {}).get("_id"))}
+        return {"op": "reset"}
+
+    def _catalog_entry(self, document: Dict[str, Any], include_embeddings: bool) -> Dict[str, Any]:
+        return {
+            "course": self._serialize_course(document, include_metadata=True),
+            "legacy_id": document.get("legacy_id"),
+            "embedding": document.get("embedding") if include_embeddings else None,
+            "position": (document.get("processed_at"), document.get("_id")),
+        }
+
+    def get_trending_courses(
+        self,
+        limit: int,
+        projection: CourseProjection = DEFAULT_PROJECTION,
+    ) -> List[Dict[str, Any]]:
+        fields = projection.mongo_projection(SUMMARY_FIELDS)
+        try:
+            # El cursor es perezoso: se materializa dentro de la política para cubrir la lectura.
+            with span("mongo.trending") as current:
+                documents = self._call(
+                    lambda: list(
+                        self._collection.find({}, fields)
+                        .sort([("students_count", -1), ("rating", -1)])
+                        .limit(limit)
+                    )
+                )
+                current.set(results=len(documents))
+        except PyMongoError as exc:
+            logger.error(json.dumps({"event": "mongodb_trending_failed", "error": str(exc)}))
+            raise
 
-        return True
+        return [projection.apply(self._serialize_course(doc)) for doc in documents]
 
     def _serialize_course(self, doc: Dict[str, Any], include_metadata: bool = False) -> Dict[str, Any]:
         course = {
@@ -183,14 +520,20 @@ class MongoCatalogClient:
             course["embedding_model"] = doc.get("embedding_model")
             course["embedding_dim"] = doc.get("embedding_dim")
             course["processed_at"] = doc.get("processed_at")
+        if "score" in doc:
+            course["score"] = doc["score"]
         return course
 
 
 _mongo_client: MongoCatalogClient | None = None
+_mongo_client_lock = threading.Lock()
 
 
 def get_mongo_client() -> MongoCatalogClient:
     global _mongo_client
     if _mongo_client is None:
-        _mongo_client = MongoCatalogClient()
+        # Las tareas concurrentes de una invocación fría comparten un único `MongoClient`.
+        with _mongo_client_lock:
+            if _mongo_client is None:
+                _mongo_client = MongoCatalogClient()
     return _mongo_client
@@ -0,0 +1,140 @@
+"""Personalización de búsquedas con el vector de preferencia del usuario.
+
+El vector de preferencia es la media normalizada de los embeddings de los cursos favoritos.
+Se guarda por usuario como suma sin normalizar: al añadir o quitar un favorito basta sumar o
+restar su embedding, sin volver a leer Postgres ni Atlas. Las búsquedas repetidas del mismo
+usuario no añaden ningún round trip.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from .telemetry import increment
+
+logger = logging.getLogger(__name__)
+
+
+class _Preference(NamedTuple):
+    total: List[float]
+    course_ids: frozenset
+    stored_at: float
+
+
+def normalize(vector: Sequence[float]) -> Optional[List[float]]:
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0.0:
+        return None
+    return [value / norm for value in vector]
+
+
+def blend(query_embedding: Sequence[float], preference: Sequence[float], weight: float) -> List[float]:
+    """`normalize((1 - weight) · q̂ + weight · p)`: la consulta domina y la preferencia desempata."""
+    query = normalize(query_embedding)
+    if query is None or len(query) != len(preference):
+        return list(query_embedding)
+    mixed = [(1.0 - weight) * q + weight * p for q, p in zip(query, preference)]
+    return normalize(mixed) or query
+
+
+class PreferenceVectors:
+    """LRU de vectores de preferencia por usuario con TTL.
+
+    El TTL acota cuánto tarda en verse un cambio de favoritos hecho desde otro contenedor;
+    los cambios hechos en éste se aplican al momento con `apply_change`.
+    """
+
+    def __init__(
+        self,
+        max_users: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_users = max_users
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Preference]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, user_id: object) -> bool:
+        entry = self._entries.get(user_id)  # type: ignore[arg-type]
+        return entry is not None and self._clock() - entry.stored_at < self._ttl_seconds
+
+    def get(
+        self,
+        user_id: str,
+        loader: Callable[[], Dict[str, List[float]]],
+    ) -> Optional[List[float]]:
+        """Vector normalizado del usuario; `loader` devuelve `{course_id: embedding}` de sus favoritos."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and self._clock() - entry.stored_at >= self._ttl_seconds:
+                del self._entries[user_id]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+        if entry is not None:
+            increment("preference_cache.hit")
+            return normalize(entry.total)
+
+        increment("preference_cache.miss")
+        embeddings = loader()
+        total: List[float] = []
+        for embedding in embeddings.values():
+            total = _add(total, embedding, 1.0)
+        self._store(user_id, _Preference(total, frozenset(embeddings), self._clock()))
+        return normalize(total) if total else None
+
+    def apply_change(
+        self,
+        user_id: str,
+        course_id: str,
+        is_favorite: bool,
+        embedding: Optional[Sequence[float]],
+    ) -> None:
+        """Suma o resta el embedding del curso; sin embedding se descarta el vector del usuario."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        if embedding is None:
+            self.invalidate(user_id)
+            return
+        if is_favorite == (course_id in entry.course_ids):
+            return
+        if is_favorite:
+            total = _add(entry.total, embedding, 1.0)
+            course_ids = entry.course_ids | {course_id}
+        else:
+            total = _add(entry.total, embedding, -1.0)
+            course_ids = entry.course_ids - {course_id}
+        # Se conserva `stored_at`: el TTL sigue acotando la deriva frente a otros contenedores.
+        self._store(user_id, _Preference(total if course_ids else [], course_ids, entry.stored_at))
+        logger.debug(json.dumps({"event": "preference_vector_updated", "favorites": len(course_ids)}))
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def _store(self, user_id: str, entry: _Preference) -> None:
+        if self._max_users <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self._max_users:
+                self._entries.popitem(last=False)
+
+
+def _add(total: Sequence[float], vector: Sequence[float], sign: float) -> List[float]:
+    if not total:
+        return [sign * value for value in vector]
+    if len(total) != len(vector):
+        return list(total)
+    return [current + sign * value for current, value in zip(total, vector)]
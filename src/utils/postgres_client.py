@@ -2,18 +2,127 @@
 
 from __future__ import annotations
 
+import json
 import logging
 import os
+import re
+import threading
+import time
 import uuid
 from contextlib import contextmanager
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set, Tuple
 
 import psycopg2
+from psycopg2 import errors
+from psycopg2 import extensions
 from psycopg2 import pool
 from psycopg2 import sql
 
+from .resilience import get_policy
+from .telemetry import increment, span
+
 logger = logging.getLogger(__name__)
 
+_PLACEHOLDER = re.compile(r"%(s|%)")
+
+
+class _PooledConnection(extensions.connection):
+    """Conexión con el estado que necesita el pool: último uso y sentencias preparadas."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.last_used_at = time.monotonic()
+        self.prepared: Set[str] = set()
+
+
+class ConnectionManager:
+    """Pool de conexiones seguro entre hilos con validación al sacar y reconexión.
+
+    - `ThreadedConnectionPool` detrás de un semáforo: si no hay conexiones libres se espera
+      hasta `checkout_timeout_seconds` en lugar de fallar al instante.
+    - Una conexión ociosa más de `idle_check_seconds` (p.ej. tras congelarse la Lambda o una
+      conmutación de RDS) se valida con `SELECT 1` antes de entregarla; si está muerta se
+      descarta y se abre otra. Las conexiones usadas hace poco no pagan la validación.
+    - Las sentencias preparadas se registran por conexión y se pierden con ella.
+    """
+
+    def __init__(
+        self,
+        min_conn: int,
+        max_conn: int,
+        *,
+        idle_check_seconds: float,
+        checkout_timeout_seconds: float,
+        **conn_kwargs: Any,
+    ) -> None:
+        self._max_conn = max_conn
+        self._idle_check_seconds = idle_check_seconds
+        self._checkout_timeout_seconds = checkout_timeout_seconds
+        self._slots = threading.BoundedSemaphore(max_conn)
+        self._pool = pool.ThreadedConnectionPool(
+            min_conn, max_conn, connection_factory=_PooledConnection, **conn_kwargs
+        )
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except errors.QueryCanceled:
+            # `statement_timeout` cancela la sentencia pero la conexión sigue sana.
+            conn.rollback()
+            raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # La conexión puede haber quedado inservible: se cierra en lugar de devolverla al pool.
+            broken = True
+            raise
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            conn.last_used_at = time.monotonic()
+            self._checkin(conn, close=broken or bool(conn.closed))
+
+    def _checkout(self) -> _PooledConnection:
+        if not self._slots.acquire(timeout=self._checkout_timeout_seconds):
+            increment("postgres.pool_exhausted")
+            raise pool.PoolError("pool de PostgreSQL agotado")
+        try:
+            # Como mucho se descartan todas las conexiones ociosas más una nueva.
+            for _attempt in range(self._max_conn + 1):
+                conn = self._pool.getconn()
+                if self._is_alive(conn):
+                    return conn
+                increment("postgres.reconnect")
+                logger.info(json.dumps({"event": "postgres_connection_discarded"}))
+                self._pool.putconn(conn, close=True)
+            raise psycopg2.OperationalError("no se pudo obtener una conexión válida a PostgreSQL")
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn: _PooledConnection, *, close: bool) -> None:
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    def _is_alive(self, conn: _PooledConnection) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used_at < self._idle_check_seconds:
+            return True
+        try:
+            # Abre la transacción que usará la sentencia siguiente: la validación cuesta
+            # un único round trip y no hace falta un ROLLBACK aparte.
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+        return True
+
 
 class FavoritesRepository:
     def __init__(self) -> None:
@@ -33,6 +142,12 @@ class FavoritesRepository:
 
         min_conn = int(os.getenv("POSTGRES_POOL_MIN", "1"))
         max_conn = int(os.getenv("POSTGRES_POOL_MAX", "5"))
+        rds_proxy = os.getenv("POSTGRES_RDS_PROXY", "false").lower() == "true"
+        # RDS Proxy fija (pinning) la conexión de backend de una sesión con sentencias
+        # preparadas y pierde la multiplexación; detrás del proxy se ejecutan sin preparar.
+        self._prepare_statements = (
+            not rds_proxy and os.getenv("POSTGRES_PREPARED_STATEMENTS", "true").lower() == "true"
+        )
 
         conn_kwargs = {
             "host": host,
@@ -40,68 +155,250 @@ class FavoritesRepository:
             "dbname": self._db,
             "user": self._user,
             "password": password,
-            "connect_timeout": 10,
+            # Conexión, espera de pool y sentencia quedan por debajo del presupuesto de las
+            # tareas del handler: una tarea abandonada no retiene su hilo de I/O.
+            "connect_timeout": int(os.getenv("POSTGRES_CONNECT_TIMEOUT_SECONDS", "2")),
+            "application_name": os.getenv("POSTGRES_APPLICATION_NAME", "search-api-lambda"),
+            # Keepalives TCP: una conexión cortada por una conmutación se detecta en el
+            # socket en lugar de quedarse esperando a que expire la petición.
+            "keepalives": 1,
+            "keepalives_idle": int(os.getenv("POSTGRES_KEEPALIVES_IDLE_SECONDS", "30")),
+            "keepalives_interval": 10,
+            "keepalives_count": 3,
         }
         if self._ssl_enabled:
             conn_kwargs["sslmode"] = "require"
+        statement_timeout_ms = int(os.getenv("POSTGRES_STATEMENT_TIMEOUT_MS", "2500"))
+        if statement_timeout_ms > 0 and not rds_proxy:
+            # Detrás de RDS Proxy un parámetro de arranque fija la sesión: allí
+            # `statement_timeout` se configura en el rol (`ALTER ROLE ... SET`).
+            conn_kwargs["options"] = f"-c statement_timeout={statement_timeout_ms}"
 
-        self._pool = pool.SimpleConnectionPool(min_conn, max_conn, **conn_kwargs)
+        self._connections = ConnectionManager(
+            min_conn,
+            max_conn,
+            idle_check_seconds=float(os.getenv("POSTGRES_IDLE_CHECK_SECONDS", "30")),
+            checkout_timeout_seconds=float(os.getenv("POSTGRES_CHECKOUT_TIMEOUT_SECONDS", "2")),
+            **conn_kwargs,
+        )
+        self._policy = get_policy("postgres", (psycopg2.OperationalError, psycopg2.InterfaceError))
 
-    @contextmanager
     def connection(self):
-        conn = self._pool.getconn()
+        return self._connections.connection()
+
+    def _execute(
+        self,
+        operation: str,
+        statement: Any,
+        params: Any,
+        *,
+        fetch: str = "one",
+        retry: bool = True,
+        prepare: Optional[str] = None,
+    ) -> Any:
+        """Ejecuta una sentencia y confirma la transacción bajo la política de Postgres.
+
+        `retry=False` para sentencias no idempotentes: un reintento tras un fallo de red
+        podría aplicar dos veces un cambio que sí llegó a confirmarse.
+        `prepare` nombra la sentencia preparada en el servidor; sólo se analiza y planifica
+        la primera vez en cada conexión.
+        """
+
+        def attempt() -> Any:
+            with self.connection() as conn:
+                with conn.cursor() as cur:
+                    if prepare and self._prepare_statements:
+                        self._execute_prepared(conn, cur, prepare, statement, params)
+                    else:
+                        cur.execute(statement, params)
+                    result = cur.fetchone() if fetch == "one" else cur.fetchall()
+                conn.commit()
+                return result
+
+        with span(f"postgres.{operation}"):
+            return self._policy.call(attempt, retry=retry)
+
+    @staticmethod
+    def _execute_prepared(
+        conn: _PooledConnection,
+        cur: Any,
+        name: str,
+        statement: Any,
+        params: Any,
+    ) -> None:
+        name = f"favorites_{name}"
+        if name not in conn.prepared:
+            FavoritesRepository._prepare(conn, cur, name, statement)
+        arguments = sql.SQL("EXECUTE {} ({})").format(
+            sql.Identifier(name), sql.SQL(", ").join(sql.Placeholder() * len(params))
+        )
         try:
-            yield conn
-        finally:
-            self._pool.putconn(conn)
+            cur.execute(arguments, params)
+        except errors.InvalidSqlStatementName:
+            # La sesión perdió sus sentencias (p.ej. `DISCARD ALL`): se preparan de nuevo.
+            conn.rollback()
+            conn.prepared.clear()
+            FavoritesRepository._prepare(conn, cur, name, statement)
+            cur.execute(arguments, params)
+
+    @staticmethod
+    def _prepare(conn: _PooledConnection, cur: Any, name: str, statement: Any) -> None:
+        counter = iter(range(1, 1000))
+        text = _PLACEHOLDER.sub(
+            lambda match: f"${next(counter)}" if match.group(1) == "s" else "%",
+            statement.as_string(conn),
+        )
+        # PREPARE no es transaccional: la sentencia sobrevive aunque la transacción se revierta.
+        cur.execute(sql.SQL("PREPARE {} AS ").format(sql.Identifier(name)).as_string(conn) + text)
+        conn.prepared.add(name)
+        increment("postgres.prepared")
 
     def is_favorite(self, user_id: str, course_id: str) -> bool:
         query = sql.SQL("SELECT 1 FROM {} WHERE user_id = %s AND mongodb_course_id = %s LIMIT 1").format(
             sql.Identifier(self._table)
         )
-        with self.connection() as conn, conn.cursor() as cur:
-            cur.execute(query, (user_id, course_id))
-            return cur.fetchone() is not None
+        return self._execute("is_favorite", query, (user_id, course_id), prepare="is_favorite") is not None
 
-    def set_favorite(self, user_id: str, course_id: str, *, should_favorite: bool) -> bool:
-        with self.connection() as conn:
-            with conn.cursor() as cur:
-                if should_favorite:
-                    statement = sql.SQL(
-                        """
-                        INSERT INTO {} (favorite_id, user_id, mongodb_course_id, created_at)
-                        VALUES (%s, %s, %s, NOW())
-                        ON CONFLICT (user_id, mongodb_course_id) DO NOTHING
-                        """
-                    ).format(sql.Identifier(self._table))
-                    cur.execute(statement, (str(uuid.uuid4()), user_id, course_id))
-                    conn.commit()
-                    return True
-                statement = sql.SQL("DELETE FROM {} WHERE user_id = %s AND mongodb_course_id = %s").format(
-                    sql.Identifier(self._table)
-                )
-                cur.execute(statement, (user_id, course_id))
-                conn.commit()
-                return False
+    def is_favorite_many(self, user_id: str, course_ids: List[str]) -> Set[str]:
+        """Subconjunto de `course_ids` que el usuario tiene en favoritos, en una sola consulta."""
+        if not course_ids:
+            return set()
+        query = sql.SQL(
+            "SELECT mongodb_course_id FROM {} WHERE user_id = %s AND mongodb_course_id = ANY(%s)"
+        ).format(sql.Identifier(self._table))
+        rows = self._execute(
+            "is_favorite_many",
+            query,
+            (user_id, list(course_ids)),
+            fetch="all",
+            prepare="is_favorite_many",
+        )
+        return {row[0] for row in rows}
+
+    def set_favorite(self, user_id: str, course_id: str, *, should_favorite: bool) -> Tuple[bool, bool]:
+        """Fija el estado del favorito; devuelve `(is_favorite, changed)`."""
+        if should_favorite:
+            statement = sql.SQL(
+                """
+                INSERT INTO {} (favorite_id, user_id, mongodb_course_id, created_at)
+                VALUES (%s, %s, %s, NOW())
+                ON CONFLICT (user_id, mongodb_course_id) DO NOTHING
+                RETURNING 1
+                """
+            ).format(sql.Identifier(self._table))
+            params: Tuple[Any, ...] = (str(uuid.uuid4()), user_id, course_id)
+            prepared = "insert"
+        else:
+            statement = sql.SQL(
+                "DELETE FROM {} WHERE user_id = %s AND mongodb_course_id = %s RETURNING 1"
+            ).format(sql.Identifier(self._table))
+            params = (user_id, course_id)
+            prepared = "delete"
+
+        # Añadir o quitar es idempotente: se puede reintentar sin riesgo.
+        changed = self._execute("set_favorite", statement, params, prepare=prepared) is not None
+        return should_favorite, changed
+
+    def toggle_favorite(self, user_id: str, course_id: str) -> Tuple[bool, bool]:
+        """Alterna el favorito en una sola sentencia; devuelve `(is_favorite, changed)`.
+
+        El DELETE y el INSERT comparten instantánea: si el DELETE borró la fila el INSERT
+        no se ejecuta. Ante doble clic concurrente, el segundo DELETE espera el bloqueo de
+        fila y el resultado reportado siempre coincide con el estado final de la tabla.
+        """
+        statement = sql.SQL(
+            """
+            WITH removed AS (
+                DELETE FROM {table}
+                WHERE user_id = %s AND mongodb_course_id = %s
+                RETURNING 1
+            ), inserted AS (
+                INSERT INTO {table} (favorite_id, user_id, mongodb_course_id, created_at)
+                SELECT %s, %s, %s, NOW()
+                WHERE NOT EXISTS (SELECT 1 FROM removed)
+                ON CONFLICT (user_id, mongodb_course_id) DO NOTHING
+                RETURNING 1
+            )
+            SELECT EXISTS (SELECT 1 FROM removed), EXISTS (SELECT 1 FROM inserted)
+            """
+        ).format(table=sql.Identifier(self._table))
+
+        # Sin preparar: en un PREPARE los parámetros de la lista SELECT se tiparían como text
+        # en lugar de tomar el tipo de las columnas del INSERT.
+        removed, inserted = self._execute(
+            "toggle_favorite",
+            statement,
+            (user_id, course_id, str(uuid.uuid4()), user_id, course_id),
+            retry=False,
+        )
+        return not removed, bool(removed or inserted)
 
     def list_favorites(self, user_id: str) -> List[Dict[str, Any]]:
         query = sql.SQL(
             "SELECT mongodb_course_id, created_at FROM {} WHERE user_id = %s ORDER BY created_at DESC"
         ).format(sql.Identifier(self._table))
-        with self.connection() as conn, conn.cursor() as cur:
-            cur.execute(query, (user_id,))
-            rows = cur.fetchall()
+        rows = self._execute("list_favorites", query, (user_id,), fetch="all", prepare="list_favorites")
         return [
             {"course_id": row[0], "created_at": row[1]}
             for row in rows
         ]
 
+    def list_favorites_page(
+        self,
+        user_id: str,
+        limit: int,
+        after: Optional[Tuple[str, str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Página de favoritos por keyset `(created_at, favorite_id)` más el total del usuario.
+
+        `after` es la clave de la última fila de la página anterior. La consulta recorre el
+        índice `(user_id, created_at DESC, favorite_id DESC)` sin OFFSET y devuelve el total
+        en el mismo round trip.
+        """
+        keyset = sql.SQL("")
+        params: List[Any] = [user_id]
+        prepared = "list_favorites_page"
+        if after is not None:
+            prepared = "list_favorites_page_after"
+            keyset = sql.SQL("AND (created_at, favorite_id) < (%s::timestamptz, %s::uuid)")
+            params.extend(after)
+        params.extend([limit, user_id])
+
+        query = sql.SQL(
+            """
+            WITH page AS (
+                SELECT mongodb_course_id, created_at, favorite_id
+                FROM {table}
+                WHERE user_id = %s {keyset}
+                ORDER BY created_at DESC, favorite_id DESC
+                LIMIT %s
+            )
+            SELECT page.mongodb_course_id, page.created_at, page.favorite_id, counter.total
+            FROM (SELECT COUNT(*) AS total FROM {table} WHERE user_id = %s) AS counter
+            LEFT JOIN page ON TRUE
+            ORDER BY page.created_at DESC, page.favorite_id DESC
+            """
+        ).format(table=sql.Identifier(self._table), keyset=keyset)
+
+        rows = self._execute("list_favorites_page", query, params, fetch="all", prepare=prepared)
+
+        total = int(rows[0][3]) if rows else 0
+        entries = [
+            {"course_id": row[0], "created_at": row[1], "favorite_id": str(row[2])}
+            for row in rows
+            if row[0] is not None
+        ]
+        return entries, total
+
 
 _favorites_repo: Optional[FavoritesRepository] = None
+_favorites_repo_lock = threading.Lock()
 
 
 def get_favorites_repository() -> FavoritesRepository:
     global _favorites_repo
     if _favorites_repo is None:
-        _favorites_repo = FavoritesRepository()
+        with _favorites_repo_lock:
+            if _favorites_repo is None:
+                _favorites_repo = FavoritesRepository()
     return _favorites_repo
@@ -0,0 +1,256 @@
+"""Circuit breakers, presupuestos de reintento y deadline compartido para las dependencias."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+# API Gateway corta a los 29 s aunque la Lambda tenga más tiempo configurado.
+API_GATEWAY_TIMEOUT_MS = 29000
+DEADLINE_MARGIN_MS = int(os.getenv("HANDLER_DEADLINE_MARGIN_MS", "500"))
+
+
+class Deadline:
+    """Instante límite de la invocación, compartido por todas las tareas de I/O."""
+
+    def __init__(self, budget_ms: float) -> None:
+        self._expires_at = time.monotonic() + max(budget_ms, 0) / 1000.0
+
+    @classmethod
+    def from_context(cls, context: Any) -> "Deadline":
+        budget_ms = float(API_GATEWAY_TIMEOUT_MS)
+        get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+        if callable(get_remaining):
+            budget_ms = min(budget_ms, float(get_remaining()))
+        return cls(budget_ms - DEADLINE_MARGIN_MS)
+
+    def remaining(self) -> float:
+        """Segundos restantes (0 si ya venció)."""
+        return max(self._expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+
+# Lambda procesa un evento por contenedor a la vez: el deadline vigente es global al proceso.
+_current_deadline = Deadline(API_GATEWAY_TIMEOUT_MS - DEADLINE_MARGIN_MS)
+
+
+def start_deadline(context: Any) -> Deadline:
+    global _current_deadline
+    _current_deadline = Deadline.from_context(context)
+    return _current_deadline
+
+
+def current_deadline() -> Deadline:
+    return _current_deadline
+
+
+class DependencyUnavailable(Exception):
+    """El circuito de la dependencia está abierto o el deadline no permite intentarlo."""
+
+    def __init__(self, dependency: str, reason: str) -> None:
+        super().__init__(f"{dependency} no disponible: {reason}")
+        self.dependency = dependency
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """closed → open tras `failure_threshold` fallos seguidos; open → half-open tras `reset_timeout`.
+
+    En half-open se deja pasar una sola llamada de prueba: si va bien el circuito se cierra,
+    si falla vuelve a abrirse otro `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self._reset_timeout:
+                    return False
+                self._transition(self.HALF_OPEN)
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def release(self) -> None:
+        """Libera la sonda de half-open sin contar la llamada como éxito ni como fallo."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+                if self._state != self.OPEN:
+                    self._transition(self.OPEN)
+
+    def _transition(self, state: str) -> None:
+        logger.warning(
+            json.dumps(
+                {"event": "circuit_state_changed", "dependency": self.name, "from": self._state, "to": state}
+            )
+        )
+        self._state = state
+
+
+class RetryBudget:
+    """Cubo de tokens: cada éxito deposita `ratio` y cada reintento consume uno.
+
+    Limita los reintentos a una fracción del tráfico sano y evita tormentas de reintentos
+    cuando la dependencia ya está degradada.
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0) -> None:
+        self._ratio = ratio
+        self._max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self._max_tokens, self._tokens + self._ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+
+class DependencyPolicy:
+    """Breaker + reintentos con backoff exponencial que nunca esperan más allá del deadline."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_on: Tuple[Type[BaseException], ...],
+        max_attempts: int = 2,
+        base_delay: float = 0.1,
+        max_delay: float = 1.0,
+        min_attempt_time: float = 0.5,
+        breaker: Optional[CircuitBreaker] = None,
+        budget: Optional[RetryBudget] = None,
+        is_failure: Optional[Callable[[BaseException], bool]] = None,
+    ) -> None:
+        self.name = name
+        self._failure_on = failure_on
+        # Afina `failure_on` cuando el tipo no basta (p.ej. un `ClientError` 4xx frente a un 503).
+        self._is_failure = is_failure
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._min_attempt_time = min_attempt_time
+        self.breaker = breaker or CircuitBreaker(name)
+        self._budget = budget or RetryBudget()
+
+    def call(self, func: Callable[..., Any], *args: Any, retry: bool = True, **kwargs: Any) -> Any:
+        """Ejecuta `func`; con `retry=False` (operaciones no idempotentes) hay un solo intento."""
+        attempts = self._max_attempts if retry else 1
+        deadline = current_deadline()
+
+        for attempt in range(attempts):
+            if deadline.expired:
+                raise DependencyUnavailable(self.name, "deadline agotado")
+            if not self.breaker.allow():
+                raise DependencyUnavailable(self.name, "circuito abierto")
+
+            try:
+                result = func(*args, **kwargs)
+            except self._failure_on as exc:
+                if self._is_failure is not None and not self._is_failure(exc):
+                    # Error del llamante (petición inválida, permisos): ni se reintenta ni
+                    # cuenta para el circuito.
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                delay = min(self._max_delay, self._base_delay * (2 ** attempt)) * random.uniform(0.75, 1.25)
+                if deadline.remaining() < delay + self._min_attempt_time or not self._budget.withdraw():
+                    raise
+                logger.warning(
+                    "%s falló (intento %s): %s. Reintentando en %.2fs", self.name, attempt + 1, exc, delay
+                )
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Errores que no indican caída de la dependencia (validación, datos) no abren el
+                # circuito ni lo cierran: sólo liberan la sonda de half-open.
+                self.breaker.release()
+                raise
+
+            self.breaker.record_success()
+            self._budget.deposit()
+            return result
+
+        raise DependencyUnavailable(self.name, "sin intentos")  # pragma: no cover - inalcanzable
+
+
+_policies: Dict[str, DependencyPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(name: str, failure_on: Tuple[Type[BaseException], ...], **defaults: Any) -> DependencyPolicy:
+    """Política compartida por dependencia; los valores se pueden ajustar por entorno.
+
+    Variables: `<NAME>_MAX_ATTEMPTS`, `<NAME>_BREAKER_THRESHOLD`, `<NAME>_BREAKER_RESET_SECONDS`.
+    """
+    with _policies_lock:
+        policy = _policies.get(name)
+        if policy is None:
+            prefix = name.upper()
+            policy = DependencyPolicy(
+                name,
+                failure_on,
+                max_attempts=int(os.getenv(f"{prefix}_MAX_ATTEMPTS", str(defaults.pop("max_attempts", 2)))),
+                breaker=CircuitBreaker(
+                    name,
+                    failure_threshold=int(os.getenv(f"{prefix}_BREAKER_THRESHOLD", "5")),
+                    reset_timeout=float(os.getenv(f"{prefix}_BREAKER_RESET_SECONDS", "30")),
+                ),
+                **defaults,
+            )
+            _policies[name] = policy
+        return policy
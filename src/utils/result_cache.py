@@ -0,0 +1,295 @@
+"""Caché de resultados precomputados para endpoints de solo lectura del catálogo."""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from .serialization import EncodedCourse
+from .telemetry import increment
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotCache:
+    """Instantáneas con TTL, stale-while-revalidate e invalidación por versión del catálogo.
+
+    - Dentro del TTL se sirve la instantánea sin tocar la base de datos.
+    - Dentro de la ventana `stale` se sirve la instantánea y se revalida en segundo plano:
+      si la versión (p.ej. el `processed_at` más reciente) no cambió, sólo se renueva el TTL.
+    - Fuera de ambas ventanas se recarga de forma síncrona; si la recarga falla y hay una
+      instantánea previa, se sirve la previa.
+
+    Las recargas de una misma clave no se solapan: con la caché fría, las peticiones
+    concurrentes esperan a la primera carga en lugar de repetirla cada una.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        stale_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._ttl_seconds = ttl_seconds
+        self._stale_seconds = stale_seconds
+        self._clock = clock
+        self._entries: Dict[Hashable, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+
+    def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        version_loader: Optional[Callable[[], Any]] = None,
+    ) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = self._clock() - entry["loaded_at"]
+            if age < self._ttl_seconds:
+                increment("snapshot_cache.hit")
+                return entry["value"]
+            if age < self._ttl_seconds + self._stale_seconds:
+                increment("snapshot_cache.stale")
+                self._schedule_refresh(key, loader, version_loader)
+                return entry["value"]
+
+        increment("snapshot_cache.miss")
+        with self._key_lock(key):
+            # Otra petición pudo completar la carga mientras se esperaba el lock.
+            current = self._entries.get(key)
+            if current is not None and self._clock() - current["loaded_at"] < self._ttl_seconds:
+                return current["value"]
+            try:
+                return self._refresh(key, loader, version_loader)
+            except Exception:
+                entry = current or entry
+                if entry is None:
+                    raise
+                logger.warning(
+                    json.dumps({"event": "snapshot_refresh_failed", "key": str(key), "serving": "stale"}),
+                    exc_info=True,
+                )
+                return entry["value"]
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+
+    def _schedule_refresh(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        version_loader: Optional[Callable[[], Any]],
+    ) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["refreshing"]:
+                return
+            entry["refreshing"] = True
+
+        def _run() -> None:
+            try:
+                with self._key_lock(key):
+                    self._refresh(key, loader, version_loader)
+            except Exception:
+                logger.warning(
+                    json.dumps({"event": "snapshot_refresh_failed", "key": str(key), "serving": "stale"}),
+                    exc_info=True,
+                )
+            finally:
+                with self._lock:
+                    current = self._entries.get(key)
+                    if current is not None:
+                        current["refreshing"] = False
+
+        threading.Thread(target=_run, name=f"snapshot-refresh-{key}", daemon=True).start()
+
+    def _refresh(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        version_loader: Optional[Callable[[], Any]],
+    ) -> Any:
+        # La versión se lee antes que los datos: si una ingesta ocurre entre ambas lecturas,
+        # la siguiente revalidación verá una versión distinta y recargará.
+        version = version_loader() if version_loader else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and version_loader and version == entry["version"]:
+                entry["loaded_at"] = self._clock()
+                return entry["value"]
+
+        value = loader()
+        with self._lock:
+            self._entries[key] = {
+                "value": value,
+                "version": version,
+                "loaded_at": self._clock(),
+                "refreshing": False,
+            }
+        return value
+
+
+class CourseCache:
+    """LRU de cursos serializados acotado por bytes, con TTL por entrada.
+
+    Se vacía entero cuando cambia la versión del catálogo (el `processed_at` más reciente).
+    La versión se consulta como mucho cada `version_check_seconds`, de modo que los
+    aciertos no hacen ningún viaje a la base de datos.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: float,
+        version_check_seconds: float,
+        version_loader: Optional[Callable[[], Any]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_bytes = max_bytes
+        self._ttl_seconds = ttl_seconds
+        self._version_check_seconds = version_check_seconds
+        self._version_loader = version_loader
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[EncodedCourse, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._version: Any = None
+        self._version_checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, EncodedCourse]:
+        """Cursos vigentes por clave; son compartidos y no deben modificarse (usar `with_fields`)."""
+        keys = list(keys)
+        self._check_version()
+        now = self._clock()
+        found: Dict[str, EncodedCourse] = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                course, size, stored_at = entry
+                if now - stored_at >= self._ttl_seconds:
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = course
+        increment("course_cache.hit", len(found))
+        increment("course_cache.miss", len(keys) - len(found))
+        return found
+
+    def get(self, key: str) -> Optional[EncodedCourse]:
+        return self.get_many([key]).get(key)
+
+    def put(self, key: str, course: Dict[str, Any]) -> EncodedCourse:
+        encoded = course if isinstance(course, EncodedCourse) else EncodedCourse.encode(course)
+        size = len(encoded.fragment() or "") + len(key)
+        if size > self._max_bytes:
+            return encoded
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (encoded, size, self._clock())
+            self._bytes += size
+            while self._bytes > self._max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+        return encoded
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _course, size, _stored_at = self._entries.pop(key)
+        self._bytes -= size
+
+    def _check_version(self) -> None:
+        if self._version_loader is None:
+            return
+        now = self._clock()
+        if (
+            self._version_checked_at is not None
+            and now - self._version_checked_at < self._version_check_seconds
+        ):
+            return
+        # Se marca antes de consultar: si la consulta falla no se reintenta en cada acierto.
+        self._version_checked_at = now
+        try:
+            version = self._version_loader()
+        except Exception:
+            logger.warning(json.dumps({"event": "course_cache_version_check_failed"}), exc_info=True)
+            return
+        if version != self._version:
+            if self._version is not None:
+                logger.info(json.dumps({"event": "course_cache_invalidated", "version": str(version)}))
+            self.clear()
+            self._version = version
+
+
+class ResultSetCache:
+    """Listas de resultados de vida corta: rankings `(course_id, score)` de búsqueda para
+    paginar sin repetir la consulta, o cursos similares ya serializados.
+
+    LRU acotado por número de entradas y con TTL.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[List[Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[List[Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._clock() - entry[1] >= self._ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        increment("result_set_cache.hit" if entry is not None else "result_set_cache.miss")
+        return entry[0] if entry is not None else None
+
+    def put(self, key: str, ranking: List[Any]) -> None:
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (ranking, self._clock())
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
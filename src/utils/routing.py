@@ -0,0 +1,66 @@
+"""Tabla de rutas compilada en la fase init: método + ruta, parámetros de ruta y 404 frente a 405."""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+_PARAMETER = re.compile(r"\{(?P<name>[a-z_]+)\}")
+
+
+class RouteMatch(NamedTuple):
+    """Resultado de resolver una ruta; `handler` es `None` si la ruta existe pero no el método."""
+
+    template: str
+    handler: Optional[Callable[..., Any]]
+    params: Dict[str, str]
+    allowed_methods: Tuple[str, ...]
+
+
+class Router:
+    """Rutas estáticas en un diccionario y rutas con parámetros como regex precompiladas.
+
+    Las estáticas tienen prioridad: `/api/courses/categories` no se interpreta como
+    `/api/courses/{course_id}`.
+    """
+
+    def __init__(self) -> None:
+        self._static: Dict[str, Dict[str, Callable[..., Any]]] = {}
+        self._dynamic: List[Tuple[Pattern[str], str, Dict[str, Callable[..., Any]]]] = []
+
+    def add(self, method: str, template: str, handler: Callable[..., Any]) -> None:
+        if not _PARAMETER.search(template):
+            self._static.setdefault(template, {})[method.upper()] = handler
+            return
+        for _pattern, existing, methods in self._dynamic:
+            if existing == template:
+                methods[method.upper()] = handler
+                return
+        pattern = re.compile(
+            "^" + _PARAMETER.sub(lambda match: f"(?P<{match.group('name')}>[^/]+)", template) + "$"
+        )
+        self._dynamic.append((pattern, template, {method.upper(): handler}))
+
+    def route(self, method: str, template: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """Decorador equivalente a `add`."""
+
+        def _register(handler: Callable[..., Any]) -> Callable[..., Any]:
+            self.add(method, template, handler)
+            return handler
+
+        return _register
+
+    def resolve(self, method: str, path: str) -> Optional[RouteMatch]:
+        """`None` si ninguna ruta coincide (404); `RouteMatch` sin handler si el método no (405)."""
+        methods = self._static.get(path)
+        template = path
+        params: Dict[str, str] = {}
+        if methods is None:
+            for pattern, candidate, candidate_methods in self._dynamic:
+                match = pattern.match(path)
+                if match is not None:
+                    methods, template, params = candidate_methods, candidate, match.groupdict()
+                    break
+            else:
+                return None
+        return RouteMatch(template, methods.get(method), params, tuple(sorted(methods)))
@@ -0,0 +1,204 @@
+"""Compilación de filtros de búsqueda para `$vectorSearch` y evaluación exacta en Python."""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Cada filtro público se describe de forma declarativa para que añadir un campo nuevo
+# sólo requiera una entrada aquí: campo en Mongo, operador y selectividad estimada.
+# `$vectorSearch.filter` no filtra por `field` sino por su clave normalizada
+# (`FILTER_KEYS_PATH.<field>`, ver `filter_keys`).
+FILTER_SPECS: Dict[str, Dict[str, Any]] = {
+    "level": {"field": "level", "op": "eq", "selectivity": 0.34},
+    "category": {"field": "category", "op": "eq", "selectivity": 0.1},
+    "language": {"field": "language", "op": "eq", "selectivity": 0.5},
+    "platform": {"field": "platform", "op": "eq", "selectivity": 0.25},
+    "max_price": {"field": "price", "op": "lte", "selectivity": 0.6},
+    "min_rating": {"field": "rating", "op": "gte", "selectivity": 0.5},
+}
+
+# Umbrales de las facetas de rango: por cada uno se cuenta cuántos candidatos pasarían el filtro.
+FACET_THRESHOLDS: Dict[str, Tuple[float, ...]] = {
+    "max_price": (0.0, 20.0, 50.0, 100.0),
+    "min_rating": (3.5, 4.0, 4.5),
+}
+
+FILTER_KEYS_PATH = "filter_keys"
+# Vacío: sin las claves normalizadas escritas en la ingesta no se empuja ningún filtro.
+DEFAULT_INDEXED_FIELDS = ""
+MAX_NUM_CANDIDATES = 10000
+
+
+def get_indexed_filter_fields() -> List[str]:
+    """Rutas declaradas como `filter` en el índice vectorial de Atlas (p.ej. `filter_keys.level`)."""
+    raw = os.getenv("ATLAS_FILTER_FIELDS", DEFAULT_INDEXED_FIELDS)
+    return [field.strip() for field in raw.split(",") if field.strip()]
+
+
+def filter_key_path(spec: Dict[str, Any]) -> str:
+    return f"{FILTER_KEYS_PATH}.{spec['field']}"
+
+
+def filter_keys(course: Dict[str, Any]) -> Dict[str, Any]:
+    """Claves normalizadas que la ingesta guarda en `filter_keys` para filtrar en Atlas.
+
+    Reproducen la semántica de `matches_filters` con comparaciones exactas: igualdad en
+    minúsculas con `""` para un valor ausente (que cualquier filtro acepta) y números con
+    `0.0` para un valor ausente o nulo.
+    """
+    keys: Dict[str, Any] = {}
+    for spec in FILTER_SPECS.values():
+        field = spec["field"]
+        if field in keys:
+            continue
+        value = course.get(field)
+        if spec["op"] == "eq":
+            keys[field] = str(value).lower() if value else ""
+            continue
+        try:
+            keys[field] = float(value or 0.0)
+        except (TypeError, ValueError):
+            # Sin clave el curso no pasa el filtro nativo; la ingesta debe escribir números.
+            continue
+    return keys
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Descarta filtros vacíos o desconocidos y convierte los numéricos."""
+    if not filters:
+        return {}
+
+    normalized: Dict[str, Any] = {}
+    for name, value in filters.items():
+        spec = FILTER_SPECS.get(name)
+        if spec is None or value is None or value == "":
+            continue
+        if spec["op"] == "eq":
+            normalized[name] = str(value).strip()
+        else:
+            try:
+                normalized[name] = float(value)
+            except (TypeError, ValueError):
+                continue
+    return normalized
+
+
+def _compile_clause(spec: Dict[str, Any], value: Any) -> Dict[str, Any]:
+    path = filter_key_path(spec)
+    if spec["op"] == "eq":
+        # `""` es la clave de un valor ausente: `matches_filters` conserva esos cursos.
+        return {path: {"$in": [str(value).lower(), ""]}}
+    return {path: {f"${spec['op']}": value}}
+
+
+def compile_vector_filter(
+    filters: Dict[str, Any],
+    indexed_fields: Iterable[str],
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """Separa los filtros en una expresión nativa `$vectorSearch.filter` y un residuo Python.
+
+    Sólo se empujan a Atlas los filtros cuya clave normalizada está indexada como
+    `filter`; el resto se devuelve como residuo para evaluarse con `matches_filters`
+    tras la consulta. Ambos caminos devuelven los mismos cursos.
+    """
+    indexed = set(indexed_fields)
+    clauses: List[Dict[str, Any]] = []
+    residual: Dict[str, Any] = {}
+
+    for name, value in filters.items():
+        spec = FILTER_SPECS[name]
+        if filter_key_path(spec) in indexed:
+            clauses.append(_compile_clause(spec, value))
+        else:
+            residual[name] = value
+
+    if not clauses:
+        return None, residual
+    if len(clauses) == 1:
+        return clauses[0], residual
+    return {"$and": clauses}, residual
+
+
+def estimate_selectivity(filters: Dict[str, Any]) -> float:
+    """Fracción estimada del catálogo que supera los filtros (independencia entre campos)."""
+    selectivity = 1.0
+    for name in filters:
+        selectivity *= FILTER_SPECS[name]["selectivity"]
+    return max(selectivity, 0.001)
+
+
+def plan_num_candidates(limit: int, selectivity: float, multiplier: int = 20) -> int:
+    """`numCandidates` proporcional a lo restrictivo del filtro, acotado por Atlas."""
+    base = limit * multiplier
+    planned = int(math.ceil(base / max(selectivity, 0.01) ** 0.5))
+    return max(limit, min(max(base, planned), MAX_NUM_CANDIDATES))
+
+
+def matches_filters(course: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Evaluación exacta en Python, usada como residuo o fallback sin índice de filtros."""
+    for name, value in filters.items():
+        spec = FILTER_SPECS.get(name)
+        if spec is None:
+            continue
+        current = course.get(spec["field"])
+
+        if spec["op"] == "eq":
+            if current and str(current).lower() != str(value).lower():
+                return False
+            continue
+
+        try:
+            numeric = float(current or 0.0)
+            threshold = float(value)
+        except (TypeError, ValueError):
+            continue
+        if spec["op"] == "lte" and numeric > threshold:
+            return False
+        if spec["op"] == "gte" and numeric < threshold:
+            return False
+
+    return True
+
+
+def compute_facets(courses: Iterable[Dict[str, Any]], names: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Conteos por faceta sobre los candidatos de una búsqueda, con la semántica de `matches_filters`.
+
+    Las facetas llevan el nombre del filtro y cada `value` puede enviarse tal cual en `filters`:
+    igualdad agrupa sin distinguir mayúsculas (ordenado por frecuencia); los rangos cuentan,
+    para cada umbral de `FACET_THRESHOLDS`, los cursos que lo cumplen.
+    """
+    courses = list(courses)
+    facets: Dict[str, List[Dict[str, Any]]] = {}
+    for name in names:
+        spec = FILTER_SPECS[name]
+        field = spec["field"]
+        if spec["op"] == "eq":
+            counts: Dict[str, List[Any]] = {}
+            for course in courses:
+                value = course.get(field)
+                if not value:
+                    continue
+                bucket = counts.setdefault(str(value).lower(), [value, 0])
+                bucket[1] += 1
+            ordered = sorted(counts.values(), key=lambda item: item[1], reverse=True)
+            facets[name] = [{"value": value, "count": count} for value, count in ordered]
+            continue
+
+        numbers = []
+        for course in courses:
+            try:
+                numbers.append(float(course.get(field) or 0.0))
+            except (TypeError, ValueError):
+                continue
+        facets[name] = [
+            {
+                "value": threshold,
+                "count": sum(
+                    1 for number in numbers if (number <= threshold if spec["op"] == "lte" else number >= threshold)
+                ),
+            }
+            for threshold in FACET_THRESHOLDS.get(name, ())
+        ]
+    return facets
@@ -0,0 +1,201 @@
+"""Serialización JSON de respuestas (orjson con fallback a la stdlib) y compresión gzip/br.
+
+Los cursos de las instantáneas en memoria (trending, índice léxico, índice vectorial local)
+se guardan como `EncodedCourse`: un `dict` normal que además conserva su JSON ya generado,
+de modo que cada respuesta copia el fragmento en lugar de volver a serializar el curso.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_SERIALIZER = os.getenv("JSON_SERIALIZER", "auto").lower()
+COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+_ORJSON_FRAGMENT = getattr(orjson, "Fragment", None)
+
+
+class EncodedCourse(dict):
+    """Curso con su JSON precalculado; cualquier modificación descarta el fragmento.
+
+    `with_fields` añade campos por petición (p.ej. `score`) sin re-serializar el curso:
+    el fragmento base se extiende con el JSON de los campos nuevos.
+    """
+
+    __slots__ = ("_base", "_extras")
+
+    def __init__(
+        self,
+        course: Dict[str, Any],
+        base: Optional[str] = None,
+        extras: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        super().__init__(course)
+        self._base = base
+        self._extras = extras or {}
+
+    @classmethod
+    def encode(cls, course: Dict[str, Any]) -> "EncodedCourse":
+        return cls(course, base=encode_json(dict(course)))
+
+    def with_fields(self, **fields: Any) -> Dict[str, Any]:
+        if self._base is None or any(key in self and key not in self._extras for key in fields):
+            # El campo ya está en el fragmento base: no se puede anexar sin duplicar la clave.
+            return {**self, **fields}
+        merged = EncodedCourse(self, base=self._base, extras={**self._extras, **fields})
+        dict.update(merged, fields)
+        return merged
+
+    def fragment(self) -> Optional[str]:
+        if self._base is None:
+            return None
+        if not self._extras:
+            return self._base
+        extras = _encode_plain(self._extras)
+        if self._base == "{}":
+            return extras
+        return f"{self._base[:-1]},{extras[1:]}"
+
+    def _invalidate(self) -> None:
+        self._base = None
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self._invalidate()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: Any) -> None:
+        self._invalidate()
+        super().__delitem__(key)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self._invalidate()
+        super().update(*args, **kwargs)
+
+    def pop(self, *args: Any) -> Any:
+        self._invalidate()
+        return super().pop(*args)
+
+    def popitem(self) -> Tuple[Any, Any]:
+        self._invalidate()
+        return super().popitem()
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        self._invalidate()
+        return super().setdefault(key, default)
+
+    def clear(self) -> None:
+        self._invalidate()
+        super().clear()
+
+
+def with_fields(course: Dict[str, Any], **fields: Any) -> Dict[str, Any]:
+    """`{**course, **fields}` que conserva el fragmento si el curso es un `EncodedCourse`."""
+    if isinstance(course, EncodedCourse):
+        return course.with_fields(**fields)
+    return {**course, **fields}
+
+
+def _encode_plain(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def _encode_stdlib(value: Any) -> str:
+    """`json.dumps` que inserta los fragmentos; sólo desciende en contenedores con anidación."""
+    if isinstance(value, EncodedCourse):
+        fragment = value.fragment()
+        if fragment is not None:
+            return fragment
+        return _encode_plain(dict(value))
+    if isinstance(value, dict):
+        if not any(isinstance(item, (dict, list)) for item in value.values()):
+            return _encode_plain(value)
+        return "{" + ",".join(
+            f"{_encode_plain(str(key))}:{_encode_stdlib(item)}" for key, item in value.items()
+        ) + "}"
+    if isinstance(value, list):
+        if not any(isinstance(item, (dict, list)) for item in value):
+            return _encode_plain(value)
+        return "[" + ",".join(_encode_stdlib(item) for item in value) + "]"
+    return _encode_plain(value)
+
+
+def _orjson_default(value: Any) -> Any:
+    if isinstance(value, EncodedCourse):
+        fragment = value.fragment()
+        if fragment is not None and _ORJSON_FRAGMENT is not None:
+            return _ORJSON_FRAGMENT(fragment)
+        return dict(value)
+    if isinstance(value, dict):
+        return dict(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def _encode_orjson(value: Any) -> str:
+    # OPT_PASSTHROUGH_SUBCLASS manda los `EncodedCourse` a `default`, donde se usa su fragmento.
+    return orjson.dumps(
+        value,
+        default=_orjson_default,
+        option=orjson.OPT_PASSTHROUGH_SUBCLASS | orjson.OPT_NON_STR_KEYS,
+    ).decode("utf-8")
+
+
+def _select_serializer() -> Callable[[Any], str]:
+    if JSON_SERIALIZER == "stdlib":
+        return _encode_stdlib
+    if JSON_SERIALIZER == "orjson" and orjson is None:
+        raise ValueError("JSON_SERIALIZER=orjson pero orjson no está instalado")
+    return _encode_orjson if orjson is not None else _encode_stdlib
+
+
+encode_json: Callable[[Any], str] = _select_serializer()
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    return accepted
+
+
+def compress_body(body: str, accept_encoding: Optional[str]) -> Optional[Tuple[str, bytes]]:
+    """Comprime con `br` o `gzip` si el cliente lo acepta y el cuerpo supera el umbral.
+
+    Devuelve `(content_encoding, bytes)` o `None` si no compensa comprimir.
+    """
+    if not accept_encoding or COMPRESSION_MIN_BYTES <= 0:
+        return None
+    raw = body.encode("utf-8")
+    if len(raw) < COMPRESSION_MIN_BYTES:
+        return None
+
+    accepted = _accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    if accepted.get("br", wildcard) > 0:
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+        if brotli is not None:
+            return "br", brotli.compress(raw, quality=BROTLI_QUALITY)
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip", gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    return None
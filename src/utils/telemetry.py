@@ -0,0 +1,155 @@
+"""Trazas por invocación emitidas como CloudWatch Embedded Metric Format (EMF).
+
+Cada etapa (embedding de Bedrock, `$vectorSearch`, consultas a PostgreSQL, serialización...)
+se mide con `span(...)`. Al terminar la petición, `emit_metrics` escribe una única línea
+JSON en stdout con el formato EMF: CloudWatch Logs la convierte en métricas sin llamadas
+de red ni `PutMetricData`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "LearnIA/SearchApi")
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+
+
+class Span:
+    """Etapa medida: nombre, duración y atributos (aciertos de caché, nº de resultados...)."""
+
+    __slots__ = ("name", "duration_ms", "attributes", "_started")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.attributes = attributes
+        self.duration_ms = 0.0
+        self._started = time.perf_counter()
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self) -> None:
+        self.duration_ms = (time.perf_counter() - self._started) * 1000.0
+
+
+class Trace:
+    """Spans y contadores de una invocación; las tareas en hilos registran en la misma traza."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000.0
+
+    def durations(self) -> Dict[str, float]:
+        """Milisegundos por etapa; las etapas repetidas (p.ej. un lote) se suman."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration_ms
+        return totals
+
+
+# Igual que el deadline: Lambda atiende un evento por contenedor, la traza vigente es global.
+_current_trace = Trace()
+
+
+def start_trace() -> Trace:
+    global _current_trace
+    _current_trace = Trace()
+    return _current_trace
+
+
+def current_trace() -> Trace:
+    return _current_trace
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Mide el bloque y lo añade a la traza actual, marcando `error` si lanza."""
+    trace = _current_trace
+    current = Span(name, attributes)
+    try:
+        yield current
+    except BaseException as exc:
+        current.set(error=type(exc).__name__)
+        raise
+    finally:
+        current.finish()
+        trace.add(current)
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Contador de la petición actual (p.ej. `embedding_cache.hit`)."""
+    _current_trace.increment(name, value)
+
+
+def server_timing_header(trace: Trace) -> str:
+    """Valor de la cabecera `Server-Timing` con la duración de cada etapa y el total."""
+    entries = [f"{name};dur={duration:.1f}" for name, duration in trace.durations().items()]
+    entries.append(f"total;dur={trace.elapsed_ms():.1f}")
+    return ", ".join(entries)
+
+
+def emit_metrics(
+    trace: Trace,
+    route: str,
+    status_code: int,
+    request_id: Optional[str] = None,
+) -> None:
+    """Escribe la traza como una línea EMF; las métricas se agregan por ruta."""
+    if not METRICS_ENABLED:
+        return
+
+    durations = trace.durations()
+    record: Dict[str, Any] = {
+        "Route": route,
+        "StatusCode": status_code,
+        "Latency": trace.elapsed_ms(),
+        "Error": 1 if status_code >= 500 else 0,
+    }
+    metrics = [
+        {"Name": "Latency", "Unit": "Milliseconds"},
+        {"Name": "Error", "Unit": "Count"},
+    ]
+    for name, duration in durations.items():
+        record[f"{name}.ms"] = duration
+        metrics.append({"Name": f"{name}.ms", "Unit": "Milliseconds"})
+    for name, value in trace.counters.items():
+        record[name] = value
+        metrics.append({"Name": name, "Unit": "Count"})
+
+    # Detalle por span como propiedad: se consulta en Logs Insights, no genera métricas.
+    record["spans"] = [
+        {"name": item.name, "ms": round(item.duration_ms, 3), **item.attributes} for item in trace.spans
+    ]
+    if request_id:
+        record["requestId"] = request_id
+    record["_aws"] = {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [
+            {"Namespace": METRICS_NAMESPACE, "Dimensions": [["Route"]], "Metrics": metrics}
+        ],
+    }
+    # Se escribe directamente en stdout: el formateador del logging de Lambda antepone
+    # prefijos que invalidan el JSON de EMF.
+    sys.stdout.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    sys.stdout.flush()
@@ -0,0 +1,323 @@
+"""Índice vectorial en memoria (NumPy) con la misma interfaz que `MongoCatalogClient.search_courses`."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .course_fields import DEFAULT_PROJECTION, CourseProjection
+from .search_filters import FILTER_SPECS, normalize_filters
+from .serialization import EncodedCourse
+from .telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# Filas por bloque en el producto matriz-vector: acota la memoria temporal con snapshots mmap.
+SCORE_CHUNK_ROWS = 8192
+
+
+def _split_location(location: str) -> Tuple[str, str]:
+    bucket, _, prefix = location[len("s3://"):].partition("/")
+    return bucket, prefix
+
+
+def snapshot_version(location: str) -> str:
+    """Versión barata del snapshot: ETag en S3 o fecha de modificación en disco."""
+    if location.startswith("s3://"):
+        import boto3
+
+        bucket, prefix = _split_location(location)
+        response = boto3.client("s3").head_object(Bucket=bucket, Key=f"{prefix}.npy")
+        return response["ETag"]
+    return str(os.path.getmtime(f"{location}.npy"))
+
+
+class LocalVectorIndex:
+    """Matriz N x D de embeddings normalizados (float32) más los cursos en el mismo orden.
+
+    Los filtros se resuelven con máscaras booleanas precalculadas por campo y valor; la
+    semántica coincide con `search_filters.matches_filters` (un campo ausente no excluye).
+    """
+
+    def __init__(self, matrix: np.ndarray, courses: Sequence[Dict[str, Any]]) -> None:
+        if matrix.ndim != 2 or matrix.shape[0] != len(courses):
+            raise ValueError("La matriz de embeddings no coincide con el número de cursos")
+
+        self._matrix = matrix
+        self._courses = [EncodedCourse.encode(course) for course in courses]
+        self._eq_masks: Dict[str, Dict[str, np.ndarray]] = {}
+        self._missing_masks: Dict[str, np.ndarray] = {}
+        self._numeric_columns: Dict[str, np.ndarray] = {}
+        self._mask_cache: "OrderedDict[Tuple, Optional[np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        size = len(self._courses)
+        for spec in FILTER_SPECS.values():
+            field = spec["field"]
+            if spec["op"] == "eq":
+                if field in self._eq_masks:
+                    continue
+                values = np.array(
+                    [str(course.get(field) or "").lower() for course in self._courses],
+                    dtype=object,
+                )
+                self._missing_masks[field] = values == ""
+                self._eq_masks[field] = {
+                    value: values == value for value in set(values.tolist()) if value
+                }
+            elif field not in self._numeric_columns:
+                column = np.zeros(size, dtype=np.float32)
+                for position, course in enumerate(self._courses):
+                    try:
+                        column[position] = float(course.get(field) or 0.0)
+                    except (TypeError, ValueError):
+                        column[position] = np.nan
+                self._numeric_columns[field] = column
+
+    def __len__(self) -> int:
+        return len(self._courses)
+
+    @classmethod
+    def from_courses(cls, courses: Sequence[Dict[str, Any]]) -> "LocalVectorIndex":
+        """Construye el índice desde cursos que traen su `embedding` (se retira del dict)."""
+        metadata = []
+        vectors = []
+        for course in courses:
+            course = dict(course)
+            vectors.append(course.pop("embedding"))
+            metadata.append(course)
+
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0.0] = 1.0
+        return cls(matrix / norms, metadata)
+
+    @classmethod
+    def load(cls, location: str, cache_dir: str = "/tmp") -> "LocalVectorIndex":
+        """Carga `<location>.npy` (memory-mapped) y `<location>.json` desde disco, la layer o S3."""
+        if location.startswith("s3://"):
+            import boto3
+
+            bucket, prefix = _split_location(location)
+            local_prefix = os.path.join(cache_dir, os.path.basename(prefix) or "vector-index")
+            client = boto3.client("s3")
+            for suffix in (".npy", ".json"):
+                client.download_file(bucket, f"{prefix}{suffix}", f"{local_prefix}{suffix}")
+            location = local_prefix
+
+        matrix = np.load(f"{location}.npy", mmap_mode="r")
+        with open(f"{location}.json", "r", encoding="utf-8") as handle:
+            courses = json.load(handle)
+        return cls(matrix, courses)
+
+    def save(self, location: str) -> None:
+        np.save(f"{location}.npy", np.ascontiguousarray(self._matrix, dtype=np.float32))
+        with open(f"{location}.json", "w", encoding="utf-8") as handle:
+            json.dump(self._courses, handle, ensure_ascii=False, default=str)
+
+    def search_courses(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        filters: Dict[str, Any],
+        projection: CourseProjection = DEFAULT_PROJECTION,
+    ) -> List[Dict[str, Any]]:
+        with span("local_vector.search") as current:
+            results = self.search_many([query_embedding], limit, filters)[0]
+            current.set(results=len(results))
+        return [projection.apply(course) for course in results]
+
+    def search_many(
+        self,
+        query_embeddings: Sequence[List[float]],
+        limit: int,
+        filters: Dict[str, Any],
+    ) -> List[List[Dict[str, Any]]]:
+        """Resuelve varias consultas con un único producto matriz-matriz por bloque."""
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        scores = np.empty((len(self._courses), queries.shape[0]), dtype=np.float32)
+        for start in range(0, len(self._courses), SCORE_CHUNK_ROWS):
+            end = start + SCORE_CHUNK_ROWS
+            scores[start:end] = self._matrix[start:end] @ queries.T
+
+        mask = self._filter_mask(normalize_filters(filters))
+        if mask is not None:
+            scores[~mask] = -np.inf
+        candidates = int(mask.sum()) if mask is not None else len(self._courses)
+        k = min(limit, candidates)
+        if k <= 0:
+            return [[] for _ in range(queries.shape[0])]
+
+        results: List[List[Dict[str, Any]]] = []
+        for column in scores.T:
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top])]
+            # Misma escala que `vectorSearchScore` de Atlas para similitud coseno.
+            results.append(
+                [self._courses[i].with_fields(score=float((1.0 + column[i]) / 2.0)) for i in top]
+            )
+        return results
+
+    def _filter_mask(self, filters: Dict[str, Any]) -> Optional[np.ndarray]:
+        if not filters:
+            return None
+
+        key = tuple(sorted(filters.items()))
+        with self._lock:
+            if key in self._mask_cache:
+                self._mask_cache.move_to_end(key)
+                return self._mask_cache[key]
+
+        mask = np.ones(len(self._courses), dtype=bool)
+        for name, value in filters.items():
+            spec = FILTER_SPECS[name]
+            field = spec["field"]
+            if spec["op"] == "eq":
+                matches = self._eq_masks[field].get(str(value).lower())
+                allowed = self._missing_masks[field].copy()
+                if matches is not None:
+                    allowed |= matches
+                mask &= allowed
+            else:
+                column = self._numeric_columns[field]
+                invalid = np.isnan(column)
+                if spec["op"] == "lte":
+                    mask &= invalid | (column <= value)
+                else:
+                    mask &= invalid | (column >= value)
+
+        with self._lock:
+            self._mask_cache[key] = mask
+            while len(self._mask_cache) > 128:
+                self._mask_cache.popitem(last=False)
+        return mask
+
+
+class AdaptiveVectorSearch:
+    """Enruta entre Atlas y el índice local según la latencia observada de Atlas.
+
+    - `primary`: siempre el índice local.
+    - `fallback`: Atlas mientras su latencia media (EWMA) esté bajo el umbral; si la supera
+      o falla, responde el índice local. Cada `probe_every` búsquedas se vuelve a sondear
+      Atlas para detectar la recuperación.
+
+    En `fallback` el índice local se carga en segundo plano la primera vez que hace falta
+    (y se revisa cada `local_refresh_seconds`): la petición que detecta la degradación no
+    espera a leer el catálogo de la misma dependencia lenta. Hasta que está listo se sigue
+    usando Atlas y sus errores se propagan como sin índice local. `load_local` lo carga de
+    forma síncrona durante el pre-calentamiento.
+    """
+
+    def __init__(
+        self,
+        remote: Any,
+        local_loader: Callable[[], LocalVectorIndex],
+        mode: str = "fallback",
+        latency_threshold_ms: float = 800.0,
+        probe_every: int = 20,
+        smoothing: float = 0.3,
+        local_refresh_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._remote = remote
+        self._local_loader = local_loader
+        self._mode = mode
+        self._latency_threshold_ms = latency_threshold_ms
+        self._probe_every = probe_every
+        self._smoothing = smoothing
+        self._local_refresh_seconds = local_refresh_seconds
+        self._clock = clock
+        self._latency_ms: Optional[float] = None
+        self._calls = 0
+        self._local: Optional[LocalVectorIndex] = None
+        self._local_requested_at: Optional[float] = None
+        self._local_loading = False
+        self._lock = threading.Lock()
+
+    def search_courses(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        filters: Dict[str, Any],
+        projection: CourseProjection = DEFAULT_PROJECTION,
+    ) -> List[Dict[str, Any]]:
+        self._calls += 1
+        if self._mode == "primary":
+            return self._local_loader().search_courses(query_embedding, limit, filters, projection)
+
+        local = self._ready_local() if self._prefers_local() else None
+        if local is not None:
+            try:
+                return local.search_courses(query_embedding, limit, filters, projection)
+            except Exception as exc:
+                logger.warning(json.dumps({"event": "local_vector_search_failed", "error": str(exc)}))
+
+        started = time.perf_counter()
+        try:
+            results = self._remote.search_courses(
+                query_embedding, limit=limit, filters=filters, projection=projection
+            )
+        except Exception as remote_exc:
+            self._record_latency(self._latency_threshold_ms * 2)
+            local = self._ready_local()
+            if local is None:
+                raise
+            try:
+                results = local.search_courses(query_embedding, limit, filters, projection)
+            except Exception:
+                raise remote_exc
+            logger.warning(json.dumps({"event": "vector_search_served_locally", "error": str(remote_exc)}))
+            return results
+
+        self._record_latency((time.perf_counter() - started) * 1000.0)
+        return results
+
+    def load_local(self) -> None:
+        with self._lock:
+            self._local_requested_at = self._clock()
+        index = self._local_loader()
+        with self._lock:
+            self._local = index
+
+    def _ready_local(self) -> Optional[LocalVectorIndex]:
+        """Índice local ya cargado (o `None`); si falta o toca revisarlo, lo carga en segundo plano."""
+        with self._lock:
+            now = self._clock()
+            due = (
+                self._local_requested_at is None
+                or now - self._local_requested_at >= self._local_refresh_seconds
+            )
+            if due and not self._local_loading:
+                self._local_requested_at = now
+                self._local_loading = True
+                threading.Thread(target=self._load_local, name="local-vector-index-load", daemon=True).start()
+            return self._local
+
+    def _load_local(self) -> None:
+        try:
+            index = self._local_loader()
+        except Exception:
+            logger.warning(json.dumps({"event": "local_vector_index_load_failed"}), exc_info=True)
+            index = None
+        with self._lock:
+            self._local_loading = False
+            if index is not None:
+                self._local = index
+
+    def _prefers_local(self) -> bool:
+        if self._latency_ms is None or self._latency_ms <= self._latency_threshold_ms:
+            return False
+        return self._calls % self._probe_every != 0
+
+    def _record_latency(self, elapsed_ms: float) -> None:
+        if self._latency_ms is None:
+            self._latency_ms = elapsed_ms
+        else:
+            self._latency_ms += self._smoothing * (elapsed_ms - self._latency_ms)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# El código de la Lambda se importa como en el runtime: `utils.*` desde `src/`.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
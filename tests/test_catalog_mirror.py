@@ -0,0 +1,177 @@
+"""Réplica del catálogo contra una fuente en memoria con la interfaz de `MongoCatalogClient`."""
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+from pymongo.errors import ExecutionTimeout
+
+from utils.catalog_mirror import CatalogMirror
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class _Source:
+    """`scan_catalog` y `read_catalog_changes` sobre documentos en memoria."""
+
+    def __init__(self) -> None:
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.changes: List[Dict[str, Any]] = []
+        self.fail_on_scan: Optional[int] = None
+        self.fail_on_changes: Optional[int] = None
+        self.scan_gate: Optional[threading.Event] = None
+        self.scans = 0
+        self.change_reads = 0
+        self._clock = 0
+
+    def upsert(self, course_id: str, **fields: Any) -> None:
+        self._clock += 1
+        document = {"_id": course_id, "processed_at": self._clock, "title": course_id, **fields}
+        self.documents[course_id] = document
+        self.changes.append({"op": "upsert", "entry": self._entry(document)})
+
+    def delete(self, course_id: str) -> None:
+        del self.documents[course_id]
+        self.changes.append({"op": "delete", "course_id": course_id})
+
+    def scan_catalog(
+        self,
+        since: Optional[Tuple[Any, Any]] = None,
+        include_embeddings: bool = False,
+        limit: Optional[int] = None,
+        max_time_ms: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        self.scans += 1
+        if self.scan_gate is not None and since is None:
+            self.scan_gate.wait(5)
+        if self.fail_on_scan == self.scans:
+            raise ExecutionTimeout("operation exceeded time limit", 50)
+        ordered = sorted(self.documents.values(), key=lambda document: (document["processed_at"], document["_id"]))
+        if since is not None:
+            ordered = [document for document in ordered if (document["processed_at"], document["_id"]) > tuple(since)]
+        return [self._entry(document) for document in ordered[:limit]]
+
+    def read_catalog_changes(
+        self,
+        resume_token: Optional[int] = None,
+        include_embeddings: bool = False,
+        max_changes: int = 500,
+        max_await_ms: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        self.change_reads += 1
+        if self.fail_on_changes == self.change_reads:
+            raise ExecutionTimeout("operation exceeded time limit", 50)
+        start = len(self.changes) if resume_token is None else resume_token
+        batch = self.changes[start:start + max_changes]
+        return batch, start + len(batch)
+
+    @staticmethod
+    def _entry(document: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "course": {"course_id": document["_id"], "title": document["title"]},
+            "legacy_id": None,
+            "embedding": None,
+            "position": (document["processed_at"], document["_id"]),
+        }
+
+
+def _mirror(source: _Source, clock: _Clock, mode: str = "watermark") -> CatalogMirror:
+    mirror = CatalogMirror(source, mode=mode, refresh_interval_seconds=1.0, clock=clock)
+    mirror.PAGE_SIZE = 2
+    mirror.refresh()
+    return mirror
+
+
+@pytest.mark.parametrize("mode", ["watermark", "change_stream"])
+def test_incremental_refresh_applies_new_courses(mode):
+    source, clock = _Source(), _Clock()
+    source.upsert("c0")
+    mirror = _mirror(source, clock, mode)
+    revision = mirror.revision
+
+    for course_id in ("c1", "c2", "c3"):
+        source.upsert(course_id)
+    clock.advance(1.0)
+    mirror.refresh()
+
+    assert sorted(mirror.get_many(["c0", "c1", "c2", "c3"])) == ["c0", "c1", "c2", "c3"]
+    assert all(mirror.get(course_id) is not None for course_id in ("c1", "c2", "c3"))
+    assert mirror.revision == revision + 1
+
+
+def test_change_stream_applies_deletes():
+    source, clock = _Source(), _Clock()
+    source.upsert("c0")
+    source.upsert("c1")
+    mirror = _mirror(source, clock, "change_stream")
+
+    source.delete("c0")
+    clock.advance(1.0)
+    mirror.refresh()
+
+    assert mirror.get("c0") is None
+    assert mirror.get("c1") is not None
+
+
+def test_watermark_failure_keeps_pages_already_read():
+    source, clock = _Source(), _Clock()
+    source.upsert("c0")
+    mirror = _mirror(source, clock)
+
+    for course_id in ("c1", "c2", "c3"):
+        source.upsert(course_id)
+    # La primera página (c1, c2) llega; la segunda agota `max_time_ms`.
+    source.fail_on_scan = source.scans + 2
+    clock.advance(1.0)
+    mirror.refresh()
+
+    assert mirror.get("c1") is not None and mirror.get("c2") is not None
+    assert mirror.get("c3") is None
+
+    clock.advance(1.0)
+    mirror.refresh()
+    assert mirror.get("c3") is not None
+
+
+def test_change_stream_failure_does_not_skip_changes():
+    source, clock = _Source(), _Clock()
+    mirror = _mirror(source, clock, "change_stream")
+
+    for course_id in ("c1", "c2", "c3"):
+        source.upsert(course_id)
+    source.fail_on_changes = source.change_reads + 2
+    clock.advance(1.0)
+    mirror.refresh()
+    assert mirror.get("c1") is not None and mirror.get("c3") is None
+
+    clock.advance(1.0)
+    mirror.refresh()
+    assert all(mirror.get(course_id) is not None for course_id in ("c1", "c2", "c3"))
+
+
+def test_periodic_full_reload_runs_in_background():
+    source, clock = _Source(), _Clock()
+    source.upsert("c0")
+    mirror = CatalogMirror(source, refresh_interval_seconds=1.0, full_reload_seconds=60.0, clock=clock)
+    mirror.refresh()
+
+    source.upsert("c1")
+    source.scan_gate = threading.Event()
+    clock.advance(61.0)
+    mirror.refresh()  # No espera a la recarga: sigue sirviendo lo cargado.
+    assert mirror.get("c1") is None
+
+    source.scan_gate.set()
+    reloads = [thread for thread in threading.enumerate() if thread.name == "catalog-mirror-reload"]
+    for thread in reloads:
+        thread.join(5)
+    assert mirror.get("c1") is not None
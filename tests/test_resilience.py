@@ -0,0 +1,49 @@
+"""Circuito y reintentos de `DependencyPolicy` frente a errores que no son caídas."""
+
+import pytest
+
+from utils.resilience import CircuitBreaker, DependencyPolicy
+
+
+class _Down(Exception):
+    pass
+
+
+class _Invalid(Exception):
+    pass
+
+
+def _raise(exc: Exception) -> None:
+    raise exc
+
+
+def _policy(threshold: int = 3, reset_timeout: float = 30.0) -> DependencyPolicy:
+    breaker = CircuitBreaker("test", failure_threshold=threshold, reset_timeout=reset_timeout)
+    return DependencyPolicy("test", (_Down,), max_attempts=1, breaker=breaker)
+
+
+def test_unrelated_error_does_not_reset_failures():
+    policy = _policy()
+    for _ in range(2):
+        with pytest.raises(_Down):
+            policy.call(_raise, _Down())
+    with pytest.raises(_Invalid):
+        policy.call(_raise, _Invalid())
+    with pytest.raises(_Down):
+        policy.call(_raise, _Down())
+
+    assert policy.breaker.state == CircuitBreaker.OPEN
+
+
+def test_unrelated_error_on_probe_keeps_circuit_half_open():
+    policy = _policy(threshold=1, reset_timeout=0.0)
+    with pytest.raises(_Down):
+        policy.call(_raise, _Down())
+
+    with pytest.raises(_Invalid):
+        policy.call(_raise, _Invalid())
+
+    # La sonda quedó libre y el circuito sigue sin cerrarse hasta un éxito real.
+    assert policy.breaker.state == CircuitBreaker.HALF_OPEN
+    assert policy.call(lambda: "ok") == "ok"
+    assert policy.breaker.state == CircuitBreaker.CLOSED
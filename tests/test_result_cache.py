@@ -0,0 +1,40 @@
+"""`SnapshotCache` con peticiones concurrentes sobre la caché fría."""
+
+import threading
+import time
+
+from utils.result_cache import SnapshotCache
+
+
+def test_concurrent_misses_share_one_load():
+    cache = SnapshotCache(ttl_seconds=60.0, stale_seconds=60.0)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.05)
+        return "catalog"
+
+    results = []
+    workers = [
+        threading.Thread(target=lambda: results.append(cache.get("courses", loader))) for _ in range(5)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(5)
+
+    assert results == ["catalog"] * 5
+    assert len(loads) == 1
+
+
+def test_failed_load_serves_stale_snapshot():
+    now = [0.0]
+    cache = SnapshotCache(ttl_seconds=1.0, stale_seconds=1.0, clock=lambda: now[0])
+    assert cache.get("courses", lambda: "v1") == "v1"
+
+    def failing_loader():
+        raise RuntimeError("mongo caído")
+
+    now[0] = 5.0
+    assert cache.get("courses", failing_loader) == "v1"
@@ -0,0 +1,71 @@
+"""`AdaptiveVectorSearch` en modo `fallback` con Atlas caído y el índice local sin cargar."""
+
+import threading
+
+import pytest
+
+from utils.vector_index import AdaptiveVectorSearch
+
+
+class _Remote:
+    def search_courses(self, query_embedding, limit, filters, projection):
+        raise TimeoutError("atlas lento")
+
+
+class _Local:
+    def search_courses(self, query_embedding, limit, filters, projection):
+        return [{"course_id": "local"}]
+
+
+def _join_loads():
+    for thread in threading.enumerate():
+        if thread.name == "local-vector-index-load":
+            thread.join(5)
+
+
+def test_fallback_does_not_block_on_local_load():
+    gate = threading.Event()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        gate.wait(5)
+        return _Local()
+
+    router = AdaptiveVectorSearch(_Remote(), loader)
+
+    # El índice aún no está: se propaga el error de Atlas en lugar de esperar la carga.
+    with pytest.raises(TimeoutError):
+        router.search_courses([1.0], 5, {})
+    with pytest.raises(TimeoutError):
+        router.search_courses([1.0], 5, {})
+
+    gate.set()
+    _join_loads()
+    assert router.search_courses([1.0], 5, {}) == [{"course_id": "local"}]
+    assert len(loads) == 1
+
+
+def test_failed_local_load_is_retried_after_refresh_interval():
+    now = [0.0]
+    attempts = []
+
+    def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("catálogo no disponible")
+        return _Local()
+
+    router = AdaptiveVectorSearch(_Remote(), loader, local_refresh_seconds=60.0, clock=lambda: now[0])
+    with pytest.raises(TimeoutError):
+        router.search_courses([1.0], 5, {})
+    _join_loads()
+    with pytest.raises(TimeoutError):
+        router.search_courses([1.0], 5, {})
+    assert len(attempts) == 1
+
+    now[0] = 61.0
+    with pytest.raises(TimeoutError):
+        router.search_courses([1.0], 5, {})
+    _join_loads()
+    assert router.search_courses([1.0], 5, {}) == [{"course_id": "local"}]